@@ -0,0 +1,189 @@
+"""
+IVF-PQ recall and throughput vs exact dense search on a synthetic catalog
+
+The bundled catalog's LSA vectors are resampled into a larger synthetic
+catalog: each synthetic course is a real course's vector plus Gaussian
+noise, re-normalized, so the data keeps the real clustering. Queries are
+the benchmark keyword queries projected into the same space plus perturbed
+course vectors. For each probe count reports recall@k against exact
+search, with and without exact re-scoring of the shortlist, and queries
+per second (one query at a time, like the chat path).
+
+Filtered searches are measured too: each synthetic course inherits the
+level and price of the real course it was drawn from, so the filters keep
+the real correlation with the vectors. Recall there is against the exact
+top-k of the courses passing the filter.
+
+At large sizes each top-k is crowded with near-copies of one real course
+whose scores differ by less than the PQ error - the hard case for
+quantized search - so refined recall depends on --refine there.
+
+    python -m benchmarks.bench_ann [--sizes 100000 1000000] [--nprobe 1 4 8 16 32] [--filters free expert]
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from benchmarks.common import QUERIES, get_index
+from utils.ann_index import IVFPQIndex
+from utils.search import top_k
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(script_dir, "results")
+
+# Filters of the filtered runs, as masks over the real catalog
+FILTERS = {
+    "free": lambda catalog: ~catalog["is_paid"],
+    "intermediate": lambda catalog: catalog["level"] == "intermediate level",
+    "expert": lambda catalog: catalog["level"] == "expert level",
+}
+
+
+def synthetic_vectors(base, n, noise, seed=0, chunk=100_000):
+    """
+    n unit vectors scattered around randomly chosen rows of base
+    Returns: (vectors, row of base each one was drawn from)
+    """
+    rng = np.random.default_rng(seed)
+    dim = base.shape[1]
+    vectors = np.empty((n, dim), dtype=np.float32)
+    sources = rng.integers(0, len(base), n)
+    for start in range(0, n, chunk):
+        size = min(chunk, n - start)
+        block = base[sources[start:start + size]]
+        block = block + rng.normal(0, noise / np.sqrt(dim), (size, dim)).astype(np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        vectors[start:start + size] = block
+    return vectors, sources
+
+
+def benchmark_queries(index, vectors, count, noise, seed=1):
+    """Projected keyword queries, topped up with perturbed catalog vectors"""
+    dense = index.dense
+    queries = [
+        dense.project(*index.query_terms(" ".join(parsed["keywords"])))
+        for parsed in QUERIES
+    ]
+    queries = [q for q in queries if np.any(q)]
+    extra, _ = synthetic_vectors(vectors, max(0, count - len(queries)), noise, seed)
+    return np.vstack([np.asarray(queries, dtype=np.float32).reshape(-1, vectors.shape[1]), extra])
+
+
+def timed(search, queries):
+    """Results of search(q) for every query, and queries per second"""
+    start = time.perf_counter()
+    results = [search(q) for q in queries]
+    return results, len(queries) / (time.perf_counter() - start)
+
+
+def recall(exact, approximate, k):
+    return float(np.mean([
+        len(set(e[:k]) & set(a[:k])) / k for e, a in zip(exact, approximate)
+    ]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.3, help="spread of synthetic courses")
+    parser.add_argument("--subspaces", type=int, default=16, help="PQ bytes per vector")
+    parser.add_argument("--refine", type=int, default=10, help="shortlist size per result to re-score")
+    parser.add_argument("--filters", nargs="*", default=list(FILTERS), choices=list(FILTERS))
+    parser.add_argument("--output", default=None, help="JSON path (default: results/ann-<time>.json)")
+    args = parser.parse_args()
+
+    index = get_index()
+    base = np.ascontiguousarray(index.dense.vectors)
+    results = []
+    filtered = []
+    for n in args.sizes:
+        vectors, sources = synthetic_vectors(base, n, args.noise)
+        queries = benchmark_queries(index, vectors, args.queries, args.noise)
+
+        start = time.perf_counter()
+        ann = IVFPQIndex.train(vectors, m=args.subspaces)
+        train_seconds = time.perf_counter() - start
+
+        exact, exact_qps = timed(lambda q: top_k(vectors @ q, args.k), queries)
+        print(
+            f"\n{n} courses, dim {vectors.shape[1]}: exact {exact_qps:.0f} q/s, "
+            f"{vectors.nbytes / 2**20:.1f} MiB float32; IVF-PQ {ann.nlist} lists, "
+            f"{ann.nbytes / 2**20:.1f} MiB, trained in {train_seconds:.1f}s"
+        )
+        print(f"{'nprobe':>7} {'recall@k':>9} {'q/s':>8} {'refined':>8} {'q/s':>8}")
+
+        for nprobe in args.nprobe:
+            approximate, qps = timed(lambda q: ann.search(q, args.k, nprobe)[0], queries)
+            refined, refined_qps = timed(
+                lambda q: ann.search(q, args.k, nprobe, vectors=vectors, refine=args.refine)[0],
+                queries
+            )
+            row = {
+                "courses": n,
+                "nprobe": nprobe,
+                "recall": recall(exact, approximate, args.k),
+                "qps": qps,
+                "refined_recall": recall(exact, refined, args.k),
+                "refined_qps": refined_qps,
+                "exact_qps": exact_qps,
+                "index_mib": ann.nbytes / 2**20,
+                "vectors_mib": vectors.nbytes / 2**20,
+                "nlist": ann.nlist,
+                "train_seconds": train_seconds
+            }
+            results.append(row)
+            print(
+                f"{nprobe:>7} {row['recall']:>9.3f} {qps:>8.0f} "
+                f"{row['refined_recall']:>8.3f} {refined_qps:>8.0f}"
+            )
+
+        for name in args.filters:
+            mask = FILTERS[name](index.catalog).to_numpy(dtype=bool)[sources]
+            rows = np.flatnonzero(mask)
+            bits = np.packbits(mask)
+            exact, exact_qps = timed(lambda q: rows[top_k(vectors[rows] @ q, args.k)], queries)
+            print(
+                f"\nfilter {name}: {len(rows)} courses ({len(rows) / n:.1%}), "
+                f"exact {exact_qps:.0f} q/s"
+            )
+            print(f"{'nprobe':>7} {'refined':>8} {'q/s':>8}")
+            for nprobe in args.nprobe:
+                approximate, qps = timed(
+                    lambda q: ann.search(
+                        q, args.k, nprobe, candidate_bits=bits, vectors=vectors, refine=args.refine
+                    )[0],
+                    queries
+                )
+                row = {
+                    "courses": n,
+                    "filter": name,
+                    "selectivity": len(rows) / n,
+                    "nprobe": nprobe,
+                    "refined_recall": recall(exact, approximate, args.k),
+                    "refined_qps": qps,
+                    "exact_qps": exact_qps
+                }
+                filtered.append(row)
+                print(f"{nprobe:>7} {row['refined_recall']:>8.3f} {qps:>8.0f}")
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("ann-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "benchmark": "ann",
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": vars(args),
+            "results": results,
+            "filtered": filtered
+        }, f, indent=2)
+    print(f"\nwrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Batch scoring throughput: per-query loop vs search_many
+
+Replays a synthetic query log built from catalog titles (two or three
+leading words of random courses) with the QUERIES filter mix.
+
+    python -m benchmarks.bench_batch [--queries 2000] [--scale 1 10]
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import QUERIES, get_index, scaled_index
+from utils.search import search, search_many
+
+
+def query_log(index, count, seed=0):
+    rng = random.Random(seed)
+    titles = index.catalog["course_title"].tolist()
+    queries = []
+    filters = []
+    for _ in range(count):
+        words = rng.choice(titles).split()
+        queries.append(" ".join(words[:rng.randint(2, 3)]))
+        filters.append(rng.choice(QUERIES))
+    return queries, filters
+
+
+def throughput(fn, count):
+    start = time.perf_counter()
+    fn()
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--chunk-size", type=int, default=256)
+    args = parser.parse_args()
+
+    base = get_index()
+    print(f"{'courses':>9} {'variant':<18} {'queries/s':>10}")
+
+    for factor in args.scale:
+        index = scaled_index(base, factor)
+        queries, filters = query_log(index, args.queries)
+        search(index, queries[0], filters[0])  # warm-up
+
+        for mode in ("exhaustive", "maxscore"):
+            qps = throughput(
+                lambda: [search(index, q, f, 50, 10, mode) for q, f in zip(queries, filters)],
+                len(queries)
+            )
+            print(f"{index.num_docs:>9} {'loop/' + mode:<18} {qps:>10.0f}")
+
+        qps = throughput(
+            lambda: search_many(index, queries, filters, 50, 10, args.chunk_size),
+            len(queries)
+        )
+        print(f"{index.num_docs:>9} {'search_many':<18} {qps:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
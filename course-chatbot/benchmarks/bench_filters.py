@@ -0,0 +1,73 @@
+"""
+Filter pushdown: post-filtering vs candidate bitsets before scoring
+
+Narrow filtered queries on the catalog scaled up to simulate a large
+deployment. "post" scores every matching course and filters afterwards;
+"pushdown" intersects the filter bitsets first and scores only candidates.
+
+    python -m benchmarks.bench_filters [--scale 1 10 50]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import get_index, measure, percentiles, scaled_index
+from utils.search import search, top_k
+
+NARROW_QUERIES = [
+    {"keywords": ["python"], "level": "beginner level", "is_paid": False, "min_price": None, "max_price": None},
+    {"keywords": ["web", "development"], "level": "expert level", "is_paid": None, "min_price": None, "max_price": None},
+    {"keywords": ["course"], "level": "intermediate level", "is_paid": True, "min_price": 20, "max_price": 40},
+    {"keywords": ["learn", "guitar"], "level": "beginner level", "is_paid": False, "min_price": None, "max_price": None},
+    {"keywords": ["complete", "business"], "level": "expert level", "is_paid": True, "min_price": None, "max_price": 50},
+]
+
+
+def post_filter_search(index, semantic_query, parsed, min_match_percent, top_n):
+    """Score every course sharing a term, then apply the filters"""
+    rows, scores = index.postings.score(*index.query_terms(semantic_query))
+    bits = index.filters.candidates(parsed)
+    if bits is not None:
+        keep = np.unpackbits(bits, count=index.num_docs)[rows].astype(bool)
+        rows, scores = rows[keep], scores[keep]
+    match_percent = scores * 100
+    keep = match_percent >= min_match_percent
+    rows, match_percent = rows[keep], match_percent[keep]
+    winners = top_k(match_percent, top_n)
+    return pd.DataFrame({
+        "course_id": index.course_ids[rows[winners]],
+        "match_percent": match_percent[winners]
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 10, 50])
+    args = parser.parse_args()
+
+    base = get_index()
+    print(f"{'courses':>9} {'variant':<9} {'p50 ms':>8} {'p95 ms':>8} {'peak KiB':>9}")
+
+    for factor in args.scale:
+        index = scaled_index(base, factor)
+        for name, fn in (("post", post_filter_search), ("pushdown", search)):
+            latencies = []
+            peaks = []
+            for parsed in NARROW_QUERIES:
+                query = " ".join(parsed["keywords"])
+                samples, peak = measure(
+                    lambda: fn(index, query, parsed, 10, 10), repeats=20
+                )
+                latencies.extend(samples)
+                peaks.append(peak)
+
+            stats = percentiles(latencies)
+            print(
+                f"{index.num_docs:>9} {name:<9} {stats['p50']:>8.3f} "
+                f"{stats['p95']:>8.3f} {np.mean(peaks):>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Tail latency of the async Gemini client under a slow, flaky backend
+
+Fires concurrent calls at a stand-in model with lognormal latency and
+injected 503s, with and without hedging. By default the stand-in is the
+in-process FakeGeminiModel; --http serves the same knobs from a local
+benchmarks.gemini_server and goes through the SDK's REST transport, and
+--endpoint targets a server started separately.
+
+    python -m benchmarks.bench_gemini_client [--calls 400] [--error-rate 0.05] [--http]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from benchmarks.common import percentiles
+from benchmarks.fake_gemini import FakeGeminiModel
+from benchmarks.gemini_server import Behaviour, start_in_thread
+from utils.async_gemini import AsyncGeminiClient
+
+
+async def run(client, calls, concurrency):
+    latencies = []
+    errors = 0
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal errors
+        async with gate:
+            start = time.perf_counter()
+            try:
+                await client.generate(f"prompt {i}")
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05, help="median seconds")
+    parser.add_argument("--sigma", type=float, default=0.8, help="lognormal spread")
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--http", action="store_true", help="go through a local HTTP stand-in")
+    parser.add_argument("--endpoint", default=None, help="URL of a running gemini_server")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)  # hide per-retry warnings
+
+    endpoint = args.endpoint
+    if args.http and not endpoint:
+        _, endpoint = start_in_thread(
+            Behaviour(args.latency, args.sigma, args.error_rate, seed=1)
+        )
+    if endpoint:
+        os.environ["GEMINI_API_ENDPOINT"] = endpoint
+        os.environ["GEMINI_MAX_CONCURRENCY"] = str(args.concurrency)
+        from utils.gemini_utils import create_model
+
+    print(f"{'variant':<14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'attempts':>9} {'hedges':>7}")
+    for name, hedge in (("no hedging", None), ("hedge p95", "auto")):
+        if endpoint:
+            model = create_model()
+        else:
+            model = FakeGeminiModel(args.latency, args.sigma, args.error_rate, seed=1)
+        client = AsyncGeminiClient(
+            model,
+            max_concurrency=args.concurrency,
+            timeout=args.timeout,
+            backoff_base=0.05,
+            hedge_after=hedge
+        )
+        latencies, errors = asyncio.run(run(client, args.calls, args.concurrency))
+        stats = percentiles(latencies)
+        print(
+            f"{name:<14} {stats['p50']:>8.1f} {stats['p95']:>8.1f} {stats['p99']:>8.1f} "
+            f"{errors:>7} {client.stats['attempts']:>9} {client.stats['hedges']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Cold import time of the app's modules
+
+Each module is imported in a fresh interpreter with no GOOGLE_API_KEY, and
+the run fails if an import is slower than its budget, raises, or pulls in
+something that should only load on first use (the Gemini SDK, Streamlit,
+pandas/SciPy, the search index).
+
+    python -m benchmarks.bench_import [--repeats 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.common import percentiles
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(script_dir, ".."))
+
+# Wall-clock budget (ms) for importing each module, interpreter start excluded
+IMPORT_BUDGETS_MS = {
+    "utils.gemini_utils": 300,
+    "recommender": 300
+}
+
+# Modules that must not be loaded by a bare import
+LAZY_MODULES = (
+    "google.generativeai",
+    "streamlit",
+    "pandas",
+    "scipy",
+    "sklearn",
+    "utils.index_store",
+    "utils.search"
+)
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module} as target
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "ms": elapsed * 1000,
+    "loaded": [name for name in {lazy!r} if name in sys.modules],
+    "index_loaded": getattr(target, "_index", None) is not None
+}}))
+"""
+
+
+def import_once(module):
+    env = {k: v for k, v in os.environ.items() if k != "GOOGLE_API_KEY"}
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, lazy=LAZY_MODULES)],
+        cwd=PROJECT_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'module':<20} {'p50 ms':>8} {'max ms':>8} {'budget':>8}  eagerly loaded")
+    for module, budget in IMPORT_BUDGETS_MS.items():
+        runs = [import_once(module) for _ in range(args.repeats)]
+        times = [run["ms"] for run in runs]
+        loaded = sorted(set(name for run in runs for name in run["loaded"]))
+        if any(run["index_loaded"] for run in runs):
+            loaded.append("search index")
+
+        p50 = percentiles(times)["p50"]
+        print(f"{module:<20} {p50:>8.1f} {max(times):>8.1f} {budget:>8}  {', '.join(loaded) or '-'}")
+        if p50 > budget:
+            failures.append(f"{module}: {p50:.0f} ms > {budget} ms budget")
+        if loaded:
+            failures.append(f"{module}: imports {', '.join(loaded)} eagerly")
+
+    for failure in failures:
+        print("FAIL", failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
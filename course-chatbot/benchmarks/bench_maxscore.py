@@ -0,0 +1,63 @@
+"""
+MaxScore pruning: courses skipped and latency vs exhaustive scoring
+
+For each realistic query reports how many courses share a query term
+(matched), how many MaxScore had to score fully (scored) and how many it
+skipped, plus latency of both retrieval modes.
+
+    python -m benchmarks.bench_maxscore [--scale 1 20] [--min-match 50]
+"""
+import argparse
+
+from benchmarks.common import QUERIES, get_index, measure, percentiles, scaled_index
+from utils.search import search
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 20])
+    parser.add_argument("--min-match", type=float, default=50)
+    parser.add_argument("--top-n", type=int, default=10)
+    args = parser.parse_args()
+
+    base = get_index()
+    for factor in args.scale:
+        index = scaled_index(base, factor)
+        print(f"\n{index.num_docs} courses, min_match_percent={args.min_match}, top_n={args.top_n}")
+        print(
+            f"{'query':<36} {'matched':>8} {'scored':>8} {'skipped':>8} "
+            f"{'exh p50':>8} {'max p50':>8}"
+        )
+
+        totals = {"matched_docs": 0, "skipped_docs": 0}
+        for parsed in QUERIES:
+            query = " ".join(parsed["keywords"])
+            stats = {}
+            search(index, query, parsed, args.min_match, args.top_n, "maxscore", stats)
+
+            timings = {}
+            for mode in ("exhaustive", "maxscore"):
+                samples, _ = measure(
+                    lambda: search(index, query, parsed, args.min_match, args.top_n, mode),
+                    repeats=30
+                )
+                timings[mode] = percentiles(samples)["p50"]
+
+            # Narrow filters may take the candidate-rows path, which has no stats
+            matched = stats.get("matched_docs", 0)
+            skipped = stats.get("skipped_docs", 0)
+            totals["matched_docs"] += matched
+            totals["skipped_docs"] += skipped
+
+            label = f"{query} [{parsed['level']}, paid={parsed['is_paid']}]"
+            print(
+                f"{label[:36]:<36} {matched:>8} {stats.get('scored_docs', '-'):>8} "
+                f"{skipped:>8} {timings['exhaustive']:>8.3f} {timings['maxscore']:>8.3f}"
+            )
+
+        share = totals["skipped_docs"] / max(totals["matched_docs"], 1)
+        print(f"skipped {totals['skipped_docs']} of {totals['matched_docs']} matched courses ({share:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Latency and allocations per stage of the recommendation pipeline
+
+Runs offline: Gemini is replaced by FakeGeminiModel (canned parses, no
+network) and the response cache is disabled so every LLM-path call does
+the full round trip through the async client. Stages:
+
+    parse_local   rule-based parse (parse_query_locally)
+    parse_llm     Gemini parse through the client (fake backend)
+    extract       follow-up extractors (level, free/paid, price range)
+    vectorize     query -> sparse TF-IDF terms
+    filter        parsed filters -> candidate bitset
+    score         cosine scores of the candidates (MaxScore)
+    score_dense   LSA scores of the candidates (retrieval="dense")
+    sort          threshold + top-k + result frame
+    recommend     recommend_with_gemini with pre-parsed filters
+    turn          what handle_recommendation_flow does for a new search:
+                  analyze_query, needs_more_info, recommend, reply text
+
+Results are printed and written to benchmarks/results/ as JSON; pass
+--compare with an earlier file to see p50 changes.
+
+Pass --metrics to run with counters and spans enabled, to see what the
+instrumentation costs.
+
+    python -m benchmarks.bench_pipeline [--scale 1 10] [--repeats 20] [--compare FILE] [--metrics]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import recommender
+from benchmarks.common import QUERIES, get_index, measure_calls, percentiles, scaled_index
+from benchmarks.fake_gemini import FakeGeminiModel
+from utils import gemini_utils, metrics
+from utils.conversation_manager import (
+    build_conversational_response,
+    extract_level_from_text,
+    extract_paid_preference,
+    extract_price_range,
+    needs_more_info
+)
+from utils.llm_cache import LLMCache
+from utils.query_parser import parse_query_locally
+from utils.search import dense_scores, rank, score_candidates
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(script_dir, "results")
+
+# Chat turns as users type them
+TEXT_QUERIES = [
+    "I want to learn python programming",
+    "free beginner python courses",
+    "show me web development courses under 100 rupees",
+    "javascript react for intermediate developers",
+    "guitar lessons between 20 and 100",
+    "excel for finance",
+    "stock trading and technical analysis",
+    "photoshop for beginners",
+    "piano courses under 200",
+    "machine learning and data science"
+]
+
+# Replies to the bot's follow-up questions
+FOLLOWUP_REPLIES = [
+    "beginner", "I'm an intermediate", "advanced please", "any level",
+    "free", "paid is fine", "between 100 and 500", "under 200", "don't care"
+]
+
+
+def stages(index):
+    """name -> (fn, inputs)"""
+    vocabulary, analyze, idf = index.vocabulary, index.analyze, index.idf
+    semantic = [" ".join(q["keywords"]) for q in QUERIES]
+    terms = [index.query_terms(text) for text in semantic]
+    bits = [index.filters.candidates(q) for q in QUERIES]
+    scored = [
+        score_candidates(index, t, w, b, 0.5, 10)
+        for (t, w), b in zip(terms, bits)
+    ]
+
+    def extract(text):
+        extract_level_from_text(text)
+        extract_paid_preference(text)
+        extract_price_range(text)
+
+    def turn(text):
+        intent, parsed = recommender.analyze_query(text)
+        needs_more_info(text, parsed)
+        recs = recommender.recommend_with_gemini(text, parsed_override=parsed)
+        build_conversational_response(parsed, len(recs))
+
+    return {
+        "parse_local": (lambda text: parse_query_locally(text, vocabulary, analyze, idf), TEXT_QUERIES),
+        "parse_llm": (gemini_utils.parse_query_with_gemini, TEXT_QUERIES),
+        "extract": (extract, FOLLOWUP_REPLIES),
+        "vectorize": (index.query_terms, semantic),
+        "filter": (index.filters.candidates, QUERIES),
+        "score": (
+            lambda i: score_candidates(index, *terms[i], bits[i], 0.5, 10),
+            range(len(QUERIES))
+        ),
+        "score_dense": (
+            lambda i: dense_scores(index, *terms[i], bits[i]),
+            range(len(QUERIES))
+        ),
+        "sort": (
+            lambda i: rank(index, *scored[i], bits[i], 50, 10),
+            range(len(QUERIES))
+        ),
+        "recommend": (
+            lambda i: recommender.recommend_with_gemini(
+                TEXT_QUERIES[i], parsed_override=QUERIES[i]
+            ),
+            range(len(QUERIES))
+        ),
+        "turn": (turn, TEXT_QUERIES)
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=script_dir, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, path):
+    with open(path) as f:
+        before = {(r["courses"], r["stage"]): r for r in json.load(f)["results"]}
+    print(f"\nvs {os.path.basename(path)}")
+    print(f"{'courses':>9} {'stage':<12} {'p50 before':>11} {'p50 now':>9} {'change':>8}")
+    for r in results:
+        old = before.get((r["courses"], r["stage"]))
+        if old is None:
+            continue
+        change = (r["p50_ms"] / old["p50_ms"] - 1) * 100 if old["p50_ms"] else 0.0
+        print(f"{r['courses']:>9} {r['stage']:<12} {old['p50_ms']:>11.3f} {r['p50_ms']:>9.3f} {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--stages", nargs="+", default=None, help="subset of stages to run")
+    parser.add_argument("--output", default=None, help="JSON path (default: results/pipeline-<time>.json)")
+    parser.add_argument("--compare", default=None, help="earlier results JSON to diff against")
+    parser.add_argument("--metrics", action="store_true", help="enable metrics and tracing spans")
+    args = parser.parse_args()
+
+    if args.metrics:
+        metrics.enable()
+
+    gemini_utils.set_model(FakeGeminiModel())
+    gemini_utils.set_cache(LLMCache(max_entries=0))
+
+    base = get_index()
+    results = []
+    print(f"{'courses':>9} {'stage':<12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak KiB':>9}")
+    for factor in args.scale:
+        index = scaled_index(base, factor)
+        recommender.set_index(index)
+        for name, (fn, inputs) in stages(index).items():
+            if args.stages and name not in args.stages:
+                continue
+            latencies, peak_kib = measure_calls(fn, list(inputs), args.repeats)
+            stats = percentiles(latencies)
+            results.append({
+                "courses": index.num_docs,
+                "stage": name,
+                "calls": len(latencies),
+                "p50_ms": stats["p50"],
+                "p95_ms": stats["p95"],
+                "p99_ms": stats["p99"],
+                "mean_ms": float(np.mean(latencies)),
+                "peak_kib": peak_kib
+            })
+            print(
+                f"{index.num_docs:>9} {name:<12} {stats['p50']:>9.3f} {stats['p95']:>9.3f} "
+                f"{stats['p99']:>9.3f} {peak_kib:>9.1f}"
+            )
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, time.strftime("pipeline-%Y%m%d-%H%M%S.json")
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "benchmark": "pipeline",
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "args": vars(args),
+            "results": results
+        }, f, indent=2)
+    print(f"\nwrote {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Relevance and latency of the rankers on a labeled query set
+
+Two query sets are judged. In the "title" set a course is relevant when
+its title matches the query's pattern (and it belongs to the subject, when
+one is given); those labels favour lexical matching, and every ranker
+finds a relevant course first. The "judged" set is phrased the way users
+ask - words the relevant titles lack ("smartphone", "saving"), or common
+words ("make money", "small business") that pull in unrelated courses -
+and its relevant course_ids were picked by hand from the pooled top 15 of
+the tfidf, bm25 and dense rankers plus a title search for related terms.
+
+Queries are ranked over the whole catalog (no filters, min_match_percent=0)
+and judged at cutoff k with NDCG, precision, recall (of min(k, relevant))
+and MRR. Latency runs use the usual min_match_percent, on the bundled
+catalog and scaled copies of it.
+
+    python -m benchmarks.bench_rankers [--rankers tfidf bm25 dense] [--k 10] [--scale 1 20]
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+from benchmarks.common import get_index, measure, percentiles, scaled_index
+from utils.search import search
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(script_dir, "results")
+
+# (keyword query, title pattern, subject or None)
+LABELED_QUERIES = [
+    ("python", r"\bpython\b", None),
+    ("javascript", r"\bjavascript\b|\bjs\b", None),
+    ("react", r"\breact\b", "Web Development"),
+    ("php mysql", r"\bphp\b|\bmysql\b", "Web Development"),
+    ("wordpress website", r"\bwordpress\b", None),
+    ("html css", r"\bhtml5?\b|\bcss3?\b", "Web Development"),
+    ("angular", r"\bangular", "Web Development"),
+    ("guitar", r"\bguitar", "Musical Instruments"),
+    ("piano beginners", r"\bpiano\b|\bkeyboard", "Musical Instruments"),
+    ("drums", r"\bdrum", "Musical Instruments"),
+    ("music theory", r"\bmusic theory\b|\btheory\b", "Musical Instruments"),
+    ("photoshop", r"\bphotoshop\b", None),
+    ("logo design", r"\blogo", "Graphic Design"),
+    ("illustrator", r"\billustrator\b", "Graphic Design"),
+    ("stock trading", r"\bstocks?\b|\btrad(?:e|ing)\b", "Business Finance"),
+    ("options trading", r"\boptions?\b", "Business Finance"),
+    ("forex", r"\bforex\b|\bcurrenc", "Business Finance"),
+    ("accounting", r"\baccounting\b|\bbookkeeping\b", "Business Finance"),
+    ("financial modeling excel", r"\bfinancial model", "Business Finance"),
+    ("cryptocurrency bitcoin", r"\bbitcoin\b|\bcrypto|\bblockchain\b", None),
+]
+
+# (user-style query, relevant course_ids judged by hand)
+JUDGED_QUERIES = [
+    ("photo editing", {
+        1219814, 659340, 832870, 1008654, 657764, 585566, 482924, 368958, 1080584
+    }),
+    ("make money investing in stocks", {
+        855816, 979616, 1023670, 480752, 884658, 738910, 538560, 987682, 406922,
+        250902, 663022, 528784, 707688, 885413, 502240
+    }),
+    ("bookkeeping for small business", {
+        403628, 35131, 59725, 83736, 1097288, 304414, 371828, 494330, 331600, 824592,
+        257996, 868686, 101038, 729128, 302456, 1221942, 615206, 615204, 1073430, 774570
+    }),
+    ("smartphone app design", {
+        381828, 472592, 1092766, 998580, 403764, 374652, 1015308, 555952, 371074,
+        693812, 294294, 68876, 358998
+    }),
+    ("read music notation", {628606, 521072, 1032864}),
+    ("speed up my website", {1197650, 425910, 1207382, 443746, 525818}),
+    ("saving for retirement", {482534, 619792, 1167710, 971110, 627332, 532836, 250902}),
+]
+
+# Parsed filters that let every course through
+NO_FILTERS = {"keywords": [], "level": "all levels", "is_paid": None, "min_price": None, "max_price": None}
+
+
+def relevant_ids(index, pattern, subject):
+    catalog = index.catalog
+    mask = catalog["course_title"].str.contains(pattern, flags=re.IGNORECASE, regex=True)
+    if subject is not None:
+        mask &= catalog["display_subject"] == subject
+    return set(catalog.loc[mask, "course_id"].tolist())
+
+
+def judge(ranked, relevant, k):
+    """NDCG, precision, recall and reciprocal rank of one ranking at k"""
+    gains = np.array([course_id in relevant for course_id in ranked[:k]], dtype=float)
+    discounts = 1 / np.log2(np.arange(2, k + 2))
+    ideal = discounts[:min(k, len(relevant))].sum()
+    hits = np.flatnonzero(gains)
+    return {
+        "ndcg": float(gains @ discounts[:len(gains)] / ideal) if ideal else 0.0,
+        "precision": float(gains.sum() / k),
+        "recall": float(gains.sum() / min(k, len(relevant))) if relevant else 0.0,
+        "mrr": float(1 / (hits[0] + 1)) if len(hits) else 0.0
+    }
+
+
+def evaluate(index, judged, ranker, k):
+    """Per-query and mean relevance of one ranker over (query, relevant ids) pairs"""
+    retrieval, scorer = ranker_args(ranker)
+    per_query = {}
+    for query, relevant in judged:
+        result = search(index, query, NO_FILTERS, 0, k, retrieval, scorer=scorer)
+        per_query[query] = judge(list(result.course_id), relevant, k)
+    means = {
+        metric: float(np.mean([scores[metric] for scores in per_query.values()]))
+        for metric in ("ndcg", "precision", "recall", "mrr")
+    }
+    return {"mean": means, "queries": per_query}
+
+
+def ranker_args(ranker):
+    """(retrieval, scorer) for a ranker name"""
+    if ranker in ("dense", "ann"):
+        return ranker, "tfidf"
+    return "maxscore", ranker
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rankers", nargs="+", default=["tfidf", "bm25", "dense"])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 20])
+    parser.add_argument("--min-match", type=float, default=50, help="min_match_percent of the latency runs")
+    parser.add_argument("--output", default=None, help="JSON path (default: results/rankers-<time>.json)")
+    args = parser.parse_args()
+
+    base = get_index()
+    query_sets = {
+        "title": [
+            (query, relevant_ids(base, pattern, subject))
+            for query, pattern, subject in LABELED_QUERIES
+        ],
+        "judged": JUDGED_QUERIES
+    }
+
+    relevance = {}
+    for name, judged in query_sets.items():
+        relevance[name] = {}
+        print(f"\n{name}: {len(judged)} labeled queries, cutoff {args.k}")
+        print(f"{'ranker':<8} {'ndcg':>6} {'p@k':>6} {'recall':>6} {'mrr':>6}")
+        for ranker in args.rankers:
+            scores = evaluate(base, judged, ranker, args.k)
+            relevance[name][ranker] = scores
+            means = scores["mean"]
+            print(
+                f"{ranker:<8} {means['ndcg']:>6.3f} {means['precision']:>6.3f} "
+                f"{means['recall']:>6.3f} {means['mrr']:>6.3f}"
+            )
+
+    latency = []
+    for factor in args.scale:
+        index = scaled_index(base, factor)
+        print(f"\n{index.num_docs} courses, min_match_percent={args.min_match}: p50 ms per query")
+        for ranker in args.rankers:
+            retrieval, scorer = ranker_args(ranker)
+            samples = []
+            for query, _ in query_sets["title"] + query_sets["judged"]:
+                query_samples, _ = measure(
+                    lambda: search(index, query, NO_FILTERS, args.min_match, args.k, retrieval, scorer=scorer),
+                    repeats=20
+                )
+                samples += query_samples
+            row = {"courses": index.num_docs, "ranker": ranker, **percentiles(samples)}
+            latency.append(row)
+            print(f"{ranker:<8} p50 {row['p50']:>7.3f}  p95 {row['p95']:>7.3f}")
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("rankers-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "benchmark": "rankers",
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": vars(args),
+            "relevance": relevance,
+            "latency": latency
+        }, f, indent=2)
+    print(f"\nwrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Per-query latency and allocations: frame pipeline vs array top-k
+
+The "frame" variant reproduces the original recommend_with_gemini body
+(df.copy, boolean-mask filters, full sort_values) for comparison.
+
+    python -m benchmarks.bench_topk
+"""
+import numpy as np
+
+from benchmarks.common import QUERIES, get_index, measure, percentiles
+from utils.search import search
+
+
+def frame_search(index, semantic_query, parsed, min_match_percent=50, top_n=10):
+    scores = index.postings.dense_scores(*index.query_terms(semantic_query))
+
+    results = index.catalog.copy()
+    results["match_percent"] = scores * 100
+    results = results[results["match_percent"] >= min_match_percent]
+
+    if parsed["level"] != "all levels":
+        results = results[results["level"] == parsed["level"]]
+    if parsed["is_paid"] is not None:
+        results = results[results["is_paid"] == parsed["is_paid"]]
+    if parsed["is_paid"]:
+        if parsed["min_price"] is not None:
+            results = results[results["price"] >= parsed["min_price"]]
+        if parsed["max_price"] is not None:
+            results = results[results["price"] <= parsed["max_price"]]
+
+    return results.sort_values(
+        by="match_percent", ascending=False
+    )[["course_id", "match_percent"]].head(top_n)
+
+
+def main():
+    index = get_index()
+    print(f"catalog: {index.num_docs} courses\n")
+    print(f"{'variant':<8} {'threshold':>9} {'p50 ms':>8} {'p95 ms':>8} {'peak KiB':>9}")
+
+    for min_match in (50, 10):
+        for name, fn in (("frame", frame_search), ("array", search)):
+            latencies = []
+            peaks = []
+            for parsed in QUERIES:
+                query = " ".join(parsed["keywords"])
+                samples, peak = measure(
+                    lambda: fn(index, query, parsed, min_match, 10)
+                )
+                latencies.extend(samples)
+                peaks.append(peak)
+
+            stats = percentiles(latencies)
+            print(
+                f"{name:<8} {min_match:>9} {stats['p50']:>8.3f} "
+                f"{stats['p95']:>8.3f} {np.mean(peaks):>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Regression checks for the rule-based dataset question planner
+
+Each question carries the rows it should cover, written as a pandas
+expression over the catalog. The local plan must cover exactly those rows,
+whether or not it is confident enough to skip the LLM: an unsure plan is
+still what answers when the token budget is used up. Questions marked
+"llm" must be left to the LLM planner (confidence below the threshold).
+Questions naming a metric to total must be planned as a sum of it.
+
+    python -m benchmarks.check_planner
+"""
+import sys
+
+from benchmarks.common import get_index
+from recommender import LOCAL_PARSE_CONFIDENCE
+from utils.catalog_query import plan_question_locally, plan_mask
+
+# (question, rows it covers, "local" or "llm")
+QUESTIONS = [
+    ("how many courses cost more than 100", lambda c: c.price > 100, "local"),
+    ("how many courses cost at least 100", lambda c: c.price >= 100, "local"),
+    ("how many courses cost under $50", lambda c: c.price < 50, "local"),
+    ("how many courses cost between 20 and 50", lambda c: c.price.between(20, 50), "local"),
+    ("how many free courses are there", lambda c: ~c.is_paid, "local"),
+    ("How many courses have more than 100 lectures?", lambda c: c.num_lectures > 100, "llm"),
+    ("how many courses have between 50 and 100 lectures",
+     lambda c: c.num_lectures.between(50, 100), "llm"),
+    ("how many paid courses are under 20 hours long",
+     lambda c: c.is_paid & (c.content_duration < 20), "llm"),
+    ("average price of courses with more than 100 lectures", lambda c: c.num_lectures > 100, "llm"),
+    ("how many courses were published in 2017", None, "llm"),
+    ("how many subscribers do web development courses have",
+     lambda c: c.subject == "web development", "local"),
+    ("how many students are enrolled in python courses",
+     lambda c: c.course_title.str.contains(r"\bpython"), "local"),
+    ("what is the total number of subscribers", lambda c: c.course_id.notna(), "local"),
+    ("how many reviews do guitar courses have",
+     lambda c: c.course_title.str.contains(r"\bguitar"), "local"),
+    ("how many courses with reviews are there", None, "llm"),
+]
+
+# Questions whose answer is a total of a metric, not a count of courses
+SUMS = {
+    "how many subscribers do web development courses have": "num_subscribers",
+    "how many students are enrolled in python courses": "num_subscribers",
+    "what is the total number of subscribers": "num_subscribers",
+    "how many reviews do guitar courses have": "num_reviews",
+}
+
+
+def main():
+    index = get_index()
+    failures = 0
+    for question, expected, route in QUESTIONS:
+        plan, confidence = plan_question_locally(
+            question, index.vocabulary, index.analyze, index.idf
+        )
+        problems = []
+        if (confidence >= LOCAL_PARSE_CONFIDENCE) != (route == "local"):
+            problems.append(f"confidence {confidence:.2f}, expected {route}")
+        wanted = ("sum", SUMS[question]) if question in SUMS else None
+        if wanted and (plan["operation"], plan["metric"]) != wanted:
+            problems.append(
+                f"plans {plan['operation']} of {plan['metric']}, expected {wanted[0]} of {wanted[1]}"
+            )
+        if expected is not None:
+            covered = int(plan_mask(index, plan).sum())
+            wanted = int(expected(index.catalog).sum())
+            if covered != wanted:
+                problems.append(f"covers {covered} courses, expected {wanted}")
+        failures += bool(problems)
+        print(f"{'FAIL' if problems else 'ok':<5} {question}" + "".join(f"\n      {p}" for p in problems))
+
+    print(f"\n{len(QUESTIONS) - failures} of {len(QUESTIONS)} passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
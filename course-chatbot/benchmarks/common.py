@@ -0,0 +1,118 @@
+"""
+Shared helpers for the offline benchmarks
+
+Run benchmarks from the course-chatbot directory, e.g.
+    python -m benchmarks.bench_topk
+"""
+import os
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from utils.index_store import SearchIndex, load_index
+from utils.inverted_index import InvertedIndex
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+CSV_PATH = os.path.join(script_dir, "..", "data", "udemy_courses.csv")
+
+# Parsed queries shaped like QUERY_PARSER_PROMPT output
+QUERIES = [
+    {"keywords": ["python"], "level": "all levels", "is_paid": None, "min_price": None, "max_price": None},
+    {"keywords": ["python"], "level": "beginner level", "is_paid": False, "min_price": None, "max_price": None},
+    {"keywords": ["web", "development"], "level": "all levels", "is_paid": None, "min_price": None, "max_price": None},
+    {"keywords": ["javascript", "react"], "level": "intermediate level", "is_paid": True, "min_price": None, "max_price": 100},
+    {"keywords": ["guitar"], "level": "all levels", "is_paid": True, "min_price": 20, "max_price": 100},
+    {"keywords": ["excel"], "level": "all levels", "is_paid": None, "min_price": None, "max_price": None},
+    {"keywords": ["financial", "trading", "stock"], "level": "all levels", "is_paid": None, "min_price": None, "max_price": None},
+    {"keywords": ["photoshop", "design"], "level": "beginner level", "is_paid": None, "min_price": None, "max_price": None},
+    {"keywords": ["piano", "beginners"], "level": "all levels", "is_paid": True, "min_price": 0, "max_price": 200},
+    {"keywords": ["machine", "learning", "data", "science"], "level": "all levels", "is_paid": None, "min_price": None, "max_price": None},
+]
+
+
+def get_index():
+    return load_index(os.path.abspath(CSV_PATH))
+
+
+def scaled_index(index, factor):
+    """
+    In-memory index with the catalog repeated `factor` times
+    Copies get distinct course_ids so lookups stay unambiguous.
+    """
+    if factor == 1:
+        return index
+
+    catalog = pd.concat([index.catalog] * factor, ignore_index=True)
+    offset = int(index.course_ids.max()) + 1
+    catalog["course_id"] += np.repeat(np.arange(factor) * offset, index.num_docs)
+
+    tfidf_matrix = sparse.vstack([index.tfidf_matrix] * factor, format="csr")
+    meta = dict(index.meta, num_docs=tfidf_matrix.shape[0])
+    return SearchIndex(
+        None,
+        meta,
+        catalog,
+        index.terms,
+        index.idf,
+        tfidf_matrix,
+        InvertedIndex.from_csr(tfidf_matrix),
+        term_freqs=np.tile(index.term_freqs, factor),
+        doc_len=np.tile(index.doc_len, factor)
+    )
+
+
+def percentiles(samples_ms):
+    samples = np.asarray(samples_ms)
+    return {
+        "p50": float(np.percentile(samples, 50)),
+        "p95": float(np.percentile(samples, 95)),
+        "p99": float(np.percentile(samples, 99))
+    }
+
+
+def measure(fn, repeats=50):
+    """Latency samples (ms) and the mean tracemalloc peak (KiB) of fn()"""
+    fn()  # warm-up
+
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    peaks = []
+    for _ in range(min(repeats, 5)):
+        tracemalloc.start()
+        fn()
+        peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.stop()
+
+    return latencies, float(np.mean(peaks))
+
+
+def measure_calls(fn, inputs, repeats=20):
+    """
+    Per-call latency samples (ms) of fn(x) over inputs, and the mean
+    tracemalloc peak (KiB) of a single call
+    """
+    for x in inputs:
+        fn(x)  # warm-up
+
+    latencies = []
+    for _ in range(repeats):
+        for x in inputs:
+            start = time.perf_counter()
+            fn(x)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    peaks = []
+    for x in inputs:
+        tracemalloc.start()
+        fn(x)
+        peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.stop()
+
+    return latencies, float(np.mean(peaks))
@@ -0,0 +1,162 @@
+"""
+In-process stand-in for genai.GenerativeModel
+
+Answers the parser / turn-analysis prompts with canned JSON and everything
+else with fixed text, with optional simulated latency and failures. Lets
+benchmarks exercise gemini_utils without network access or an API key.
+"""
+import asyncio
+import json
+import random
+import re
+import time
+from types import SimpleNamespace
+
+
+class FakeAPIError(Exception):
+    """Stands in for google.api_core errors, which carry an HTTP .code"""
+
+    def __init__(self, code, message=""):
+        super().__init__(message or f"HTTP {code}")
+        self.code = code
+
+
+def fake_usage(prompt, text):
+    """usage_metadata with 4-chars-per-token counts, like the HTTP stand-in's"""
+    prompt_tokens = len(prompt) // 4 + 1
+    output_tokens = len(text) // 4 + 1
+    return SimpleNamespace(
+        prompt_token_count=prompt_tokens,
+        candidates_token_count=output_tokens,
+        total_token_count=prompt_tokens + output_tokens
+    )
+
+
+class FakeResponse:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+    def __iter__(self):
+        yield self
+
+
+class FakeStream:
+    """Streaming response: word-sized chunks, optionally spaced out in time"""
+
+    def __init__(self, text, chunk_delay=0.0, usage_metadata=None):
+        self.chunks = [FakeResponse(word) for word in re.findall(r"\S+\s*", text)]
+        if self.chunks:
+            # The API sends usage with the last chunk
+            self.chunks[-1].usage_metadata = usage_metadata
+        self.chunk_delay = chunk_delay
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            time.sleep(self.chunk_delay)
+            yield chunk
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(self.chunk_delay)
+            yield chunk
+
+
+# Request phrasing a real parser would not return as keywords
+REQUEST_WORDS = {
+    "want", "learn", "learning", "course", "courses", "show", "recommend",
+    "find", "please", "looking", "some", "about", "with", "free", "paid",
+    "beginner", "many", "there", "what", "which"
+}
+
+
+def canned_text(prompt):
+    """Deterministic response for the prompts the app sends"""
+    if "User query:" in prompt and "Schema:" in prompt:
+        query = prompt.rsplit("User query:", 1)[1].strip().lower()
+        words = [
+            w for w in re.findall(r"[a-z]+", query)
+            if len(w) > 3 and w not in REQUEST_WORDS
+        ]
+        parsed = {
+            "keywords": words[:3],
+            "level": "beginner level" if "beginner" in query else "all levels",
+            "is_paid": False if "free" in query else (True if "paid" in query else None),
+            "min_price": None,
+            "max_price": None
+        }
+        if '"intent"' in prompt:
+            question = query.startswith(("how", "what", "which", "average"))
+            parsed["intent"] = "dataset_question" if question else "recommendation"
+            parsed["aggregate"] = question and bool(
+                re.search(r"\b(how many|average|total|most|least|cheapest)\b", query)
+            )
+        return json.dumps(parsed)
+
+    if "User question:" in prompt and "Schema:" in prompt:
+        question = prompt.rsplit("User question:", 1)[1].strip().lower()
+        operation = "mean" if "average" in question else "count"
+        return json.dumps({
+            "operation": operation,
+            "metric": "price" if operation == "mean" else None,
+            "group_by": None,
+            "keywords": [],
+            "level": "all levels",
+            "is_paid": False if "free" in question else None
+        })
+
+    match = re.search(r"Course Title: (.+)", prompt)
+    if match:
+        title = match.group(1).strip()
+        return (
+            f"{title} walks you through the topic step by step, from the basics "
+            "to practical projects. It suits learners who want hands-on practice "
+            "and a clear path to real skills."
+        )
+
+    return "This course is a practical introduction to the topic."
+
+
+class FakeGeminiModel:
+    def __init__(self, latency=0.0, latency_sigma=0.0, error_rate=0.0,
+                 error_code=503, seed=0, chunk_delay=0.0):
+        """
+        latency: median seconds per call (to the first chunk when streaming)
+        latency_sigma: lognormal spread
+        error_rate: share of calls failing with FakeAPIError(error_code)
+        chunk_delay: seconds between streamed chunks
+        """
+        self.chunk_delay = chunk_delay
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    def _delay(self):
+        if self.latency <= 0:
+            return 0.0
+        return self.latency * self.random.lognormvariate(0, self.latency_sigma)
+
+    def _maybe_fail(self):
+        if self.error_rate and self.random.random() < self.error_rate:
+            raise FakeAPIError(self.error_code)
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        time.sleep(self._delay())
+        self._maybe_fail()
+        return self._respond(prompt, stream)
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self._delay())
+        self._maybe_fail()
+        return self._respond(prompt, stream)
+
+    def _respond(self, prompt, stream):
+        text = canned_text(prompt)
+        if stream:
+            return FakeStream(text, self.chunk_delay, fake_usage(prompt, text))
+        return FakeResponse(text, fake_usage(prompt, text))
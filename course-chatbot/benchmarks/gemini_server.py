@@ -0,0 +1,258 @@
+"""
+Local HTTP stand-in for the Gemini API
+
+Serves the REST endpoints google.generativeai calls with transport="rest":
+
+    POST /v1beta/models/<model>:generateContent
+    POST /v1beta/models/<model>:streamGenerateContent   (chunked JSON array)
+    GET  /stats                                          (request counters)
+
+Responses are the canned texts of fake_gemini.canned_text: JSON parses for
+QUERY_PARSER_PROMPT / TURN_ANALYSIS_PROMPT, plans for DATASET_PLAN_PROMPT,
+a title-based course description, fixed text otherwise. Latency, failures
+and throttling are configurable, so timeouts, retries, caching and
+concurrency can be exercised with no network:
+
+    python -m benchmarks.gemini_server --port 8089 --latency 0.3 --error-rate 0.05
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8089 streamlit run app.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.fake_gemini import canned_text
+
+ENDPOINT_PATTERN = re.compile(r"^/v1beta/models/([^/:]+):(generateContent|streamGenerateContent)")
+
+# google.rpc status names for the error codes the server can send
+STATUS_NAMES = {
+    429: "RESOURCE_EXHAUSTED",
+    500: "INTERNAL",
+    503: "UNAVAILABLE",
+    504: "DEADLINE_EXCEEDED"
+}
+
+
+class Behaviour:
+    """Latency / failure knobs shared by all request threads"""
+
+    def __init__(self, latency=0.0, latency_sigma=0.0, error_rate=0.0, error_code=503,
+                 throttle_rate=0.0, max_rps=None, chunk_delay=0.0, seed=0):
+        """
+        latency: median seconds before the response (or first chunk)
+        latency_sigma: lognormal spread of the latency
+        error_rate: share of requests failing with error_code
+        throttle_rate: share of requests answered 429 at random
+        max_rps: requests per second above which requests get 429
+        chunk_delay: seconds between streamed chunks
+        """
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.throttle_rate = throttle_rate
+        self.max_rps = max_rps
+        self.chunk_delay = chunk_delay
+
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = float(max_rps or 0)
+        self._refilled = time.monotonic()
+        self.stats = {"requests": 0, "streams": 0, "errors": 0, "throttled": 0}
+
+    def delay(self):
+        with self._lock:
+            if self.latency <= 0:
+                return 0.0
+            return self.latency * self.random.lognormvariate(0, self.latency_sigma)
+
+    def outcome(self, stream):
+        """None to answer normally, else the HTTP error code to send"""
+        with self._lock:
+            self.stats["requests"] += 1
+            if stream:
+                self.stats["streams"] += 1
+
+            if self.max_rps:
+                # Token bucket holding one second of requests
+                now = time.monotonic()
+                self._tokens = min(
+                    self.max_rps, self._tokens + (now - self._refilled) * self.max_rps
+                )
+                self._refilled = now
+                if self._tokens < 1:
+                    self.stats["throttled"] += 1
+                    return 429
+                self._tokens -= 1
+
+            roll = self.random.random()
+            if roll < self.throttle_rate:
+                self.stats["throttled"] += 1
+                return 429
+            if roll < self.throttle_rate + self.error_rate:
+                self.stats["errors"] += 1
+                return self.error_code
+            return None
+
+
+def prompt_text(body):
+    """Concatenated text parts of a generateContent request body"""
+    parts = []
+    for content in body.get("contents", []):
+        for part in content.get("parts", []):
+            if "text" in part:
+                parts.append(part["text"])
+    return "".join(parts)
+
+
+def usage_metadata(prompt, text):
+    # Same 4-chars-per-token estimate the context packer uses
+    prompt_tokens = len(prompt) // 4 + 1
+    output_tokens = len(text) // 4 + 1
+    return {
+        "promptTokenCount": prompt_tokens,
+        "candidatesTokenCount": output_tokens,
+        "totalTokenCount": prompt_tokens + output_tokens
+    }
+
+
+def response_body(text, usage=None):
+    body = {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0
+        }]
+    }
+    if usage:
+        body["usageMetadata"] = usage
+    return body
+
+
+class GeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    behaviour = Behaviour()
+
+    def log_message(self, format, *args):
+        pass  # one line per request drowns out the benchmark output
+
+    def do_GET(self):
+        if self.path.split("?")[0] == "/stats":
+            self._send_json(200, self.behaviour.stats)
+        else:
+            self._send_error(404, "Not found")
+
+    def do_POST(self):
+        match = ENDPOINT_PATTERN.match(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length) if length else b"{}"
+        if not match:
+            self._send_error(404, f"Unknown method {self.path}")
+            return
+
+        try:
+            body = json.loads(raw)
+        except json.JSONDecodeError:
+            self._send_error(400, "Invalid JSON payload")
+            return
+
+        stream = match.group(2) == "streamGenerateContent"
+        time.sleep(self.behaviour.delay())
+        code = self.behaviour.outcome(stream)
+        if code is not None:
+            self._send_error(code, "Injected failure")
+            return
+
+        prompt = prompt_text(body)
+        text = canned_text(prompt)
+        if stream:
+            self._stream(prompt, text)
+        else:
+            self._send_json(200, response_body(text, usage_metadata(prompt, text)))
+
+    def _stream(self, prompt, text):
+        """Chunked JSON array, one response object per word"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        words = re.findall(r"\S+\s*", text) or [""]
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            chunk = response_body(word, usage_metadata(prompt, text) if last else None)
+            data = ("[" if i == 0 else ",\r\n") + json.dumps(chunk) + ("]" if last else "")
+            self._write_chunk(data.encode("utf-8"))
+            if not last and self.behaviour.chunk_delay:
+                time.sleep(self.behaviour.chunk_delay)
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, code, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, code, message):
+        self._send_json(code, {"error": {
+            "code": code,
+            "message": message,
+            "status": STATUS_NAMES.get(code, "UNKNOWN")
+        }})
+
+
+def make_server(host="127.0.0.1", port=8089, behaviour=None):
+    """HTTP server bound to host:port (port 0 picks a free one); call serve_forever()"""
+    handler = type("Handler", (GeminiHandler,), {"behaviour": behaviour or Behaviour()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(behaviour=None, host="127.0.0.1", port=0):
+    """Serve in a daemon thread; returns (server, base URL)"""
+    server = make_server(host, port, behaviour)
+    threading.Thread(target=server.serve_forever, name="gemini-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Gemini API stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="median seconds")
+    parser.add_argument("--sigma", type=float, default=0.0, help="lognormal spread")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-code", type=int, default=503)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of random 429s")
+    parser.add_argument("--max-rps", type=float, default=None, help="429 above this request rate")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    behaviour = Behaviour(
+        args.latency, args.sigma, args.error_rate, args.error_code,
+        args.throttle_rate, args.max_rps, args.chunk_delay, args.seed
+    )
+    server = make_server(args.host, args.port, behaviour)
+    print(f"Gemini stand-in on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Concurrent chat sessions against one process, without a browser
+
+Each simulated user is a thread with its own ChatSession replaying
+dialogues through chat_flow.handle_turn - the same code app.py runs per
+message - against a stand-in LLM. Streamlit runs each session's script on
+its own thread too, so this approximates one replica under load.
+
+Reports throughput, latency percentiles per turn type (chitchat,
+recommendation, dataset_question, followup_<step>), memory and Gemini
+tokens per session.
+Dialogues are the scripted ones below or a JSONL file with one dialogue per
+line: a list of user messages, or a recorded list of {"role", "content"}
+chat messages (only user turns are replayed).
+
+    python -m benchmarks.load_sessions [--users 20] [--iterations 3] [--llm http|fake]
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+import recommender
+from benchmarks.common import get_index, percentiles, scaled_index
+from benchmarks.fake_gemini import FakeGeminiModel
+from benchmarks.gemini_server import Behaviour, start_in_thread
+from chat_flow import ChatSession, handle_turn
+from utils import gemini_utils, token_usage
+from utils.llm_cache import LLMCache
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(script_dir, "results")
+
+# Cover every step of the follow-up flow: subject -> level -> budget -> price range
+DIALOGUES = [
+    ["hi", "I want to learn a course", "python", "beginner", "paid", "under 200", "thanks"],
+    ["show me web development courses", "my budget is under 100 rupees",
+     "how many free courses are there?"],
+    ["recommend course", "guitar", "any level", "free"],
+    ["what is the average price of graphic design courses?", "photoshop for beginners",
+     "reset", "excel for accountants"],
+    ["courses on quantum basket weaving", "machine learning and data science", "bye"],
+    ["help", "javascript react for intermediate developers", "which subject has the most courses?"]
+]
+
+
+def load_dialogues(path):
+    dialogues = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            turns = json.loads(line)
+            if turns and isinstance(turns[0], dict):
+                turns = [m["content"] for m in turns if m.get("role") == "user"]
+            dialogues.append(turns)
+    return dialogues
+
+
+def rss_bytes():
+    """Current resident set size (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def deep_size(obj, seen=None):
+    """Approximate bytes held by a session-state value"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if hasattr(obj, "memory_usage") and hasattr(obj, "columns"):
+        return int(obj.memory_usage(deep=True).sum())
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_size(item, seen) for item in obj)
+    return size
+
+
+def run_user(user, dialogues, iterations, think, start, samples, errors, sessions):
+    session = ChatSession()
+    sessions[user] = session
+    start.wait()
+    for i in range(iterations):
+        # Users start at different dialogues so turn types interleave
+        dialogue = dialogues[(user + i) % len(dialogues)]
+        for text in dialogue:
+            session.messages.append({"role": "user", "content": text})
+            began = time.perf_counter()
+            try:
+                turn_type, reply = handle_turn(session, text)
+                if not isinstance(reply, str):
+                    reply = "".join(reply)   # what st.write_stream does
+            except Exception as exc:
+                errors.append(repr(exc))
+                continue
+            samples.append((turn_type, (time.perf_counter() - began) * 1000))
+            session.messages.append({"role": "assistant", "content": reply})
+            if think:
+                time.sleep(think)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=3, help="dialogues per user")
+    parser.add_argument("--think", type=float, default=0.0, help="seconds between a user's turns")
+    parser.add_argument("--dialogues", default=None, help="JSONL file of dialogues to replay")
+    parser.add_argument("--llm", choices=("http", "fake"), default="http",
+                        help="local HTTP stand-in (SDK over REST) or in-process fake")
+    parser.add_argument("--latency", type=float, default=0.2, help="median LLM seconds")
+    parser.add_argument("--sigma", type=float, default=0.5, help="lognormal spread")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--no-cache", action="store_true", help="disable the LLM response cache")
+    parser.add_argument("--scale", type=int, default=1, help="catalog size multiplier")
+    parser.add_argument("--token-budget", type=int, default=None,
+                        help="SESSION_TOKEN_BUDGET for the simulated sessions")
+    parser.add_argument("--output", default=None, help="JSON path (default: results/sessions-<time>.json)")
+    args = parser.parse_args()
+
+    dialogues = load_dialogues(args.dialogues) if args.dialogues else DIALOGUES
+    if args.token_budget is not None:
+        os.environ["SESSION_TOKEN_BUDGET"] = str(args.token_budget)
+
+    if args.llm == "http":
+        os.environ["GEMINI_API_ENDPOINT"] = start_in_thread(
+            Behaviour(args.latency, args.sigma, args.error_rate, seed=1)
+        )[1]
+        gemini_utils.set_model(gemini_utils.create_model())
+    else:
+        gemini_utils.set_model(FakeGeminiModel(args.latency, args.sigma, args.error_rate, seed=1))
+    if args.no_cache:
+        gemini_utils.set_cache(LLMCache(max_entries=0))
+
+    recommender.set_index(scaled_index(get_index(), args.scale))
+    recommender.get_index().courses   # the app builds this at startup
+
+    # One throwaway session so first-use costs don't land on the measured run
+    for text in DIALOGUES[0]:
+        reply = handle_turn(ChatSession(), text)[1]
+        if not isinstance(reply, str):
+            "".join(reply)
+    token_usage.reset()
+
+    samples, errors, sessions = [], [], {}
+    start = threading.Barrier(args.users + 1)
+    threads = [
+        threading.Thread(
+            target=run_user,
+            args=(user, dialogues, args.iterations, args.think, start, samples, errors, sessions)
+        )
+        for user in range(args.users)
+    ]
+    for thread in threads:
+        thread.start()
+
+    rss_before = rss_bytes()
+    start.wait()
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    rss_after = rss_bytes()
+
+    by_type = defaultdict(list)
+    for turn_type, ms in samples:
+        by_type[turn_type].append(ms)
+    session_sizes = [deep_size(vars(session)) for session in sessions.values()]
+    session_tokens = [token_usage.total_tokens(s.token_usage) for s in sessions.values()]
+    process_usage = token_usage.process_usage()
+
+    print(f"{args.users} users, {len(samples)} turns in {elapsed:.1f}s "
+          f"= {len(samples) / elapsed:.1f} turns/s, {len(errors)} errors")
+    print(f"\n{'turn type':<22} {'turns':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    turn_stats = {}
+    for turn_type in sorted(by_type):
+        stats = percentiles(by_type[turn_type])
+        turn_stats[turn_type] = dict(stats, turns=len(by_type[turn_type]))
+        print(f"{turn_type:<22} {len(by_type[turn_type]):>6} {stats['p50']:>9.1f} "
+              f"{stats['p95']:>9.1f} {stats['p99']:>9.1f}")
+
+    memory = {
+        "session_state_kib_mean": float(np.mean(session_sizes)) / 1024,
+        "session_state_kib_max": float(np.max(session_sizes)) / 1024,
+        "rss_growth_kib_per_session": (rss_after - rss_before) / 1024 / args.users
+    }
+    print(
+        f"\nsession state: {memory['session_state_kib_mean']:.1f} KiB mean, "
+        f"{memory['session_state_kib_max']:.1f} KiB max; "
+        f"RSS growth {memory['rss_growth_kib_per_session']:.1f} KiB per session"
+    )
+    totals = token_usage.summary(process_usage)
+    print(
+        f"tokens: {np.mean(session_tokens):.0f} mean, {np.max(session_tokens):.0f} max per session; "
+        f"process {totals['prompt_tokens']} prompt + {totals['output_tokens']} output "
+        f"(${totals['cost_usd']:.4f})"
+    )
+    for call_site, site in sorted(process_usage.items()):
+        print(f"  {call_site:<22} {site['calls']:>6} calls {site['prompt_tokens']:>9} prompt "
+              f"{site['output_tokens']:>8} output")
+    if errors:
+        print("first error:", errors[0])
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, time.strftime("sessions-%Y%m%d-%H%M%S.json")
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "benchmark": "sessions",
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": vars(args),
+            "courses": recommender.get_index().num_docs,
+            "turns": len(samples),
+            "errors": len(errors),
+            "seconds": elapsed,
+            "turns_per_second": len(samples) / elapsed,
+            "turn_types": turn_stats,
+            "memory": memory,
+            "tokens": {
+                "per_session_mean": float(np.mean(session_tokens)),
+                "per_session_max": int(np.max(session_tokens)),
+                "process": totals,
+                "call_sites": process_usage
+            },
+            "gemini_client": dict(gemini_utils.get_client().stats),
+            "llm_cache": dict(gemini_utils.get_cache().stats)
+        }, f, indent=2)
+    print(f"wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+Conversation flow of the chatbot, independent of Streamlit
+
+Every handler takes the session state as its first argument: any object
+with attribute access to the fields of default_state(). app.py passes
+st.session_state; ChatSession lets tools drive conversations headlessly.
+"""
+from recommender import (
+    recommend_with_gemini,
+    answer_dataset_question,
+    parse_query,
+    analyze_query
+)
+from utils.conversation_manager import (
+    needs_more_info,
+    build_conversational_response,
+    should_ask_followup,
+    extract_level_from_text,
+    extract_paid_preference,
+    extract_price_range
+)
+from utils import metrics, token_usage
+
+
+def default_state():
+    """Fresh per-session state; app.py keeps it in st.session_state"""
+    return {
+        "messages": [],
+        "recommended": None,
+        "page": 0,
+        "view": "chat",          # "chat" or "details"
+        "selected_course_id": None,
+        "awaiting_info": None,   # What info are we waiting for: "subject", "level", "budget", etc.
+        "partial_query": "",      # Accumulated query text
+        "last_query": "",         # Last successful query for context retention
+        "last_parsed": {},        # Last parsed filters
+        "conversation_context": {  # Track conversation state
+            "has_subject": False,
+            "has_level": False,
+            "has_budget": False,
+            "asked_level": 0,
+            "asked_budget": 0,
+            "asked_refinement": False
+        },
+        "partial_filters": {},     # Accumulated filters
+        "course_description": "",  # AI-generated course description
+        "last_described_course": None,  # Track which course was last described
+        "token_usage": {}          # Gemini calls/tokens per call site (see token_usage)
+    }
+
+
+class ChatSession:
+    """Session state as a plain object, for running the flow without Streamlit"""
+
+    def __init__(self):
+        self.__dict__.update(default_state())
+
+
+def handle_chitchat(state, text):
+    t = text.lower().strip()
+    if t in ["hi", "hello", "hey", "hii", "hello there", "hi there"]:
+        return "👋 Hi! I'm your course recommendation assistant. What would you like to learn today?"
+    if "thank" in t:
+        return "😊 You're very welcome! Feel free to ask if you need more courses."
+    if t in ["bye", "goodbye", "see you"]:
+        return "👋 Goodbye! Happy learning! Come back anytime."
+    if t in ["help", "how does this work", "what can you do"]:
+        return "I can help you find the perfect course! Just tell me:\n- What subject you want to learn\n- Your skill level (beginner/intermediate/advanced)\n- Your budget preference\n\nI'll ask questions to understand your needs better!"
+    if "reset" in t or "start over" in t or "clear" in t:
+        # Reset conversation
+        state.awaiting_info = None
+        state.partial_query = ""
+        state.partial_filters = {}
+        state.conversation_context = {
+            "has_subject": False,
+            "has_level": False,
+            "has_budget": False,
+            "asked_level": 0,
+            "asked_budget": 0,
+            "asked_refinement": False
+        }
+        return "🔄 Conversation reset! What would you like to learn?"
+    return None
+
+
+def handle_followup_response(state, user_response):
+    """Handle user's response to our clarifying question"""
+    awaiting = state.awaiting_info
+    
+    if awaiting == "subject":
+        # User provided subject/topic
+        state.partial_query += " " + user_response
+        state.conversation_context["has_subject"] = True
+        state.awaiting_info = None
+        
+        # Now ask about level
+        state.awaiting_info = "level"
+        state.conversation_context["asked_level"] += 1
+        return f"Great! I'll look for courses on **{user_response}**. What's your current skill level?\n- Beginner (just starting)\n- Intermediate (some experience)\n- Advanced (experienced)\n- Any level"
+    
+    elif awaiting == "level":
+        # Extract level from response
+        level = extract_level_from_text(user_response)
+        if level:
+            state.partial_filters["level"] = level
+            state.conversation_context["has_level"] = True
+        state.awaiting_info = None
+        
+        # Now ask about budget
+        state.awaiting_info = "budget"
+        state.conversation_context["asked_budget"] += 1
+        return f"Perfect! And what about your budget? Are you looking for free courses or open to paid ones?"
+    
+    elif awaiting == "budget":
+        # Extract budget preference
+        paid_pref = extract_paid_preference(user_response)
+        if paid_pref is not None:
+            state.partial_filters["is_paid"] = paid_pref
+            
+            # If paid, ask for price range
+            if paid_pref:
+                state.awaiting_info = "price_range"
+                return "What's your budget range? (e.g., 'under 200', 'between 100 and 500')"
+        
+        state.conversation_context["has_budget"] = True
+        state.awaiting_info = None
+        
+        # Now we have enough info - do the search
+        return perform_search_with_filters(state)
+    
+    elif awaiting == "price_range":
+        # Extract price range
+        min_p, max_p = extract_price_range(user_response)
+        if min_p is not None:
+            state.partial_filters["min_price"] = min_p
+        if max_p is not None:
+            state.partial_filters["max_price"] = max_p
+        
+        state.awaiting_info = None
+        
+        # Now do the search
+        return perform_search_with_filters(state)
+    
+    elif awaiting == "refinement":
+        # User wants to refine results
+        state.awaiting_info = None
+        state.partial_query = user_response
+        return handle_recommendation_flow(state, user_response)
+    
+    return "I didn't quite catch that. Could you please rephrase?"
+
+
+def perform_search_with_filters(state):
+    """Execute search with accumulated filters"""
+    # Build query from partial_query and filters
+    query_text = state.partial_query.strip()
+    
+    # Parse to get keywords (Gemini only if the local parser is unsure)
+    parsed = parse_query(query_text)
+    
+    # Override with our accumulated filters
+    if "level" in state.partial_filters:
+        parsed["level"] = state.partial_filters["level"]
+    if "is_paid" in state.partial_filters:
+        parsed["is_paid"] = state.partial_filters["is_paid"]
+    if "min_price" in state.partial_filters:
+        parsed["min_price"] = state.partial_filters["min_price"]
+    if "max_price" in state.partial_filters:
+        parsed["max_price"] = state.partial_filters["max_price"]
+    
+    # Get recommendations
+    recs = recommend_with_gemini(query_text, parsed_override=parsed)
+    
+    if recs.empty:
+        # Reset for new search
+        state.partial_query = ""
+        state.partial_filters = {}
+        # Generate empathetic response
+        from utils.gemini_utils import stream_empathetic_no_results_message
+        return stream_empathetic_no_results_message(query_text, parsed)
+    
+    # Success!
+    state.recommended = recs
+    state.page = 0
+    
+    # Check if we should ask for refinement
+    ask_followup, followup_q = should_ask_followup(
+        len(recs),
+        state.conversation_context
+    )
+    
+    response = build_conversational_response(parsed, len(recs))
+    
+    if ask_followup:
+        state.awaiting_info = "refinement"
+        state.conversation_context["asked_refinement"] = True
+        response += "\n\n" + followup_q
+    
+    # Reset for next query
+    state.partial_query = ""
+    state.partial_filters = {}
+    
+    return response
+
+
+def handle_recommendation_flow(state, query, parsed=None):
+    """Handle the recommendation request with conversational flow"""
+    # Parse the query first, unless the turn analysis already did
+    if parsed is None:
+        parsed = parse_query(query)
+    
+    # Check if query is just adding constraints (budget/level) without new subject
+    is_constraint_only = (
+        not parsed["keywords"] and 
+        (parsed.get("min_price") or parsed.get("max_price") or 
+         parsed.get("level") != "all levels" or 
+         parsed.get("is_paid") is not None)
+    )
+    
+    # If constraint only and we have a last query, merge with last query
+    if is_constraint_only and state.last_query:
+        # User is refining previous search
+        base_parsed = state.last_parsed.copy()
+        
+        # Apply new constraints
+        if parsed.get("level") != "all levels":
+            base_parsed["level"] = parsed["level"]
+        if parsed.get("is_paid") is not None:
+            base_parsed["is_paid"] = parsed["is_paid"]
+        if parsed.get("min_price") is not None:
+            base_parsed["min_price"] = parsed["min_price"]
+        if parsed.get("max_price") is not None:
+            base_parsed["max_price"] = parsed["max_price"]
+        
+        parsed = base_parsed
+        
+        # Acknowledge the refinement
+        acknowledgment = "Got it! "
+        if parsed.get("min_price") or parsed.get("max_price"):
+            min_p = parsed.get("min_price", 0)
+            max_p = parsed.get("max_price", 99999)
+            if max_p < 99999:
+                acknowledgment += f"Filtering for courses under ₹{max_p}. "
+            else:
+                acknowledgment += f"Filtering for courses over ₹{min_p}. "
+        if parsed.get("level") != "all levels":
+            acknowledgment += f"Looking for {parsed['level']}. "
+        if parsed.get("is_paid") is False:
+            acknowledgment += "Showing only free courses. "
+        elif parsed.get("is_paid") is True:
+            acknowledgment += "Including paid courses. "
+    # Check if we have existing partial context (user is adding more info)
+    elif state.partial_query and not state.awaiting_info:
+        # User is adding more information to previous query
+        # Merge the new information
+        merged_query = state.partial_query + " " + query
+        parsed_merged = parse_query(merged_query)
+        
+        # Merge filters - prefer new parsed info for conflicts
+        if parsed["keywords"]:
+            parsed_merged["keywords"].extend(parsed["keywords"])
+        if parsed.get("level") != "all levels":
+            parsed_merged["level"] = parsed["level"]
+        if parsed.get("is_paid") is not None:
+            parsed_merged["is_paid"] = parsed["is_paid"]
+        if parsed.get("min_price") is not None:
+            parsed_merged["min_price"] = parsed["min_price"]
+        if parsed.get("max_price") is not None:
+            parsed_merged["max_price"] = parsed["max_price"]
+        
+        # Update partial query
+        state.partial_query = merged_query
+        parsed = parsed_merged
+        
+        # Acknowledge the addition
+        acknowledgment = "Got it! "
+        if parsed.get("min_price") or parsed.get("max_price"):
+            acknowledgment += "I'll include your budget preference. "
+        if parsed.get("level") != "all levels":
+            acknowledgment += f"Looking for {parsed['level']}. "
+        if parsed.get("is_paid") is False:
+            acknowledgment += "Filtering for free courses. "
+        elif parsed.get("is_paid") is True:
+            acknowledgment += "Including paid courses. "
+    else:
+        acknowledgment = ""
+    
+    # Check if we need more information
+    needs_info, missing, question = needs_more_info(query, parsed)
+    
+    if needs_info:
+        # Start gathering information
+        state.awaiting_info = missing
+        state.partial_query = query
+        return question
+    
+    # We have enough info - get recommendations
+    recs = recommend_with_gemini(query, parsed_override=parsed)
+    
+    if recs.empty:
+        # Clear partial context on failure but keep last query
+        state.partial_query = ""
+        # Generate empathetic response using Gemini
+        from utils.gemini_utils import stream_empathetic_no_results_message
+        return stream_empathetic_no_results_message(query, parsed)
+    
+    state.recommended = recs
+    state.page = 0
+    
+    # Store last successful query and filters for context
+    state.last_query = query
+    state.last_parsed = parsed.copy()
+    
+    # Check if we should offer refinement
+    ask_followup, followup_q = should_ask_followup(
+        len(recs),
+        state.conversation_context
+    )
+    
+    response = acknowledgment + build_conversational_response(parsed, len(recs))
+    
+    if ask_followup:
+        state.awaiting_info = "refinement"
+        state.conversation_context["asked_refinement"] = True
+        response += "\n\n" + followup_q
+    
+    # Clear partial context after successful search (but keep last_query for context)
+    state.partial_query = ""
+    
+    return response
+
+
+def handle_turn(state, query):
+    """
+    Reply to one chat message
+    Returns: (turn type, reply) - reply is a string or, for generated
+    messages, a generator of text chunks
+    """
+    usage = state.token_usage
+    tokens_before = token_usage.total_tokens(usage)
+    with metrics.span("handle_turn") as span, token_usage.session_scope(usage):
+        turn_type, reply = _dispatch_turn(state, query)
+        span.set(turn_type=turn_type, tokens=token_usage.total_tokens(usage) - tokens_before)
+    metrics.increment("chat_turns_total", turn_type=turn_type)
+    return turn_type, reply
+
+
+def _dispatch_turn(state, query):
+    chitchat = handle_chitchat(state, query)
+    if chitchat:
+        return "chitchat", chitchat
+
+    # Check if we're in middle of gathering information
+    if state.awaiting_info:
+        turn_type = "followup_" + state.awaiting_info
+        return turn_type, handle_followup_response(state, query)
+
+    # New query - intent and filters in one analysis step
+    intent, parsed = analyze_query(query)
+
+    if intent == "recommendation":
+        return "recommendation", handle_recommendation_flow(state, query, parsed)
+
+    # For non-recommendation queries, preserve context but don't search
+    return "dataset_question", answer_dataset_question(query, parsed.get("aggregate"))
@@ -1,107 +1,294 @@
-import pandas as pd
-import numpy as np
+"""
+Course recommendation engine
+
+Importing this module loads nothing: the index is opened (or built) by
+get_index() on first use, and the pandas/SciPy-backed search modules are
+imported by the functions that need them.
+"""
 import os
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from utils.gemini_utils import parse_query_with_gemini, model
+import re
+import threading
+from utils.catalog_query import format_result, plan_question_locally, run_plan
+from utils.gemini_utils import (
+    analyze_turn, generate_text, guess_intent, parse_query_with_gemini,
+    plan_dataset_question_with_gemini
+)
+from utils.query_parser import parse_query_locally
+from utils import metrics
+from utils.token_usage import TokenBudgetExceeded
 
-# Load dataset using path relative to this script
+# Dataset path relative to this script; the fitted index lives in data/index/
 script_dir = os.path.dirname(os.path.abspath(__file__))
 csv_path = os.path.join(script_dir, "data", "udemy_courses.csv")
-df = pd.read_csv(csv_path)
 
-df.drop_duplicates(inplace=True)
-df.fillna("", inplace=True)
+# Rule-based parses at or above this confidence skip the Gemini call
+LOCAL_PARSE_CONFIDENCE = 0.75
+
+# Prompt budget for the courses sent with a dataset question
+DATASET_CONTEXT_TOKENS = 1000
 
-df["course_title"] = df["course_title"].str.lower()
-df["subject"] = df["subject"].str.lower()
-df["level"] = df["level"].str.lower()
-df["price"] = pd.to_numeric(df["price"], errors="coerce").fillna(0)
-df["is_paid"] = df["is_paid"].astype(bool)
+# Default retrieval for recommend_with_gemini (see utils.search.RETRIEVAL_MODES)
+SEARCH_RETRIEVAL = os.getenv("SEARCH_RETRIEVAL", "maxscore")
 
-df["semantic_text"] = df["course_title"] + " " + df["subject"]
+# Default term weighting for recommend_with_gemini (see utils.search.SCORERS)
+SEARCH_SCORER = os.getenv("SEARCH_SCORER", "tfidf")
 
-# TF-IDF
-tfidf = TfidfVectorizer(
-    stop_words="english",
-    ngram_range=(1, 2),
-    min_df=2
+# Phrasing that suggests a question about the catalog rather than a search
+DATASET_QUESTION_PATTERN = re.compile(
+    r"^\s*(how many|how much|what|which|who|when|is there|are there|average|count|total)\b"
+    r"|\?\s*$"
 )
 
-tfidf_matrix = tfidf.fit_transform(df["semantic_text"])
+_index = None
+_index_lock = threading.Lock()
+_updater = None
+_watcher = None
+
+
+def get_index():
+    """Load the persisted TF-IDF index on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                with metrics.span("load_index"):
+                    from utils.index_store import load_index
+                    _index = load_index(csv_path)
+    return _index
+
+
+def set_index(index):
+    """Serve searches from index (e.g. a scaled copy in benchmarks)"""
+    global _index
+    with _index_lock:
+        _index = index
+
+
+def get_updater():
+    """CatalogUpdater publishing new index generations through set_index"""
+    global _updater
+    if _updater is None:
+        with _index_lock:
+            if _updater is None:
+                from utils.catalog_updates import CatalogUpdater
+                _updater = CatalogUpdater(get_index, set_index)
+    return _updater
+
+
+def upsert_courses(rows):
+    """
+    Add courses, or replace those with the same course_id, without a restart
+    rows: dicts (or a DataFrame) with the catalog CSV's columns
+    """
+    get_updater().upsert(rows)
+
+
+def delete_courses(course_ids):
+    get_updater().delete(course_ids)
+
+
+def watch_catalog(interval=None):
+    """
+    Reload the catalog CSV into the live index whenever it changes
+    Started once per process; interval defaults to CATALOG_WATCH_INTERVAL
+    (0 disables watching).
+    """
+    global _watcher
+    from utils.catalog_updates import WATCH_INTERVAL, CatalogWatcher
+
+    interval = WATCH_INTERVAL if interval is None else interval
+    if interval <= 0:
+        return None
+    updater = get_updater()
+    get_index()
+    with _index_lock:
+        if _watcher is None:
+            _watcher = CatalogWatcher(csv_path, updater, interval).start()
+    return _watcher
+
+
+def get_catalog():
+    """Display catalog with O(1) course_id lookup, shared by all sessions"""
+    return get_index().courses
+
 
+def __getattr__(name):
+    # Keep `recommender.df` / `recommender.tfidf_matrix` working without
+    # loading anything at import time
+    if name == "df":
+        return get_index().catalog
+    if name == "tfidf_matrix":
+        return get_index().tfidf_matrix
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@metrics.traced("parse_query")
+def parse_query(user_query):
+    """Parse a query with local rules, asking Gemini only when unsure"""
+    index = get_index()
+    parsed, confidence = parse_query_locally(
+        user_query, index.vocabulary, index.analyze, index.idf
+    )
+    if confidence >= LOCAL_PARSE_CONFIDENCE:
+        return parsed
+    try:
+        return parse_query_with_gemini(user_query)
+    except TokenBudgetExceeded:
+        return parsed
+
+
+@metrics.traced("analyze_query")
+def analyze_query(user_query):
+    """
+    Intent and filters for a chat turn
+    Confident local parses of search-like turns need no LLM call; anything
+    else costs exactly one (intent and filters come back together), unless
+    the session's token budget is used up.
+    Returns: (intent, parsed filters)
+    """
+    index = get_index()
+    is_question = DATASET_QUESTION_PATTERN.search(user_query.lower())
+    if is_question:
+        # Templated aggregate questions are answered locally, no LLM needed
+        plan, confidence = plan_question_locally(
+            user_query, index.vocabulary, index.analyze, index.idf
+        )
+        if plan is not None and confidence >= LOCAL_PARSE_CONFIDENCE:
+            return "dataset_question", {
+                field: plan[field]
+                for field in ("keywords", "level", "is_paid", "min_price", "max_price")
+            }
+    else:
+        parsed, confidence = parse_query_locally(
+            user_query, index.vocabulary, index.analyze, index.idf
+        )
+        if confidence >= LOCAL_PARSE_CONFIDENCE:
+            return "recommendation", parsed
+
+    try:
+        return analyze_turn(user_query)
+    except TokenBudgetExceeded:
+        if is_question:
+            parsed, _ = parse_query_locally(user_query, index.vocabulary, index.analyze, index.idf)
+            return guess_intent(user_query), parsed
+        return "recommendation", parsed
+
+
+@metrics.traced("recommend_with_gemini")
+def recommend_with_gemini(user_query, min_match_percent=50, top_n=10, parsed_override=None,
+                          retrieval=None, scorer=None):
+    """
+    Ranked courses for a chat query
+    retrieval: "maxscore" / "exhaustive" (sparse), "dense" (LSA) or "ann";
+    defaults to SEARCH_RETRIEVAL
+    scorer: "tfidf" or "bm25" for the sparse modes; defaults to SEARCH_SCORER
+    """
+    from utils.search import search
 
-def recommend_with_gemini(user_query, min_match_percent=50, top_n=10, parsed_override=None):
     # Allow passing pre-parsed filters for conversational flow
     if parsed_override:
         parsed = parsed_override
     else:
-        parsed = parse_query_with_gemini(user_query)
+        parsed = parse_query(user_query)
 
     semantic_query = " ".join(parsed["keywords"])
     if not semantic_query:
         semantic_query = user_query.lower()
 
-    query_vector = tfidf.transform([semantic_query])
-    similarity_scores = cosine_similarity(
-        query_vector, tfidf_matrix
-    )[0]
-
-    results = df.copy()
-    results["match_percent"] = similarity_scores * 100
-
-    # Confidence threshold
-    results = results[
-        results["match_percent"] >= min_match_percent
-    ]
-
-    # Level filter
-    if parsed["level"] != "all levels":
-        results = results[
-            results["level"] == parsed["level"]
-        ]
-
-    # Paid filter
-    if parsed["is_paid"] is not None:
-        results = results[
-            results["is_paid"] == parsed["is_paid"]
-        ]
-
-    # Price filter
-    if parsed["is_paid"]:
-        if parsed["min_price"] is not None:
-            results = results[
-                results["price"] >= parsed["min_price"]
-            ]
-        if parsed["max_price"] is not None:
-            results = results[
-                results["price"] <= parsed["max_price"]
-            ]
-
-    return results.sort_values(
-        by="match_percent", ascending=False
-    )[[
-        "course_id",
-        "match_percent"
-    ]].head(top_n)
-
-
-def answer_dataset_question(question):
-    sample_data = df.sample(
-        min(40, len(df))
-    ).to_csv(index=False)
+    return search(
+        get_index(), semantic_query, parsed, min_match_percent, top_n,
+        retrieval or SEARCH_RETRIEVAL, scorer=scorer or SEARCH_SCORER
+    )
+
+
+@metrics.traced("recommend_many")
+def recommend_many(queries, filters=None, min_match_percent=50, top_n=10, chunk_size=256):
+    """
+    Batch recommendations for offline jobs and query-log replay
+    queries: keyword query strings (not sent to Gemini)
+    filters: one parsed-filter dict for all queries, or a list with one per query
+    Returns: list of DataFrame[course_id, match_percent], in query order
+    """
+    from utils.search import search_many
+
+    semantic_queries = [query.lower() for query in queries]
+    return search_many(
+        get_index(), semantic_queries, filters, min_match_percent, top_n, chunk_size
+    )
+
+
+@metrics.traced("plan_dataset_question")
+def plan_dataset_question(question, aggregate=None):
+    """
+    Aggregate plan for a dataset question
+    Templated questions are planned locally; Gemini only picks the operation
+    for the rest, unless aggregate is False (the turn analysis already said
+    the question is not one). Returns None when the question is not an
+    aggregate.
+    """
+    index = get_index()
+    plan, confidence = plan_question_locally(question, index.vocabulary, index.analyze, index.idf)
+    if plan is not None and confidence >= LOCAL_PARSE_CONFIDENCE:
+        return plan
+    if aggregate is False:
+        return None
+    try:
+        return plan_dataset_question_with_gemini(question)
+    except TokenBudgetExceeded:
+        return plan
+
+
+@metrics.traced("answer_dataset_question")
+def answer_dataset_question(question, aggregate=None):
+    """
+    Reply to a dataset question: an exact aggregate, or Gemini reading the
+    most relevant courses
+    aggregate: the turn analysis' verdict, if any (see plan_dataset_question)
+    """
+    plan = plan_dataset_question(question, aggregate)
+    if plan is not None:
+        return format_result(plan, run_plan(get_index(), plan))
+
+    from utils.dataset_context import build_dataset_context
+
+    # Not an aggregate: let Gemini read the most relevant courses
+    index = get_index()
+    filters, _ = parse_query_locally(question, index.vocabulary, index.analyze, index.idf)
+    table, packed, matching = build_dataset_context(
+        index, question, filters, DATASET_CONTEXT_TOKENS
+    )
 
     prompt = f"""
 Answer ONLY using the dataset below.
 If the answer is not present, say:
 "Not available in the dataset."
 
+The dataset lists the {packed} courses most relevant to the question, out of
+{matching} matching courses. Prices are in rupees.
+
 Dataset:
-{sample_data}
+{table}
 
 Question:
 {question}
 """
 
-    response = model.generate_content(prompt)
-    return response.text
+    try:
+        return generate_text(prompt, call_site="dataset_answer")
+    except TokenBudgetExceeded:
+        return budget_fallback_answer(index, question, filters)
+
+
+def budget_fallback_answer(index, question, filters, limit=5):
+    """Reply listing the most relevant courses, for sessions out of LLM tokens"""
+    from utils.dataset_context import relevant_rows
+
+    semantic_query = " ".join(filters.get("keywords") or []) or question.lower()
+    rows = relevant_rows(index, semantic_query, filters, limit)
+    # rows address the index's catalog, which may include deleted rows
+    courses = [index.courses.get(course_id) for course_id in index.course_ids[rows].tolist()]
+    lines = [f"- {course['course_title']} ({course['price_label']})" for course in courses]
+    return (
+        "I've reached the AI usage limit for this chat, so I can't answer that in detail. "
+        "These courses look most relevant to your question:\n" + "\n".join(lines)
+    )
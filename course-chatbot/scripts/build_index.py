@@ -0,0 +1,29 @@
+"""
+Build the persisted recommender index
+
+Usage (from the course-chatbot directory):
+    python -m scripts.build_index [--csv data/udemy_courses.csv] [--out data/index]
+"""
+import argparse
+import os
+import time
+
+from utils.index_store import build_index
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CSV = os.path.join(script_dir, "..", "data", "udemy_courses.csv")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="catalog CSV to index")
+    parser.add_argument("--out", default=None, help="index root (default: data/index next to the CSV)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    path = build_index(os.path.abspath(args.csv), args.out)
+    print(f"Built {path} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
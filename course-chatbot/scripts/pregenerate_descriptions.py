@@ -0,0 +1,92 @@
+"""
+Pre-generate AI course overviews for the whole catalog
+
+Walks the catalog and generates a description for every course that has
+none stored, or whose fields changed since. Results are committed every
+--batch-size courses, so an interrupted run resumes where it stopped.
+
+Usage (from the course-chatbot directory):
+    python -m scripts.pregenerate_descriptions [--concurrency 8] [--limit N]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from utils.description_store import course_fields_hash, get_description_store
+from utils.gemini_utils import course_description_prompt, get_client
+from utils.index_store import load_index
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CSV = os.path.join(script_dir, "..", "data", "udemy_courses.csv")
+
+logger = logging.getLogger("pregenerate_descriptions")
+
+
+def pending_courses(courses, known_hashes):
+    """Courses with no stored description or a stale one"""
+    for course in courses:
+        fields_hash = course_fields_hash(course)
+        if known_hashes.get(int(course["course_id"])) != fields_hash:
+            yield course, fields_hash
+
+
+async def generate_all(courses, store, concurrency, batch_size):
+    gate = asyncio.Semaphore(concurrency)
+    done = []
+    counts = {"generated": 0, "failed": 0}
+
+    async def one(course, fields_hash):
+        async with gate:
+            try:
+                response = await get_client().generate(
+                    course_description_prompt(course)
+                )
+                text = response.text.strip()
+            except Exception as exc:
+                counts["failed"] += 1
+                logger.warning("course %s failed: %r", course["course_id"], exc)
+                return
+        if text:
+            done.append((course["course_id"], fields_hash, text))
+            counts["generated"] += 1
+        if len(done) >= batch_size:
+            store.put_many(done)
+            done.clear()
+
+    await asyncio.gather(*(one(course, h) for course, h in courses))
+    if done:
+        store.put_many(done)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--csv", default=DEFAULT_CSV)
+    parser.add_argument("--store", default=None, help="SQLite path (default: data/descriptions.db)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=50, help="courses per checkpoint")
+    parser.add_argument("--limit", type=int, default=None, help="stop after N courses")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    # Same records the details view hashes, so stored entries match
+    catalog = load_index(args.csv).courses
+    store = get_description_store(args.store)
+
+    courses = list(pending_courses(catalog.records, store.known_hashes()))
+    if args.limit is not None:
+        courses = courses[:args.limit]
+    logger.info("%d of %d courses need a description", len(courses), len(catalog))
+
+    start = time.perf_counter()
+    counts = asyncio.run(generate_all(courses, store, args.concurrency, args.batch_size))
+    logger.info(
+        "generated %d, failed %d in %.1fs",
+        counts["generated"], counts["failed"], time.perf_counter() - start
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+IVF-PQ approximate nearest-neighbour search over the dense vectors
+
+For catalogs too large to score every course: a coarse k-means splits the
+vectors into nlist inverted lists (IVF), and each vector is stored as its
+list plus a product-quantized residual - m one-byte codes, one per
+subspace of the vector (PQ). A query scores only the nprobe lists whose
+centroids are most similar to it:
+
+    score(q, x) ~= q . centroid(x) + sum_j lut[j, code_j(x)]
+
+where lut[j] holds q's inner product with every codeword of subspace j.
+The tables are built once per query, so a scanned vector costs m lookups.
+More probes give higher recall at lower throughput. Given the full-precision
+vectors (e.g. memory-mapped), the best k * refine candidates are re-scored
+exactly, which recovers most of the quantization error.
+"""
+import numpy as np
+from scipy import sparse
+
+from utils.filter_index import bits_contain
+from utils.search import top_k
+
+ANN_FILES = (
+    "ann_centroids.npy",
+    "ann_codebooks.npy",
+    "ann_list_ptr.npy",
+    "ann_list_ids.npy",
+    "ann_codes.npy"
+)
+
+# Lists scanned per query unless the caller asks for another count
+DEFAULT_NPROBE = 8
+
+# Subquantizers per vector (bytes per code); must divide the vector size,
+# so smaller vectors (few courses) use the largest divisor below it
+DEFAULT_SUBSPACES = 16
+
+# Codewords per subspace, so each code fits in one byte
+PQ_CODES = 256
+
+# Candidates re-scored exactly per result when vectors are available
+DEFAULT_REFINE = 10
+
+# Rows per distance block, bounding k-means/encoding memory
+ASSIGN_CHUNK = 8192
+
+
+def subspaces_for(dim, m=DEFAULT_SUBSPACES):
+    """Largest subspace count up to m that divides the vector size"""
+    return max(j for j in range(1, min(m, dim) + 1) if dim % j == 0)
+
+
+def nearest(data, centroids):
+    """Position of the closest centroid (squared l2) for every row of data"""
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    labels = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), ASSIGN_CHUNK):
+        block = data[start:start + ASSIGN_CHUNK]
+        distances = centroid_norms - 2 * (block @ centroids.T)
+        labels[start:start + len(block)] = distances.argmin(axis=1)
+    return labels
+
+
+def kmeans(data, k, iters=10, seed=0):
+    """Lloyd's k-means; empty clusters are re-seeded from random rows"""
+    rng = np.random.default_rng(seed)
+    data = np.ascontiguousarray(data, dtype=np.float32)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+
+    for _ in range(iters):
+        labels = nearest(data, centroids)
+        # One-hot (k x n) times data sums each cluster in one sparse product
+        members = sparse.csr_matrix(
+            (np.ones(len(data), dtype=np.float32), (labels, np.arange(len(data)))),
+            shape=(k, len(data))
+        )
+        counts = np.bincount(labels, minlength=k)
+        sums = members @ data
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+    return centroids
+
+
+class IVFPQIndex:
+    def __init__(self, centroids, codebooks, list_ptr, list_ids, codes):
+        """
+        centroids: (nlist x dim) coarse centroids
+        codebooks: (m x ksub x dim / m) PQ codewords per subspace
+        list_ptr, list_ids: vectors of list l are list_ids[list_ptr[l]:list_ptr[l + 1]]
+        codes: (n x m) uint8 PQ codes, in list_ids order
+        """
+        self.centroids = centroids
+        self.codebooks = codebooks
+        self.list_ptr = list_ptr
+        self.list_ids = list_ids
+        self.codes = codes
+
+        m, ksub, _ = codebooks.shape
+        # Offsets turning (subspace, code) into a position in the flat tables
+        self._lut_offsets = (np.arange(m) * ksub).astype(np.intp)
+
+    @classmethod
+    def train(cls, vectors, nlist=None, m=None, sample=100_000, iters=10, seed=0):
+        """
+        Fit the coarse and product quantizers on (a sample of) vectors and
+        encode all of them
+        nlist: inverted lists; defaults to 4 * sqrt(n)
+        m: subspaces; defaults to subspaces_for(vector size)
+        """
+        n, dim = vectors.shape
+        if m is None:
+            m = subspaces_for(dim)
+        if dim % m:
+            raise ValueError(f"{m} subspaces do not divide vector size {dim}")
+        if nlist is None:
+            nlist = max(1, int(4 * np.sqrt(n)))
+
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(n, min(n, sample), replace=False))
+        train_set = np.ascontiguousarray(vectors[rows], dtype=np.float32)
+
+        centroids = kmeans(train_set, nlist, iters, seed)
+        residuals = train_set - centroids[nearest(train_set, centroids)]
+        sub = dim // m
+        codebooks = np.stack([
+            kmeans(residuals[:, j * sub:(j + 1) * sub], PQ_CODES, iters, seed + 1 + j)
+            for j in range(m)
+        ])
+
+        lists, codes = cls._encode(vectors, centroids, codebooks)
+        order = np.argsort(lists, kind="stable")
+        list_ptr = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(lists, minlength=len(centroids)), out=list_ptr[1:])
+        return cls(centroids, codebooks, list_ptr, order.astype(np.int64), codes[order])
+
+    @staticmethod
+    def _encode(vectors, centroids, codebooks):
+        """Coarse list and PQ codes of every vector, in blocks"""
+        m, _, sub = codebooks.shape
+        lists = np.empty(len(vectors), dtype=np.int32)
+        codes = np.empty((len(vectors), m), dtype=np.uint8)
+        for start in range(0, len(vectors), ASSIGN_CHUNK):
+            block = np.asarray(vectors[start:start + ASSIGN_CHUNK], dtype=np.float32)
+            block_lists = nearest(block, centroids)
+            residuals = block - centroids[block_lists]
+            lists[start:start + len(block)] = block_lists
+            for j in range(m):
+                codes[start:start + len(block), j] = nearest(
+                    residuals[:, j * sub:(j + 1) * sub], codebooks[j]
+                )
+        return lists, codes
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @property
+    def nbytes(self):
+        """Memory held by the index arrays"""
+        return sum(
+            array.nbytes
+            for array in (self.centroids, self.codebooks, self.list_ptr, self.list_ids, self.codes)
+        )
+
+    def search(self, query, k, nprobe=DEFAULT_NPROBE, candidate_bits=None,
+               vectors=None, refine=DEFAULT_REFINE):
+        """
+        Approximate top-k by inner product with a dense query vector
+        candidate_bits: optional packed filter bitset; other vectors are skipped.
+        The probes are widened so that about as many candidates are scanned
+        as without a filter; when vectors are given and the candidates are
+        fewer than the vectors those probes would scan, they are all scored
+        exactly instead.
+        vectors: full-precision vectors to re-score the best k * refine with
+        Returns: (ids, scores), best first - exact scores when refined
+        """
+        if candidate_bits is not None:
+            n = len(self.list_ids)
+            candidates = np.flatnonzero(np.unpackbits(candidate_bits, count=n))
+            nprobe = int(np.ceil(nprobe * n / max(len(candidates), 1)))
+            if vectors is not None and len(candidates) <= min(nprobe, self.nlist) * n / self.nlist:
+                exact = vectors[candidates] @ query
+                best = top_k(exact, k)
+                return candidates[best], exact[best]
+
+        m, _, sub = self.codebooks.shape
+        coarse = self.centroids @ query
+        probed = top_k(coarse, min(nprobe, self.nlist))
+
+        lut = np.einsum("jcd,jd->jc", self.codebooks, query.reshape(m, sub)).ravel()
+
+        starts = self.list_ptr[probed]
+        ends = self.list_ptr[probed + 1]
+        sizes = ends - starts
+        if sizes.sum() == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        positions = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+        ids = self.list_ids[positions]
+        codes = self.codes[positions]
+        base = np.repeat(coarse[probed], sizes)
+
+        if candidate_bits is not None:
+            allowed = bits_contain(candidate_bits, ids)
+            ids, codes, base = ids[allowed], codes[allowed], base[allowed]
+
+        scores = base + lut[codes + self._lut_offsets].sum(axis=1)
+        if vectors is None:
+            best = top_k(scores, k)
+            return ids[best], scores[best]
+
+        shortlist = ids[top_k(scores, k * refine)]
+        shortlist.sort()   # ascending rows read a memory-mapped matrix in order
+        exact = vectors[shortlist] @ query
+        best = top_k(exact, k)
+        return shortlist[best], exact[best]
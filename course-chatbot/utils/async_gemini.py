@@ -0,0 +1,329 @@
+"""
+Asyncio wrapper around the Gemini model
+
+Adds what the bare model.generate_content call lacks:
+- a deadline per call (covering retries)
+- a cap on in-flight requests for the whole process
+- exponential backoff with jitter on retryable errors (429/5xx/timeouts)
+- optional hedging: if a request is slower than the recent p95 latency,
+  send a duplicate and take whichever answers first; the duplicate needs
+  a free slot under the cap, so hedging never exceeds it
+
+All calls run on one background event loop, so the semaphore and the
+model's async transport stay bound to a single loop. generate_sync() is the
+entry point for synchronous code such as the Streamlit script, and
+stream_sync() yields text chunks as they arrive.
+"""
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# HTTP-style status codes worth retrying (google.api_core exceptions carry .code)
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+_STREAM_END = object()
+
+
+class GeminiTimeout(TimeoutError):
+    """The call did not finish before its deadline"""
+
+
+def is_retryable(exc):
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    code = getattr(exc, "code", None)
+    code = getattr(code, "value", code)   # grpc StatusCode enums wrap ints
+    return code in RETRYABLE_CODES
+
+
+class ThreadedModel:
+    """
+    Async facade over a model with only working sync calls
+    The SDK's REST transport (used for custom endpoints) has no async path,
+    so calls run on a dedicated thread pool. A call abandoned on timeout
+    keeps its thread until the HTTP request returns. The SDK's own retry is
+    turned off so only AsyncGeminiClient retries.
+    """
+
+    def __init__(self, model, max_workers=8):
+        self.model = model
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers, thread_name_prefix="gemini-rest"
+        )
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def generate_content(self, prompt, **kwargs):
+        kwargs.setdefault("request_options", {"retry": None})
+        return self.model.generate_content(prompt, **kwargs)
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        response = await self._run(self.generate_content, prompt, stream=stream, **kwargs)
+        return _ThreadedStream(response, self._run) if stream else response
+
+    def _run(self, fn, *args, **kwargs):
+        return asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(fn, *args, **kwargs)
+        )
+
+
+class _ThreadedStream:
+    def __init__(self, response, run):
+        self.response = response
+        self.run = run
+
+    async def __aiter__(self):
+        chunks = iter(self.response)
+        while True:
+            chunk = await self.run(next, chunks, _STREAM_END)
+            if chunk is _STREAM_END:
+                return
+            yield chunk
+
+
+class AsyncGeminiClient:
+    def __init__(self, model, max_concurrency=8, timeout=20.0, max_retries=2,
+                 backoff_base=0.5, backoff_max=8.0, hedge_after=None,
+                 hedge_quantile=0.95, min_hedge_samples=20):
+        """
+        hedge_after: None (no hedging), a delay in seconds, or "auto" to
+        hedge after the hedge_quantile of recent latencies
+        """
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_samples = min_hedge_samples
+
+        self._latencies = deque(maxlen=500)
+        self._semaphore = None
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        self.stats = {
+            "calls": 0,
+            "attempts": 0,
+            "retries": 0,
+            "timeouts": 0,
+            "failures": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "hedges_skipped": 0
+        }
+
+    # ---------------- async API ----------------
+
+    async def generate(self, prompt, timeout=None, **kwargs):
+        """Response of model.generate_content_async, within the deadline"""
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        self.stats["calls"] += 1
+
+        attempt = 0
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self.stats["timeouts"] += 1
+                raise GeminiTimeout(f"Gemini call exceeded {timeout:.1f}s")
+
+            try:
+                return await asyncio.wait_for(
+                    self._limited(prompt, kwargs), remaining
+                )
+            except Exception as exc:
+                delay = self._retry_delay(exc, attempt, deadline - loop.time(), timeout)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def stream(self, prompt, timeout, kwargs, emit, usage=None):
+        """
+        Stream response text into emit(chunk)
+        Retries only happen before the first chunk; once text has been
+        emitted a failure is raised to the caller. If usage is a dict, the
+        stream's usage_metadata (sent with the last chunk) is stored in
+        usage["metadata"].
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        self.stats["calls"] += 1
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        attempt = 0
+        while True:
+            emitted = False
+            try:
+                async with self._semaphore:
+                    self.stats["attempts"] += 1
+                    start = time.perf_counter()
+                    response = await asyncio.wait_for(
+                        self.model.generate_content_async(prompt, stream=True, **kwargs),
+                        deadline - loop.time()
+                    )
+                    chunks = response.__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(
+                                chunks.__anext__(), deadline - loop.time()
+                            )
+                        except StopAsyncIteration:
+                            break
+                        if chunk.text:
+                            emit(chunk.text)
+                            emitted = True
+                        if usage is not None and getattr(chunk, "usage_metadata", None):
+                            usage["metadata"] = chunk.usage_metadata
+                    self._latencies.append(time.perf_counter() - start)
+                    return
+            except Exception as exc:
+                if emitted:
+                    self.stats["failures"] += 1
+                    raise
+                delay = self._retry_delay(exc, attempt, deadline - loop.time(), timeout)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def _retry_delay(self, exc, attempt, remaining, timeout):
+        """Backoff before the next attempt, or raise if exc is final"""
+        if not is_retryable(exc) or attempt >= self.max_retries:
+            if isinstance(exc, asyncio.TimeoutError):
+                self.stats["timeouts"] += 1
+                raise GeminiTimeout(f"Gemini call exceeded {timeout:.1f}s") from exc
+            self.stats["failures"] += 1
+            raise exc
+
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        delay = random.uniform(0, delay)  # full jitter
+        if delay >= remaining:
+            self.stats["timeouts"] += 1
+            raise GeminiTimeout(f"Gemini call exceeded {timeout:.1f}s") from exc
+
+        logger.warning("Gemini call failed (%r); retrying in %.2fs", exc, delay)
+        self.stats["retries"] += 1
+        return delay
+
+    async def _limited(self, prompt, kwargs):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            delay = self.hedge_delay()
+            if delay is None:
+                return await self._timed(prompt, kwargs)
+            return await self._hedged(prompt, kwargs, delay)
+
+    async def _timed(self, prompt, kwargs):
+        self.stats["attempts"] += 1
+        start = time.perf_counter()
+        response = await self.model.generate_content_async(prompt, **kwargs)
+        self._latencies.append(time.perf_counter() - start)
+        return response
+
+    async def _hedged(self, prompt, kwargs, delay):
+        primary = asyncio.ensure_future(self._timed(prompt, kwargs))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            # The backup takes its own slot; with none free, keep waiting
+            if self._semaphore.locked():
+                self.stats["hedges_skipped"] += 1
+                return await primary
+            await self._semaphore.acquire()
+            self.stats["hedges"] += 1
+            backup = asyncio.ensure_future(self._timed(prompt, kwargs))
+            backup.add_done_callback(lambda _: self._semaphore.release())
+            pending.add(backup)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Also runs when the caller's deadline cancels us
+            for task in pending:
+                task.cancel()
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging, or None to send a single request"""
+        if self.hedge_after is None:
+            return None
+        if self.hedge_after != "auto":
+            return float(self.hedge_after)
+        if len(self._latencies) < self.min_hedge_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(self.hedge_quantile * len(ordered)))]
+
+    # ---------------- sync bridge ----------------
+
+    def _background_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="gemini-client", daemon=True
+                )
+                thread.start()
+                self._loop = loop
+        return self._loop
+
+    def generate_sync(self, prompt, timeout=None, **kwargs):
+        """Blocking generate() for synchronous callers"""
+        timeout = self.timeout if timeout is None else timeout
+        future = asyncio.run_coroutine_threadsafe(
+            self.generate(prompt, timeout=timeout, **kwargs),
+            self._background_loop()
+        )
+        # generate() enforces the deadline itself; the margin only guards
+        # against a wedged loop
+        try:
+            return future.result(timeout + 1.0)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise GeminiTimeout(f"Gemini call exceeded {timeout:.1f}s")
+
+    def stream_sync(self, prompt, timeout=None, usage=None, **kwargs):
+        """Generator of response text chunks for synchronous callers"""
+        timeout = self.timeout if timeout is None else timeout
+        chunks = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            self.stream(prompt, timeout, kwargs, chunks.put, usage),
+            self._background_loop()
+        )
+        future.add_done_callback(lambda _: chunks.put(_STREAM_END))
+
+        try:
+            while True:
+                try:
+                    chunk = chunks.get(timeout=timeout + 1.0)
+                except queue.Empty:
+                    raise GeminiTimeout(f"Gemini call exceeded {timeout:.1f}s")
+                if chunk is _STREAM_END:
+                    break
+                yield chunk
+            future.result()  # re-raise a failure from the stream
+        finally:
+            if not future.done():
+                future.cancel()
@@ -0,0 +1,92 @@
+"""
+BM25 weights over the TF-IDF index's term structure
+
+Course titles are short, so how much a term counts should depend on how
+long the title is. BM25 saturates repeated terms (k1) and discounts long
+documents (b):
+
+    impact(t, d) = idf(t) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(d) / avg_len))
+
+Only the raw term frequencies (uint16, aligned with the TF-IDF matrix's
+entries) and the document lengths (float32) are stored; the per-entry
+impacts are computed when the index is opened, so k1 and b can be tuned
+without a rebuild. The impacts go into an InvertedIndex, so BM25 queries
+use the same term-at-a-time / MaxScore scoring as cosine TF-IDF.
+
+Match percentages: a query's term weights are scaled by the sum of its
+terms' best impacts, so a course scores 100% when it has the highest
+impact of every query term and the usual min_match_percent applies.
+"""
+import os
+
+import numpy as np
+from scipy import sparse
+
+from utils.inverted_index import InvertedIndex
+
+BM25_FILES = ("bm25_tf.npy", "bm25_doc_len.npy")
+
+K1 = float(os.getenv("BM25_K1", "1.2"))
+B = float(os.getenv("BM25_B", "0.75"))
+
+
+def term_frequencies(count_matrix, tfidf_matrix):
+    """Raw counts as uint16, entry-aligned with tfidf_matrix (same sparsity)"""
+    counts = count_matrix.tocsr()
+    counts.sort_indices()
+    if not (np.array_equal(counts.indptr, tfidf_matrix.indptr)
+            and np.array_equal(counts.indices, tfidf_matrix.indices)):
+        raise ValueError("count matrix does not match the TF-IDF matrix")
+    return np.minimum(counts.data, np.iinfo(np.uint16).max).astype(np.uint16)
+
+
+class BM25Index:
+    def __init__(self, matrix, postings, idf, avg_len):
+        """
+        matrix: (num_docs x num_terms) CSR of BM25 impacts
+        postings: the same impacts term-major (InvertedIndex)
+        idf: BM25 idf per term
+        avg_len: average document length the impacts were normalized by
+        """
+        self.matrix = matrix
+        self.postings = postings
+        self.idf = idf
+        self.avg_len = avg_len
+
+    @classmethod
+    def from_stats(cls, tfidf_matrix, term_freqs, doc_len, k1=K1, b=B, idf=None, avg_len=None):
+        """
+        Impacts for term_freqs laid out on tfidf_matrix's indices/indptr
+        idf, avg_len: collection statistics to reuse (e.g. a delta segment
+        scored against its base); computed from these documents by default
+        """
+        num_docs, num_terms = tfidf_matrix.shape
+        if idf is None:
+            df = np.bincount(tfidf_matrix.indices, minlength=num_terms)
+            idf = np.log1p((num_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        if avg_len is None:
+            avg_len = float(doc_len.mean()) if num_docs else 1.0
+
+        rows = np.repeat(np.arange(num_docs), np.diff(tfidf_matrix.indptr))
+        tf = term_freqs.astype(np.float32)
+        norm = k1 * (1 - b + b * doc_len[rows] / max(avg_len, 1e-9))
+        impacts = idf[tfidf_matrix.indices] * tf * (k1 + 1) / (tf + norm)
+
+        matrix = sparse.csr_matrix(
+            (impacts.astype(np.float32), tfidf_matrix.indices, tfidf_matrix.indptr),
+            shape=tfidf_matrix.shape
+        )
+        return cls(matrix, InvertedIndex.from_csr(matrix), idf, avg_len)
+
+    def query_weights(self, term_ids, counts):
+        """Query term weights scaled so a perfect match scores 1.0"""
+        return query_weights(counts, self.postings.max_weights[term_ids])
+
+
+def query_weights(counts, max_impacts):
+    """Scale query term counts by the sum of the terms' best impacts"""
+    weights = np.asarray(counts, dtype=np.float64)
+    best = np.dot(weights, max_impacts)
+    if best > 0:
+        weights /= best
+    return weights
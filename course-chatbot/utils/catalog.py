@@ -0,0 +1,64 @@
+"""
+Course catalog for display
+
+Cards and the details view look courses up by course_id on every Streamlit
+rerun. CourseCatalog keeps one record per course with the display strings
+already formatted, plus a course_id -> row position dict, so rendering a
+card is a dict lookup instead of a scan over the catalog frame.
+"""
+import pandas as pd
+
+# Fields of a course record, in the original case of the CSV
+RECORD_FIELDS = (
+    "course_id",
+    "course_title",
+    "url",
+    "is_paid",
+    "price",
+    "num_subscribers",
+    "num_reviews",
+    "num_lectures",
+    "level",
+    "content_duration",
+    "published_timestamp",
+    "subject"
+)
+
+
+class CourseCatalog:
+    def __init__(self, catalog):
+        """catalog: cleaned catalog frame (see index_store.clean_catalog)"""
+        display = pd.DataFrame({
+            field: catalog.get("display_" + field, catalog[field])
+            for field in RECORD_FIELDS
+        })
+
+        price = display["price"]
+        display["price_label"] = ("₹" + price.map("{:g}".format)).where(price != 0, "FREE")
+        display["duration_label"] = (
+            pd.to_numeric(display["content_duration"], errors="coerce").round(2).map("{:g} hours".format)
+        )
+        display["published_label"] = pd.to_datetime(
+            display["published_timestamp"], errors="coerce"
+        ).dt.strftime("%d %B %Y").fillna("")
+
+        self.records = display.to_dict("records")
+        self._rows = {}
+        for row, record in enumerate(self.records):
+            # First occurrence wins if a course_id repeats
+            self._rows.setdefault(record["course_id"], row)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, course_id):
+        return course_id in self._rows
+
+    def position(self, course_id):
+        """Row position of course_id in the catalog, or None"""
+        return self._rows.get(course_id)
+
+    def get(self, course_id):
+        """Record dict for course_id, or None"""
+        row = self._rows.get(course_id)
+        return None if row is None else self.records[row]
@@ -0,0 +1,427 @@
+"""
+Aggregate questions over the course catalog
+
+Questions like "how many free courses are there" or "average price of web
+development courses" are answered from the full catalog instead of an LLM
+reading a sample. A question becomes a plan - one aggregate operation plus
+filters - which is executed with vectorized NumPy/pandas ops.
+
+Plan schema (also what DATASET_PLAN_PROMPT asks Gemini for):
+{
+  "operation": "count | mean | sum | min | max | top",
+  "metric": "price | num_subscribers | num_reviews | num_lectures | content_duration | null",
+  "group_by": "subject | level | is_paid | null",
+  "order": "desc | asc",
+  "n": number | null,
+  "subject": str | null,
+  "keywords": [],  # words that must appear in the course title
+  "conditions": [{"metric": <metric>, "op": "> | >= | < | <=", "value": number}],
+  "level", "is_paid", "min_price", "max_price"  # as in QUERY_PARSER_PROMPT
+}
+"""
+import operator
+import re
+
+import numpy as np
+
+from utils.query_parser import FILLER_WORDS, parse_query_locally
+
+OPERATIONS = ("count", "mean", "sum", "min", "max", "top")
+METRICS = ("price", "num_subscribers", "num_reviews", "num_lectures", "content_duration")
+GROUP_BY = ("subject", "level", "is_paid")
+
+METRIC_LABELS = {
+    "price": "price",
+    "num_subscribers": "number of subscribers",
+    "num_reviews": "number of reviews",
+    "num_lectures": "number of lectures",
+    "content_duration": "duration"
+}
+METRIC_UNITS = {
+    "num_subscribers": " subscribers",
+    "num_reviews": " reviews",
+    "num_lectures": " lectures",
+    "content_duration": " hours"
+}
+
+# (metric, pattern) - first match wins
+METRIC_PATTERNS = [
+    ("price", r"\b(prices?|priced|costs?|expensive|cheap(est|er)?|pricey)\b"),
+    ("num_subscribers", r"\b(subscribers?|subscriptions?|students?|learners?|enrolled|enrollments?|popular)\b"),
+    ("num_reviews", r"\b(reviews?|reviewed|ratings?|rated)\b"),
+    ("num_lectures", r"\b(lectures?|videos?)\b"),
+    ("content_duration", r"\b(duration|hours?|long(est)?|short(est)?|length)\b"),
+]
+
+# Plural nouns of the countable metrics: "how many subscribers" sums, it does not count
+METRIC_NOUNS = {
+    "num_subscribers": r"subscribers|subscriptions|students|learners|enrollments",
+    "num_reviews": r"reviews|ratings",
+    "num_lectures": r"lectures|videos",
+    "content_duration": r"hours",
+}
+
+# (op, pattern) of comparisons such as "more than 100 lectures"
+COMPARISON_OPS = [
+    (">", r"more than|greater than|longer than|over|above"),
+    (">=", r"at least|min(?:imum)?(?: of)?"),
+    ("<", r"less than|fewer than|shorter than|cheaper than|under|below"),
+    ("<=", r"at most|up ?to|max(?:imum)?(?: of)?|within"),
+]
+NUMBER = r"(?:(₹|rs\.?|inr|\$)\s*)?(\d+(?:\.\d+)?)(?:\s+([a-z]+))?"
+OPERATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+OP_WORDS = {">": "more than", ">=": "at least", "<": "less than", "<=": "at most"}
+
+# Superlatives that imply a sort order when no metric word is present
+DESC_PATTERN = r"\b(most|highest|largest|biggest|max(imum)?|top|longest|greatest|more)\b"
+ASC_PATTERN = r"\b(least|lowest|smallest|min(imum)?|cheapest|shortest|fewest|bottom)\b"
+
+GROUP_PATTERNS = [
+    ("subject", r"\b(subjects?|categor(y|ies)|topics?)\b"),
+    ("level", r"\blevels?\b"),
+    ("is_paid", r"\b(free (vs\.?|versus|or|and) paid|paid (vs\.?|versus|or|and) free)\b"),
+]
+GROUP_PREFIX = r"\b(by|per|each|every|across|which|what|breakdown)\b"
+
+SUBJECT_ALIASES = {
+    "web development": r"\bweb ?(development|dev|design)?\b",
+    "business finance": r"\b(business|finance|financial|investing|investment|accounting|trading)\b",
+    "musical instruments": r"\b(music(al)?|instruments?)\b",
+    "graphic design": r"\b(graphic|graphics) ?(design)?\b",
+}
+
+# Words left after planning that say nothing about which courses to count
+QUESTION_WORDS = {
+    "many", "much", "number", "total", "average", "avg", "mean", "count",
+    "courses", "course", "dataset", "catalog", "catalogue", "available",
+    "offered", "offer", "listed", "overall", "combined", "typical",
+    "value", "amount", "figure", "stats", "statistics", "vs", "versus",
+}
+
+
+def _strip(pattern, text):
+    return re.sub(pattern, " ", text)
+
+
+def _metric_of(word):
+    for metric, pattern in METRIC_PATTERNS:
+        if word and re.fullmatch(pattern, word):
+            return metric
+    return None
+
+
+def _take_conditions(text):
+    """
+    Numeric conditions in text, and text with them blanked out
+    A number is attributed to the metric named right after it ("100
+    lectures"), or to price when it has a currency sign or the question
+    talks about price. Numbers that fit neither are left in the text.
+    """
+    conditions = []
+    about_price = re.search(METRIC_PATTERNS[0][1], text)
+
+    for match in reversed(list(re.finditer(
+            rf"\bbetween\s*(₹|rs\.?|inr|\$)?\s*(\d+(?:\.\d+)?)\s*(?:and|to|-)\s*{NUMBER}", text))):
+        currency, low, high = match.group(1) or match.group(3), match.group(2), match.group(4)
+        metric = _metric_of(match.group(5)) or ("price" if currency or about_price else None)
+        if metric is None:
+            continue
+        end = match.end() if _metric_of(match.group(5)) else match.end(4)
+        low, high = sorted((float(low), float(high)))
+        conditions += [{"metric": metric, "op": ">=", "value": low},
+                       {"metric": metric, "op": "<=", "value": high}]
+        text = text[:match.start()] + " " + text[end:]
+
+    for op, pattern in COMPARISON_OPS:
+        for match in reversed(list(re.finditer(rf"\b(?:{pattern})\s*{NUMBER}", text))):
+            currency, value, unit = match.groups()
+            metric = _metric_of(unit)
+            if metric is None and (currency or about_price):
+                metric = "price"
+            if metric is None:
+                continue
+            end = match.end() if _metric_of(unit) else match.end(2)
+            conditions.append({"metric": metric, "op": op, "value": float(value)})
+            text = text[:match.start()] + " " + text[end:]
+    return conditions, text
+
+
+def plan_question_locally(question, vocabulary, analyze, idf=None):
+    """
+    Plan a templated aggregate question with rules
+    Returns: (plan, confidence in [0, 1]); plan is None when no aggregate
+    operation was recognised
+    """
+    text = question.lower().strip()
+    unsure = False
+    plan = {"operation": None, "metric": None, "group_by": None, "order": "desc", "n": None,
+            "subject": None}
+
+    match = re.search(r"\b(top|bottom|first)\s+(\d+)\b", text)
+    if match:
+        plan["n"] = int(match.group(2))
+        text = _strip(match.re.pattern, text)
+
+    # Before the metric and superlative words ("cost", "more") are used up
+    conditions, text = _take_conditions(text)
+
+    for metric, pattern in METRIC_PATTERNS:
+        if re.search(pattern, text):
+            plan["metric"] = metric
+            break
+
+    if re.search(ASC_PATTERN, text):
+        plan["order"] = "asc"
+    descending = re.search(DESC_PATTERN, text)
+
+    for group, pattern in GROUP_PATTERNS:
+        if re.search(pattern, text) and (group == "is_paid" or re.search(GROUP_PREFIX, text)):
+            plan["group_by"] = group
+            break
+
+    if re.search(r"\b(average|avg|mean|typical)\b", text):
+        plan["operation"] = "mean"
+    elif re.search(r"\b(how many|number of|count)\b", text):
+        plan["operation"] = "count"
+        for metric, nouns in METRIC_NOUNS.items():
+            if re.search(rf"\b(how many|number of)\s+(total\s+)?({nouns})\b", text):
+                plan["operation"], plan["metric"] = "sum", metric
+                break
+        # A metric noun elsewhere ("how many courses with reviews") is unclear
+        unsure = plan["operation"] == "count" and any(
+            re.search(rf"\b({nouns})\b", text) for nouns in METRIC_NOUNS.values()
+        )
+    elif re.search(r"\b(total|sum|combined|overall)\b", text) and plan["metric"]:
+        plan["operation"] = "sum"
+    elif plan["group_by"] and (descending or plan["order"] == "asc"):
+        # "which subject has the most courses" ranks groups by size
+        plan["operation"] = "sum" if plan["metric"] in ("num_subscribers", "num_reviews") else "count"
+        plan["n"] = plan["n"] or 1
+    elif plan["metric"] and (descending or plan["order"] == "asc" or plan["n"]):
+        plan["operation"] = "top"
+        # "the longest course" wants one answer, "the cheapest courses" a few
+        plan["n"] = plan["n"] or (1 if re.search(r"\bcourse\b", text) else 5)
+    elif plan["n"]:
+        plan["operation"] = "top"
+        plan["metric"] = "num_subscribers"
+
+    if plan["operation"] is None:
+        return None, 0.0
+    if plan["group_by"] and plan["operation"] in ("mean", "sum") and plan["metric"] is None:
+        plan["metric"] = "price"
+
+    # Everything after this point is about which courses the question covers
+    for _, pattern in METRIC_PATTERNS:
+        text = _strip(pattern, text)
+    for _, pattern in GROUP_PATTERNS:
+        text = _strip(pattern, text)
+    text = _strip(DESC_PATTERN, text)
+    text = _strip(ASC_PATTERN + r"|\b(how many|number of|which|what|are there|is there)\b", text)
+
+    for subject, pattern in SUBJECT_ALIASES.items():
+        if re.search(pattern, text):
+            if plan["subject"] is not None:
+                return plan, 0.0   # two subjects: let the LLM sort it out
+            plan["subject"] = subject
+            text = _strip(pattern, text)
+
+    text = _strip(r"\b(" + "|".join(sorted(QUESTION_WORDS)) + r")\b", text)
+    filters, confidence = parse_query_locally(text, vocabulary, analyze, idf)
+    plan.update(filters)
+    plan["conditions"] = conditions
+
+    # No topic words and no filters: the question covers the whole catalog
+    if confidence == 0.0 and not any(
+        " " not in token and token not in FILLER_WORDS and not token.isdigit()
+        for token in analyze(text)
+    ):
+        confidence = 1.0
+
+    # A number the rules could not place, a metric they could not tie to the
+    # operation, or a condition on anything but price, is left to the LLM
+    # planner; the plan still carries what was parsed, for when the LLM is
+    # not available
+    if unsure or re.search(r"\d", text) or any(c["metric"] != "price" for c in conditions):
+        confidence = 0.0
+    return plan, confidence
+
+
+def normalize_plan(plan):
+    """Validate a plan (e.g. from Gemini); None if it names no usable operation"""
+    if not isinstance(plan, dict) or plan.get("operation") not in OPERATIONS:
+        return None
+
+    if plan.get("metric") not in METRICS:
+        plan["metric"] = None
+    if plan["operation"] in ("mean", "sum", "min", "max", "top") and plan["metric"] is None:
+        if plan["operation"] != "top":
+            return None
+        plan["metric"] = "num_subscribers"
+    if plan.get("group_by") not in GROUP_BY:
+        plan["group_by"] = None
+    if plan.get("order") not in ("asc", "desc"):
+        plan["order"] = "desc"
+    n = plan.get("n")
+    plan["n"] = int(n) if isinstance(n, (int, float)) and n > 0 else None
+
+    subject = plan.get("subject")
+    plan["subject"] = subject.strip().lower() if isinstance(subject, str) and subject.strip() else None
+    if not isinstance(plan.get("keywords"), list):
+        plan["keywords"] = []
+    plan["keywords"] = [str(word).lower() for word in plan["keywords"] if str(word).strip()]
+    conditions = plan.get("conditions")
+    plan["conditions"] = [
+        {"metric": c["metric"], "op": c["op"], "value": float(c["value"])}
+        for c in (conditions if isinstance(conditions, list) else [])
+        if isinstance(c, dict) and c.get("metric") in METRICS and c.get("op") in OPERATORS
+        and isinstance(c.get("value"), (int, float)) and not isinstance(c["value"], bool)
+    ]
+    plan.setdefault("level", "all levels")
+    for field in ("is_paid", "min_price", "max_price"):
+        plan.setdefault(field, None)
+    return plan
+
+
+def plan_mask(index, plan):
+    """Boolean mask of catalog rows the plan covers"""
+    catalog = index.catalog
+    mask = np.ones(index.num_docs, dtype=bool)
+
+    bits = index.filters.candidates(plan)
+    if bits is not None:
+        mask &= np.unpackbits(bits, count=index.num_docs).astype(bool)
+
+    if plan.get("subject"):
+        mask &= (catalog["subject"] == plan["subject"]).to_numpy()
+
+    for word in plan.get("keywords", []):
+        mask &= catalog["course_title"].str.contains(
+            rf"\b{re.escape(word)}", regex=True
+        ).to_numpy()
+
+    for condition in plan.get("conditions", []):
+        values = catalog[condition["metric"]].to_numpy(dtype=float)
+        mask &= OPERATORS[condition["op"]](values, condition["value"])
+    return mask
+
+
+def run_plan(index, plan):
+    """
+    Execute a plan over the catalog
+    Returns: {"matched": int, "value": number | None, "groups": [(key, value)],
+              "courses": DataFrame}
+    """
+    catalog = index.catalog
+    mask = plan_mask(index, plan)
+    rows = catalog.loc[mask]
+    result = {"matched": int(mask.sum()), "value": None, "groups": [], "courses": rows.iloc[:0]}
+    operation, metric = plan["operation"], plan["metric"]
+
+    if plan["group_by"]:
+        grouped = rows.groupby(plan["group_by"])
+        values = grouped.size() if operation == "count" else grouped[metric].agg(
+            "max" if operation == "top" else operation
+        )
+        values = values.sort_values(ascending=plan["order"] == "asc", kind="stable")
+        if plan["n"]:
+            values = values.iloc[:plan["n"]]
+        result["groups"] = list(values.items())
+    elif operation == "count":
+        result["value"] = result["matched"]
+    elif operation == "top":
+        values = rows[metric].to_numpy(dtype=float)
+        order = np.argsort(values if plan["order"] == "asc" else -values, kind="stable")
+        result["courses"] = rows.iloc[order[:plan["n"] or 5]]
+    elif len(rows):
+        values = rows[metric].to_numpy(dtype=float)
+        result["value"] = getattr(np, operation)(values)
+    return result
+
+
+def _format_number(metric, value):
+    if metric == "price":
+        return f"₹{value:,.2f}" if value % 1 else f"₹{value:,.0f}"
+    if metric == "content_duration" or value % 1:
+        return f"{value:,.1f}"
+    return f"{value:,.0f}"
+
+
+def describe_scope(plan):
+    """Plain-language description of the courses a plan covers"""
+    words = []
+    if plan.get("is_paid") is False:
+        words.append("free")
+    elif plan.get("is_paid"):
+        words.append("paid")
+    if plan.get("level", "all levels") != "all levels":
+        words.append(plan["level"])
+    if plan.get("subject"):
+        words.append(plan["subject"].title())
+    words.append("courses")
+    if plan.get("keywords"):
+        words.append("about " + " ".join(plan["keywords"]))
+    if plan.get("is_paid"):
+        low, high = plan.get("min_price"), plan.get("max_price")
+        if low is not None and high is not None:
+            words.append(f"priced ₹{low}-₹{high}")
+        elif high is not None:
+            words.append(f"under ₹{high}")
+        elif low is not None:
+            words.append(f"over ₹{low}")
+    bounds = []
+    for condition in plan.get("conditions", []):
+        op, value = OP_WORDS[condition["op"]], f"{condition['value']:g}"
+        if condition["metric"] == "price":
+            bounds.append(f"priced {op} ₹{value}")
+        else:
+            bounds.append(f"with {op} {value}{METRIC_UNITS[condition['metric']]}")
+    if bounds:
+        words.append(" and ".join(bounds))
+    return " ".join(words)
+
+
+def format_result(plan, result):
+    """Deterministic answer text for a plan's result"""
+    scope = describe_scope(plan)
+    operation, metric = plan["operation"], plan["metric"]
+    label = METRIC_LABELS.get(metric, "")
+
+    if result["matched"] == 0:
+        return f"There are no {scope} in the dataset."
+
+    if plan["group_by"]:
+        group_label = {"subject": "subject", "level": "level", "is_paid": "type"}[plan["group_by"]]
+        if operation == "count":
+            heading = f"Number of {scope} by {group_label}:"
+        else:
+            name = {"mean": "Average", "sum": "Total", "min": "Lowest",
+                    "max": "Highest", "top": "Highest"}[operation]
+            heading = f"{name} {label} of {scope} by {group_label}:"
+        lines = [heading]
+        for key, value in result["groups"]:
+            if plan["group_by"] == "is_paid":
+                key = "Paid" if key else "Free"
+            elif isinstance(key, str):
+                key = key.title()
+            if operation == "count":
+                value = _format_number("count", value)
+            else:
+                value = _format_number(metric, value) + METRIC_UNITS.get(metric, "")
+            lines.append(f"- **{key}**: {value}")
+        return "\n".join(lines)
+
+    if operation == "count":
+        noun = scope if result["value"] != 1 else scope.replace("courses", "course", 1)
+        verb = "is" if result["value"] == 1 else "are"
+        return f"There {verb} **{result['value']:,}** {noun} in the dataset."
+
+    if operation == "top":
+        lines = [f"{'Lowest' if plan['order'] == 'asc' else 'Highest'} {label} among {scope}:"]
+        for position, (_, course) in enumerate(result["courses"].iterrows(), 1):
+            value = _format_number(metric, float(course[metric])) + METRIC_UNITS.get(metric, "")
+            lines.append(f"{position}. **{course['course_title'].title()}** - {value}")
+        return "\n".join(lines)
+
+    name = {"mean": "average", "sum": "total", "min": "lowest", "max": "highest"}[operation]
+    value = _format_number(metric, result["value"]) + METRIC_UNITS.get(metric, "")
+    return f"The {name} {label} of {scope} is **{value}** (across {result['matched']:,} courses)."
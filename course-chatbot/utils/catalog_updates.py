@@ -0,0 +1,179 @@
+"""
+Live catalog updates: apply changes, swap generations, merge, watch the CSV
+
+CatalogUpdater turns course changes into a new SegmentedIndex generation
+(see utils.segments) and publishes it with set_index. Generations are
+never modified, so a query keeps the generation it started with and never
+sees a half-applied change. Writers are serialized by one lock; readers
+take none.
+
+When a generation needs a merge, it is compacted in a background thread,
+along with its display catalog and ANN index, and swapped in unless a
+newer change arrived meanwhile.
+
+CatalogWatcher polls the catalog file and, once it has stopped changing,
+diffs it against the live catalog and applies only the difference.
+"""
+import logging
+import os
+import threading
+
+import pandas as pd
+
+from utils import metrics
+from utils.index_store import clean_catalog
+from utils.segments import SegmentedIndex
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the catalog file
+WATCH_INTERVAL = float(os.getenv("CATALOG_WATCH_INTERVAL", "5"))
+
+
+def diff_catalog(index, catalog):
+    """
+    Changes turning index's live courses into catalog (a cleaned frame)
+    Returns: (upserts frame of added/changed rows, deleted course_ids)
+    """
+    old = index.catalog[SegmentedIndex.wrap(index).live].set_index("course_id")
+    new = catalog.drop_duplicates("course_id", keep="last").set_index("course_id")
+
+    deleted = old.index.difference(new.index)
+    common = new.index.intersection(old.index)
+    columns = [column for column in new.columns if column in old.columns]
+    before = old.loc[common, columns].astype(object)
+    after = new.loc[common, columns].astype(object)
+    changed = common[~(before == after).all(axis=1).to_numpy()]
+
+    upserts = new.loc[new.index.difference(old.index).union(changed)]
+    return upserts.reset_index(), deleted.tolist()
+
+
+class CatalogUpdater:
+    def __init__(self, get_index, set_index):
+        """get_index / set_index: read and publish the served index"""
+        self.get_index = get_index
+        self.set_index = set_index
+        self.generation = 0
+        self._lock = threading.RLock()
+        self._merging = False
+
+    def apply(self, upserts=None, deletes=()):
+        """
+        Publish a generation with the changes applied
+        upserts: cleaned catalog rows to add or replace (by course_id)
+        deletes: course_ids to remove
+        """
+        with self._lock:
+            index = SegmentedIndex.wrap(self.get_index()).apply(upserts, deletes)
+            # Build the display catalog before readers can see the generation
+            index.courses
+            self._publish(index, "update")
+            start_merge = index.needs_merge() and not self._merging
+            self._merging = self._merging or start_merge
+
+        metrics.increment("catalog_upserts_total", 0 if upserts is None else len(upserts))
+        metrics.increment("catalog_deletes_total", len(deletes))
+        if start_merge:
+            threading.Thread(target=self._merge, args=(index,), daemon=True).start()
+        return index
+
+    def upsert(self, rows):
+        """Add or replace courses given as raw catalog rows (CSV columns)"""
+        return self.apply(upserts=clean_catalog(pd.DataFrame(rows)))
+
+    def delete(self, course_ids):
+        return self.apply(deletes=list(course_ids))
+
+    def sync(self, csv_path):
+        """Apply the difference between the live catalog and csv_path"""
+        catalog = clean_catalog(pd.read_csv(csv_path))
+        with self._lock:
+            upserts, deletes = diff_catalog(self.get_index(), catalog)
+            if not len(upserts) and not deletes:
+                return None
+            logger.info(
+                "Catalog %s changed: %d added/updated, %d deleted",
+                csv_path, len(upserts), len(deletes)
+            )
+            return self.apply(upserts, deletes)
+
+    def _publish(self, index, reason):
+        self.set_index(index)
+        self.generation += 1
+        metrics.increment("index_generations_total", reason=reason)
+
+    def _merge(self, index):
+        while True:
+            try:
+                with metrics.span("merge_index", segments=len(index.segments)):
+                    merged = index.merge()
+                    # Build what queries would otherwise build on first use
+                    merged.courses
+                    try:
+                        merged.ann
+                    except ValueError:
+                        # Only retrieval="ann" needs it; that search raises instead
+                        logger.exception("Could not build the ANN index of the merged catalog")
+            except Exception:
+                logger.exception("Index merge failed")
+                merged = None
+
+            with self._lock:
+                current = self.get_index()
+                # A change published meanwhile is newer than the merge
+                if merged is not None and current is index:
+                    self._publish(merged, "merge")
+                    current = merged
+                if merged is None or not isinstance(current, SegmentedIndex) \
+                        or not current.needs_merge():
+                    self._merging = False
+                    return
+                index = current
+
+
+class CatalogWatcher:
+    def __init__(self, csv_path, updater, interval=WATCH_INTERVAL):
+        self.csv_path = csv_path
+        self.updater = updater
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._seen = self._stat()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.csv_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="catalog-watch", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def check(self):
+        """Sync once if the file changed and has been stable for one interval"""
+        current = self._stat()
+        if current is None or current == self._seen:
+            return None
+        # Wait for the writer to finish: the file must look the same twice
+        self._stop.wait(self.interval)
+        if self._stat() != current:
+            return None
+        try:
+            index = self.updater.sync(self.csv_path)
+        except (OSError, KeyError, ValueError):
+            logger.exception("Could not reload %s; keeping the current index", self.csv_path)
+            return None
+        self._seen = current
+        return index
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
@@ -0,0 +1,101 @@
+"""
+Prompt context for dataset questions that need the LLM
+
+Instead of a random sample of the raw CSV, the courses most relevant to the
+question are picked with the TF-IDF index and packed - with only the columns
+the question needs - into a fixed token budget.
+"""
+import re
+
+import numpy as np
+
+from utils.catalog_query import METRIC_PATTERNS
+from utils.search import score_candidates, top_k
+from utils.token_usage import CHARS_PER_TOKEN, estimate_tokens
+
+# Always sent: enough to identify a course and its main filters
+BASE_COLUMNS = ("course_title", "subject", "level", "price")
+
+# Extra columns, sent only when the question mentions them
+EXTRA_COLUMN_PATTERNS = [
+    ("published", r"\b(when|year|published|dates?|new(est|er)?|recent(ly)?|old(est|er)?|latest)\b"),
+    ("url", r"\b(links?|urls?)\b"),
+] + [(metric, pattern) for metric, pattern in METRIC_PATTERNS if metric != "price"]
+
+
+def context_columns(question):
+    """Columns worth sending for this question, in display order"""
+    text = question.lower()
+    columns = list(BASE_COLUMNS)
+    for column, pattern in EXTRA_COLUMN_PATTERNS:
+        if column not in columns and re.search(pattern, text):
+            columns.append(column)
+    return columns
+
+
+def relevant_rows(index, semantic_query, filters, limit):
+    """
+    Catalog rows for the question, most relevant first
+    Courses that match no query term are added by popularity, so a vague
+    question still gets a representative context.
+    """
+    term_ids, query_weights = index.query_terms(semantic_query)
+    candidate_bits = index.filters.candidates(filters)
+    rows, scores = score_candidates(index, term_ids, query_weights, candidate_bits)
+    rows = rows[top_k(scores, limit)]
+
+    if len(rows) < limit:
+        if candidate_bits is None:
+            pool = np.arange(index.num_docs)
+        else:
+            pool = index.filters.candidate_rows(candidate_bits)
+        pool = pool[~np.isin(pool, rows)]
+        popularity = index.catalog["num_subscribers"].to_numpy()[pool]
+        rows = np.concatenate([rows, pool[top_k(popularity, limit - len(rows))]])
+    return rows
+
+
+def _cell(course, column):
+    if column == "price":
+        return str(int(course["price"])) if course["is_paid"] else "free"
+    if column == "published":
+        return str(course["published_timestamp"])[:10]
+    return str(course[column]).replace("|", "/")
+
+
+def pack_rows(catalog, rows, columns, token_budget):
+    """
+    Pipe-separated table of the given rows, cut off at token_budget
+    Returns: (table text, number of rows packed)
+    """
+    lines = ["|".join(columns)]
+    used = estimate_tokens(lines[0])
+    for course in catalog.iloc[rows].to_dict("records"):
+        line = "|".join(_cell(course, column) for column in columns)
+        cost = estimate_tokens(line)
+        if used + cost > token_budget:
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines), len(lines) - 1
+
+
+def build_dataset_context(index, question, filters, token_budget):
+    """
+    Relevant courses for a question, packed into token_budget
+    filters: parsed-filter dict; its keywords (or the question) drive relevance
+    Returns: (table text, rows packed, courses passing the filters)
+    """
+    semantic_query = " ".join(filters.get("keywords") or []) or question.lower()
+    columns = context_columns(question)
+
+    # No row is shorter than its separators, so this bounds what can fit
+    limit = max(1, token_budget * CHARS_PER_TOKEN // (len(columns) * 4))
+    rows = relevant_rows(index, semantic_query, filters, limit)
+
+    candidate_bits = index.filters.candidates(filters)
+    matching = index.num_docs if candidate_bits is None else len(
+        index.filters.candidate_rows(candidate_bits)
+    )
+    table, packed = pack_rows(index.catalog, rows, columns, token_budget)
+    return table, packed, matching
@@ -0,0 +1,92 @@
+"""
+Precomputed AI course overviews
+
+Descriptions are stored in SQLite keyed by course_id, together with a hash
+of the course fields the prompt uses. A stored description is only served
+while that hash still matches, so edited courses get regenerated.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Fields that go into the description prompt
+DESCRIPTION_FIELDS = (
+    "course_title",
+    "subject",
+    "level",
+    "num_lectures",
+    "content_duration",
+    "num_subscribers"
+)
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.path.join(script_dir, "..", "data", "descriptions.db")
+
+
+def course_fields_hash(course):
+    """Hash of the prompt fields of a course (dict, Series or namedtuple row)"""
+    get = course.get if hasattr(course, "get") else lambda f: getattr(course, f)
+    text = "\x1f".join(str(get(field)) for field in DESCRIPTION_FIELDS)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class DescriptionStore:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS descriptions ("
+                "course_id INTEGER PRIMARY KEY, fields_hash TEXT NOT NULL, "
+                "description TEXT NOT NULL, generated_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, course):
+        """Stored description for course, or None if missing or stale"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT fields_hash, description FROM descriptions WHERE course_id = ?",
+                (int(course["course_id"]),)
+            ).fetchone()
+        if row is None or row[0] != course_fields_hash(course):
+            return None
+        return row[1]
+
+    def known_hashes(self):
+        """course_id -> fields_hash for everything stored"""
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT course_id, fields_hash FROM descriptions"))
+
+    def put_many(self, rows):
+        """Store (course_id, fields_hash, description) tuples in one transaction"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO descriptions VALUES (?, ?, ?, ?)",
+                [(int(cid), h, text, now) for cid, h, text in rows]
+            )
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_description_store(path=None):
+    """Shared store for path (DESCRIPTION_STORE_PATH or data/descriptions.db)"""
+    path = path or os.getenv("DESCRIPTION_STORE_PATH") or DEFAULT_PATH
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = DescriptionStore(path)
+        return _stores[path]
@@ -0,0 +1,88 @@
+"""
+Precomputed filter bitsets for the level / paid / price filters
+
+Built once when the index is loaded. Bitsets are np.packbits arrays (one
+bit per course, big-endian within each byte) so intersecting filters is a
+bitwise AND over num_docs / 8 bytes.
+"""
+import numpy as np
+
+
+def bits_contain(bits, rows):
+    """Boolean mask telling which of `rows` are set in a packed bitset"""
+    return ((bits[rows >> 3] >> (7 - (rows & 7))) & 1).astype(bool)
+
+
+class FilterIndex:
+    def __init__(self, level_codes, level_names, is_paid, price, live_bits=None):
+        """live_bits: optional packed bitset of rows not deleted (see utils.segments)"""
+        self.num_docs = len(price)
+        self.live_bits = live_bits
+
+        self.level_bits = {
+            name: np.packbits(level_codes == code)
+            for code, name in enumerate(level_names)
+        }
+        self.paid_bits = {
+            True: np.packbits(is_paid),
+            False: np.packbits(~is_paid)
+        }
+
+        # Sorted price index for range lookups
+        self.price_order = np.argsort(price, kind="stable")
+        self.sorted_price = price[self.price_order]
+
+    def price_bits(self, min_price=None, max_price=None):
+        lo = 0
+        hi = self.num_docs
+        if min_price is not None:
+            lo = np.searchsorted(self.sorted_price, min_price, side="left")
+        if max_price is not None:
+            hi = np.searchsorted(self.sorted_price, max_price, side="right")
+
+        mask = np.zeros(self.num_docs, dtype=bool)
+        mask[self.price_order[lo:max(lo, hi)]] = True
+        return np.packbits(mask)
+
+    def candidates(self, filters):
+        """
+        Packed bitset of courses passing the filters
+        Returns None when no filter restricts the catalog.
+        """
+        parts = []
+
+        level = filters.get("level", "all levels")
+        if level != "all levels":
+            # A level no course has matches nothing
+            parts.append(self.level_bits.get(
+                level, np.zeros((self.num_docs + 7) // 8, dtype=np.uint8)
+            ))
+
+        is_paid = filters.get("is_paid")
+        if is_paid is not None:
+            parts.append(self.paid_bits[bool(is_paid)])
+
+        # Price bounds only apply to paid searches
+        if is_paid and (
+            filters.get("min_price") is not None
+            or filters.get("max_price") is not None
+        ):
+            parts.append(self.price_bits(
+                filters.get("min_price"), filters.get("max_price")
+            ))
+
+        # Deleted rows never pass, so "no filter" is the live rows
+        if self.live_bits is not None:
+            parts.append(self.live_bits)
+
+        if not parts:
+            return None
+
+        bits = parts[0].copy()
+        for part in parts[1:]:
+            np.bitwise_and(bits, part, out=bits)
+        return bits
+
+    def candidate_rows(self, bits):
+        """Row positions set in a packed bitset"""
+        return np.flatnonzero(np.unpackbits(bits, count=self.num_docs))
@@ -1,47 +1,228 @@
-import google.generativeai as genai
+"""
+Gemini helpers for the chatbot
+
+Importing this module has no side effects: the API key is looked up, the
+SDK configured and the client and response cache created on first use by
+get_model() / get_client() / get_cache(). set_model() and set_cache() swap
+in other objects (a local stand-in model, a fake for benchmarks).
+"""
 import json
-import re
+import logging
 import os
-import streamlit as st
-from utils.prompt_templates import QUERY_PARSER_PROMPT
-
-# Configure Gemini with API key from environment or Streamlit secrets
-api_key = None
-
-# Try Streamlit secrets first (for cloud deployment)
-try:
-    api_key = st.secrets.get("GOOGLE_API_KEY")
-except:
-    pass
-
-# Fall back to environment variable
-if not api_key:
-    api_key = os.getenv("GOOGLE_API_KEY")
-
-# If still no key, raise error
-if not api_key:
-    raise ValueError(
-        "GOOGLE_API_KEY not found! "
-        "Please set it in:\n"
-        "- Local: .env file or environment variable\n"
-        "- Cloud: Streamlit Cloud Secrets"
+import threading
+import time
+from utils.prompt_templates import (
+    DATASET_PLAN_PROMPT, QUERY_PARSER_PROMPT, TURN_ANALYSIS_PROMPT
+)
+from utils.llm_cache import LLMCache, cache_key
+from utils.conversation_manager import VALID_LEVELS
+from utils.catalog_query import normalize_plan
+from utils.async_gemini import AsyncGeminiClient, ThreadedModel
+from utils import metrics, token_usage
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "gemini-2.5-flash"
+
+_model = None
+_client = None
+_cache = None
+_registry_lock = threading.Lock()
+
+
+def get_api_key():
+    """GOOGLE_API_KEY from Streamlit secrets (cloud) or the environment"""
+    api_key = None
+
+    # Try Streamlit secrets first (for cloud deployment)
+    try:
+        import streamlit as st
+        api_key = st.secrets.get("GOOGLE_API_KEY")
+    except Exception:
+        pass
+
+    # Fall back to environment variable
+    if not api_key:
+        api_key = os.getenv("GOOGLE_API_KEY")
+
+    if not api_key:
+        raise ValueError(
+            "GOOGLE_API_KEY not found! "
+            "Please set it in:\n"
+            "- Local: .env file or environment variable\n"
+            "- Cloud: Streamlit Cloud Secrets"
+        )
+    return api_key
+
+
+def create_model():
+    """
+    Configure the SDK and build the Gemini model
+    GEMINI_API_ENDPOINT points the SDK at another server (e.g. the local
+    stand-in in benchmarks/gemini_server.py) over REST; no key is needed then.
+    """
+    import google.generativeai as genai
+
+    endpoint = os.getenv("GEMINI_API_ENDPOINT")
+    if not endpoint:
+        genai.configure(api_key=get_api_key())
+        return genai.GenerativeModel(MODEL_NAME)
+
+    try:
+        api_key = get_api_key()
+    except ValueError:
+        api_key = "local"
+    genai.configure(
+        api_key=api_key,
+        transport="rest",
+        client_options={"api_endpoint": endpoint}
+    )
+    return ThreadedModel(
+        genai.GenerativeModel(MODEL_NAME),
+        max_workers=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
     )
 
-genai.configure(api_key=api_key)
 
-model = genai.GenerativeModel("gemini-2.5-flash")
+def get_model():
+    """The Gemini model, created on first use"""
+    global _model
+    if _model is None:
+        with _registry_lock:
+            if _model is None:
+                _model = create_model()
+    return _model
+
+
+def set_model(model):
+    """Use model for all later calls; the client keeps its loop and stats"""
+    global _model
+    with _registry_lock:
+        _model = model
+        if _client is not None:
+            _client.model = model
+
+
+def get_client():
+    """
+    Shared AsyncGeminiClient: deadlines, retries, concurrency cap and
+    optional hedging for every call.
+    GEMINI_HEDGE_AFTER: unset (off), "auto" (recent p95) or a delay in seconds
+    """
+    global _client
+    if _client is None:
+        model = get_model()
+        with _registry_lock:
+            if _client is None:
+                _client = AsyncGeminiClient(
+                    model,
+                    max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+                    timeout=float(os.getenv("GEMINI_TIMEOUT", "20")),
+                    max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "2")),
+                    hedge_after=os.getenv("GEMINI_HEDGE_AFTER") or None
+                )
+    return _client
+
+
+def get_cache():
+    """Shared response cache; set LLM_CACHE_PATH to persist it in SQLite"""
+    global _cache
+    if _cache is None:
+        with _registry_lock:
+            if _cache is None:
+                _cache = LLMCache(
+                    max_entries=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+                    ttl_seconds=float(os.getenv("LLM_CACHE_TTL", "86400")),
+                    db_path=os.getenv("LLM_CACHE_PATH") or None
+                )
+    return _cache
+
+
+def set_cache(cache):
+    """Use cache (an LLMCache) for all later calls"""
+    global _cache
+    with _registry_lock:
+        _cache = cache
+
+
+def _collect_stats():
+    """Client and cache counters for metrics export (they count on their own)"""
+    samples = []
+    if _client is not None:
+        samples += [("gemini_client_" + k + "_total", {}, v) for k, v in _client.stats.items()]
+    if _cache is not None:
+        samples += [("llm_response_cache_" + k + "_total", {}, v) for k, v in _cache.stats.items()]
+    return samples
+
+
+metrics.register_collector(_collect_stats)
+
+
+def __getattr__(name):
+    # Keep `gemini_utils.model` / `.gemini_client` / `.llm_cache` working
+    # without creating anything at import time
+    if name == "model":
+        return get_model()
+    if name == "gemini_client":
+        return get_client()
+    if name == "llm_cache":
+        return get_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Ask Gemini for a bare JSON document instead of prose/markdown
+JSON_RESPONSE_CONFIG = {"response_mime_type": "application/json"}
+
+
+def generate_text(prompt, json_mode=False, call_site="generate"):
+    """
+    model.generate_content(prompt).text, served from llm_cache when possible
+    call_site labels the span, the LLM call / cache-hit counters and the
+    token accounting. Raises TokenBudgetExceeded instead of calling Gemini
+    once the session's token budget is used up.
+    """
+    with metrics.span("llm." + call_site) as span:
+        key = cache_key(MODEL_NAME, prompt, json_mode=json_mode)
+        cached = get_cache().get(key)
+        if cached is not None:
+            span.set(cached=True)
+            metrics.increment("llm_cache_hits_total", call_site=call_site)
+            return cached
+
+        token_usage.check_budget()
+        metrics.increment("llm_calls_total", call_site=call_site)
+        start = time.perf_counter()
+        try:
+            if json_mode:
+                response = get_client().generate_sync(
+                    prompt, generation_config=JSON_RESPONSE_CONFIG
+                )
+            else:
+                response = get_client().generate_sync(prompt)
+        except Exception:
+            metrics.increment("llm_errors_total", call_site=call_site)
+            raise
+        seconds = time.perf_counter() - start
+        metrics.observe("gemini_call_seconds", seconds, call_site=call_site)
+
+        text = response.text
+        prompt_tokens, output_tokens = token_usage.usage_tokens(
+            getattr(response, "usage_metadata", None), prompt, text
+        )
+        token_usage.record(call_site, prompt_tokens, output_tokens, seconds)
+        span.set(prompt_tokens=prompt_tokens, output_tokens=output_tokens)
+        get_cache().set(key, text)
+        return text
 
 
 def safe_json_parse(text):
+    # Responses come from JSON response mode, so they are either a
+    # document or garbage - no need to dig JSON out of prose
     try:
-        return json.loads(text)
+        parsed = json.loads(text)
+        if isinstance(parsed, dict):
+            return parsed
     except json.JSONDecodeError:
-        match = re.search(r"\{.*\}", text, re.DOTALL)
-        if match:
-            try:
-                return json.loads(match.group())
-            except json.JSONDecodeError:
-                pass
+        pass
 
     return {
         "keywords": [],
@@ -52,56 +233,136 @@ def safe_json_parse(text):
     }
 
 
-def parse_query_with_gemini(user_query):
-    response = model.generate_content(
-        QUERY_PARSER_PROMPT + user_query
-    )
-
-    parsed = safe_json_parse(response.text)
-
-    if "keywords" not in parsed:
+def normalize_filters(parsed):
+    """Fill in missing/invalid fields of a parsed-filter dict"""
+    if not isinstance(parsed.get("keywords"), list):
         parsed["keywords"] = []
 
-    if parsed.get("level") not in {
-        "all levels",
-        "beginner level",
-        "intermediate level",
-        "expert level"
-    }:
+    if parsed.get("level") not in VALID_LEVELS:
         parsed["level"] = "all levels"
 
+    for field in ("is_paid", "min_price", "max_price"):
+        parsed.setdefault(field, None)
+
     return parsed
 
 
-def classify_user_intent(query):
-    prompt = f"""
-Classify intent as ONE word only:
-- recommendation (looking for course recommendations, course search, learning requests)
-- dataset_question (asking about statistics, facts, information about courses)
+def parse_query_with_gemini(user_query):
+    parsed = safe_json_parse(generate_text(
+        QUERY_PARSER_PROMPT + user_query, json_mode=True, call_site="parse_query"
+    ))
+    return normalize_filters(parsed)
 
-User query:
-{query}
 
-Response (ONE WORD ONLY):"""
-    response = model.generate_content(prompt)
-    intent = response.text.strip().lower()
-    
-    # Ensure we return valid intent
-    if "recommend" in intent:
-        return "recommendation"
-    elif "dataset" in intent or "question" in intent:
-        return "dataset_question"
-    
-    # Default to recommendation for course-related queries
+def analyze_turn(query):
+    """
+    Intent and search filters for a chat turn in a single Gemini call
+    For dataset questions the filters also carry "aggregate" (bool) when the
+    model said whether the question is an aggregate over the catalog.
+    Returns: (intent, parsed filters)
+    """
+    parsed = safe_json_parse(generate_text(
+        TURN_ANALYSIS_PROMPT + query, json_mode=True, call_site="analyze_turn"
+    ))
+
+    intent = str(parsed.pop("intent", "")).strip().lower()
+    if intent not in {"recommendation", "dataset_question"}:
+        intent = guess_intent(query)
+
+    aggregate = parsed.pop("aggregate", None)
+    parsed = normalize_filters(parsed)
+    if intent == "dataset_question" and isinstance(aggregate, bool):
+        parsed["aggregate"] = aggregate
+    return intent, parsed
+
+
+def plan_dataset_question_with_gemini(question):
+    """Aggregate plan for a dataset question, or None if it has none"""
+    plan = safe_json_parse(generate_text(
+        DATASET_PLAN_PROMPT + question, json_mode=True, call_site="plan_dataset_question"
+    ))
+    plan = normalize_plan(plan)
+    if plan is not None:
+        normalize_filters(plan)
+    return plan
+
+
+def guess_intent(query):
+    """Keyword fallback when the model gives no usable intent"""
     query_lower = query.lower()
     if any(word in query_lower for word in ["course", "learn", "budget", "price", "show", "find", "want"]):
         return "recommendation"
-    
+
     return "dataset_question"
 
 
-def generate_empathetic_no_results_message(user_query, filters):
-    """Generate a personalized, empathetic response when no courses are found"""
+def stream_text(prompt, call_site, session=None):
+    """
+    Yield response text chunks as Gemini produces them
+    Cached responses come back as one chunk; time-to-first-token is
+    recorded per call site. Tokens are charged to session (a usage dict),
+    or to the active session when None.
+    """
+    key = cache_key(MODEL_NAME, prompt, json_mode=False)
+    cached = get_cache().get(key)
+    if cached is not None:
+        metrics.increment("llm_cache_hits_total", call_site=call_site)
+        yield cached
+        return
+
+    token_usage.check_budget(session)
+    # No span here: the generator runs inside the caller's render span
+    metrics.increment("llm_calls_total", call_site=call_site)
+    start = time.perf_counter()
+    parts = []
+    usage = {}
+    for chunk in get_client().stream_sync(prompt, usage=usage):
+        if not parts:
+            metrics.observe(
+                "gemini_time_to_first_token_seconds",
+                time.perf_counter() - start,
+                call_site=call_site
+            )
+        parts.append(chunk)
+        yield chunk
+
+    seconds = time.perf_counter() - start
+    metrics.observe("gemini_stream_seconds", seconds, call_site=call_site)
+    text = "".join(parts)
+    prompt_tokens, output_tokens = token_usage.usage_tokens(usage.get("metadata"), prompt, text)
+    token_usage.record(call_site, prompt_tokens, output_tokens, seconds, session)
+    get_cache().set(key, text)
+
+
+def _stream_or_fallback(prompt, call_site, fallback):
+    """
+    stream_text, falling back to canned text if nothing arrived
+    The session is looked up now: callers often consume the chunks after
+    chat_flow.handle_turn has returned.
+    """
+    return _fallback_chunks(prompt, call_site, fallback, token_usage.current_session())
+
+
+def _fallback_chunks(prompt, call_site, fallback, session):
+    emitted = False
+    try:
+        for chunk in stream_text(prompt, call_site, session):
+            if not emitted:
+                chunk = chunk.lstrip()
+                if not chunk:
+                    continue
+            emitted = True
+            yield chunk
+    except token_usage.TokenBudgetExceeded:
+        yield fallback
+    except Exception:
+        logger.exception("Streaming %s failed", call_site)
+        if not emitted:
+            yield fallback
+
+
+def stream_empathetic_no_results_message(user_query, filters):
+    """Stream a personalized, empathetic response when no courses are found"""
     filter_desc = []
     if filters.get("keywords"):
         filter_desc.append(f"on {' '.join(filters['keywords'])}")
@@ -126,16 +387,17 @@ User's original query: "{user_query}"
 
 Response:"""
     
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except:
-        return f"😔 I couldn't find courses {criteria}. Let's try something different! You could:\n• Search for a broader topic\n• Try a different skill level\n• Adjust your budget range\n\nWhat would you like to explore?"
+    fallback = f"😔 I couldn't find courses {criteria}. Let's try something different! You could:\n• Search for a broader topic\n• Try a different skill level\n• Adjust your budget range\n\nWhat would you like to explore?"
+    return _stream_or_fallback(prompt, "no_results_message", fallback)
 
 
-def generate_course_description(course_data):
-    """Generate an engaging AI description for a course based on its details"""
-    prompt = f"""
+def generate_empathetic_no_results_message(user_query, filters):
+    """Generate a personalized, empathetic response when no courses are found"""
+    return "".join(stream_empathetic_no_results_message(user_query, filters)).strip()
+
+
+def course_description_prompt(course_data):
+    return f"""
 You are a course advisor. Generate an engaging, informative course description (3-4 sentences) based on these details:
 
 Course Title: {course_data['course_title']}
@@ -152,9 +414,15 @@ The description should:
 4. Sound natural and friendly
 
 Description:"""
-    
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except:
-        return f"This {course_data['level']} course on {course_data['subject']} covers {course_data['num_lectures']} lectures over {round(float(course_data['content_duration']), 1)} hours. Perfect for learners looking to master {course_data['subject']}!"
+
+
+def stream_course_description(course_data):
+    """Stream an engaging AI description for a course based on its details"""
+    prompt = course_description_prompt(course_data)
+    fallback = f"This {course_data['level']} course on {course_data['subject']} covers {course_data['num_lectures']} lectures over {round(float(course_data['content_duration']), 1)} hours. Perfect for learners looking to master {course_data['subject']}!"
+    return _stream_or_fallback(prompt, "course_description", fallback)
+
+
+def generate_course_description(course_data):
+    """Generate an engaging AI description for a course based on its details"""
+    return "".join(stream_course_description(course_data)).strip()
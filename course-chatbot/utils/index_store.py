@@ -0,0 +1,364 @@
+"""
+Persisted TF-IDF index for the course recommender
+
+The index is built once from the catalog CSV and written to a versioned
+directory under data/index/. The directory name carries a hash of the CSV,
+so a changed catalog never picks up an old index.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from utils.ann_index import ANN_FILES, IVFPQIndex
+from utils.bm25 import BM25_FILES, BM25Index, term_frequencies
+from utils.catalog import CourseCatalog
+from utils.dense_index import DENSE_FILES, DenseIndex
+from utils.filter_index import FilterIndex
+from utils.inverted_index import InvertedIndex
+
+# Bump whenever the on-disk layout or the cleaning/vectorizing rules change
+INDEX_VERSION = 7
+
+VECTORIZER_PARAMS = {
+    "stop_words": "english",
+    "ngram_range": (1, 2),
+    "min_df": 2
+}
+
+# Text columns kept in their original case next to the lowercased ones
+DISPLAY_CASE_COLUMNS = ("course_title", "subject", "level")
+
+MATRIX_FILES = ("tfidf_data.npy", "tfidf_indices.npy", "tfidf_indptr.npy")
+POSTINGS_FILES = (
+    "postings_ptr.npy",
+    "postings_docs.npy",
+    "postings_weights.npy",
+    "postings_max.npy"
+)
+
+
+def catalog_hash(csv_path):
+    """Hash the catalog file contents in chunks"""
+    digest = hashlib.sha256()
+    with open(csv_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def default_index_root(csv_path):
+    return os.path.join(os.path.dirname(os.path.abspath(csv_path)), "index")
+
+
+def index_dir_for(csv_path, index_root=None):
+    """Directory holding the index for the current contents of csv_path"""
+    root = index_root or default_index_root(csv_path)
+    return os.path.join(root, f"v{INDEX_VERSION}-{catalog_hash(csv_path)}")
+
+
+def clean_catalog(df):
+    """Apply the recommender's cleaning rules to a raw catalog frame"""
+    df = df.drop_duplicates()
+    df = df.fillna("")
+
+    # Original spelling for display; the matching columns are lowercased
+    for column in DISPLAY_CASE_COLUMNS:
+        df["display_" + column] = df[column]
+
+    df["course_title"] = df["course_title"].str.lower()
+    df["subject"] = df["subject"].str.lower()
+    df["level"] = df["level"].str.lower()
+    df["price"] = pd.to_numeric(df["price"], errors="coerce").fillna(0)
+    df["is_paid"] = df["is_paid"].astype(bool)
+
+    df["semantic_text"] = df["course_title"] + " " + df["subject"]
+    return df.reset_index(drop=True)
+
+
+def build_analyzer():
+    """Tokenizer/n-gram analyzer matching VECTORIZER_PARAMS"""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    params = {k: v for k, v in VECTORIZER_PARAMS.items() if k != "min_df"}
+    return TfidfVectorizer(**params).build_analyzer()
+
+
+def build_index(csv_path, index_root=None):
+    """Fit the TF-IDF model on the catalog and persist it. Returns the index dir."""
+    from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+    target = index_dir_for(csv_path, index_root)
+    root = os.path.dirname(target)
+    os.makedirs(root, exist_ok=True)
+
+    df = clean_catalog(pd.read_csv(csv_path))
+
+    tfidf = TfidfVectorizer(**VECTORIZER_PARAMS)
+    tfidf_matrix = tfidf.fit_transform(df["semantic_text"]).tocsr()
+    tfidf_matrix.sort_indices()
+
+    terms = tfidf.get_feature_names_out().tolist()
+
+    # Raw counts over the same vocabulary, for BM25
+    counts = CountVectorizer(
+        **{k: v for k, v in VECTORIZER_PARAMS.items() if k != "min_df"},
+        vocabulary=tfidf.vocabulary_
+    ).transform(df["semantic_text"])
+    term_freqs = term_frequencies(counts, tfidf_matrix)
+    doc_len = np.asarray(counts.sum(axis=1), dtype=np.float32).ravel()
+
+    # Write into a scratch dir and rename, so readers never see a partial index
+    tmp_dir = tempfile.mkdtemp(prefix=".build-", dir=root)
+    try:
+        df.to_pickle(os.path.join(tmp_dir, "catalog.pkl"))
+        np.save(os.path.join(tmp_dir, "idf.npy"), tfidf.idf_)
+        for name, array in zip(MATRIX_FILES, (
+            tfidf_matrix.data,
+            tfidf_matrix.indices,
+            tfidf_matrix.indptr
+        )):
+            np.save(os.path.join(tmp_dir, name), array)
+
+        postings = InvertedIndex.from_csr(tfidf_matrix)
+        for name, array in zip(POSTINGS_FILES, (
+            postings.ptr,
+            postings.docs,
+            postings.weights,
+            postings.max_weights
+        )):
+            np.save(os.path.join(tmp_dir, name), array)
+
+        for name, array in zip(BM25_FILES, (term_freqs, doc_len)):
+            np.save(os.path.join(tmp_dir, name), array)
+
+        dense = DenseIndex.fit(tfidf_matrix)
+        for name, array in zip(DENSE_FILES, (dense.components, dense.vectors)):
+            np.save(os.path.join(tmp_dir, name), array)
+
+        ann = IVFPQIndex.train(dense.vectors)
+        for name, array in zip(ANN_FILES, (
+            ann.centroids,
+            ann.codebooks,
+            ann.list_ptr,
+            ann.list_ids,
+            ann.codes
+        )):
+            np.save(os.path.join(tmp_dir, name), array)
+
+        with open(os.path.join(tmp_dir, "vocabulary.json"), "w") as f:
+            json.dump(terms, f)
+
+        meta = {
+            "version": INDEX_VERSION,
+            "catalog_hash": os.path.basename(target).split("-", 1)[1],
+            "num_docs": tfidf_matrix.shape[0],
+            "num_terms": tfidf_matrix.shape[1],
+            "dense_dim": dense.dim,
+            "vectorizer": VECTORIZER_PARAMS
+        }
+        # meta.json is written last and marks the index as complete
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        try:
+            os.rename(tmp_dir, target)
+        except OSError:
+            # Another process finished the same build first
+            if not os.path.exists(os.path.join(target, "meta.json")):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    _prune_old_indexes(root, keep=os.path.basename(target))
+    return target
+
+
+def _prune_old_indexes(root, keep):
+    for name in os.listdir(root):
+        if name != keep and name.startswith("v") and "-" in name:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def load_index(csv_path, index_root=None, build_missing=True):
+    """Memory-map the index for csv_path, building it first if needed"""
+    path = index_dir_for(csv_path, index_root)
+
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        if not build_missing:
+            raise FileNotFoundError(
+                f"No index for {csv_path}. Run: python -m scripts.build_index"
+            )
+        path = build_index(csv_path, index_root)
+
+    return SearchIndex.open(path)
+
+
+class SearchIndex:
+    """Read-only view over a persisted index"""
+
+    def __init__(self, path, meta, catalog, terms, idf, tfidf_matrix, postings, dense=None,
+                 term_freqs=None, doc_len=None, bm25=None, ann=None):
+        self.path = path
+        self.meta = meta
+        self.catalog = catalog
+        self.terms = terms
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.idf = idf
+        self.tfidf_matrix = tfidf_matrix
+        self.postings = postings
+        self._dense = dense
+        self._ann = ann
+        self.term_freqs = term_freqs
+        self.doc_len = doc_len
+        self._bm25 = bm25
+        self._analyzer = None
+        self._courses = None
+
+        # Filter columns as plain arrays so queries never touch the frame
+        levels = pd.Categorical(catalog["level"])
+        self.level_names = list(levels.categories)
+        self.level_codes = np.asarray(levels.codes)
+        self.is_paid = catalog["is_paid"].to_numpy(dtype=bool)
+        self.price = catalog["price"].to_numpy(dtype=np.float64)
+        self.course_ids = catalog["course_id"].to_numpy()
+        self.filters = FilterIndex(
+            self.level_codes, self.level_names, self.is_paid, self.price
+        )
+
+    @property
+    def num_docs(self):
+        return self.tfidf_matrix.shape[0]
+
+    @property
+    def segments(self):
+        """(segment, live bits) pairs searched for a query: just this index"""
+        return [(self, None)]
+
+    @property
+    def courses(self):
+        """Display catalog with course_id lookup, built on first use"""
+        if self._courses is None:
+            self._courses = CourseCatalog(self.catalog)
+        return self._courses
+
+    @property
+    def dense(self):
+        """
+        LSA vectors for retrieval="dense": memory-mapped from the index dir,
+        or fitted on first use for in-memory indexes
+        """
+        if self._dense is None:
+            self._dense = DenseIndex.fit(self.tfidf_matrix)
+        return self._dense
+
+    @property
+    def bm25(self):
+        """BM25 impacts for scorer="bm25", computed on first use"""
+        if self._bm25 is None:
+            if self.term_freqs is None:
+                raise ValueError("Index has no term frequencies for BM25")
+            self._bm25 = BM25Index.from_stats(self.tfidf_matrix, self.term_freqs, self.doc_len)
+        return self._bm25
+
+    @property
+    def ann(self):
+        """IVF-PQ index over the dense vectors for retrieval="ann", like dense"""
+        if self._ann is None:
+            self._ann = IVFPQIndex.train(self.dense.vectors)
+        return self._ann
+
+    @classmethod
+    def open(cls, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["version"] != INDEX_VERSION:
+            raise ValueError(f"Index at {path} has version {meta['version']}")
+
+        with open(os.path.join(path, "vocabulary.json")) as f:
+            terms = json.load(f)
+
+        data, indices, indptr = (
+            np.load(os.path.join(path, name), mmap_mode="r")
+            for name in MATRIX_FILES
+        )
+        tfidf_matrix = sparse.csr_matrix(
+            (data, indices, indptr),
+            shape=(meta["num_docs"], meta["num_terms"]),
+            copy=False
+        )
+        ptr, docs, weights, max_weights = (
+            np.load(os.path.join(path, name), mmap_mode="r")
+            for name in POSTINGS_FILES
+        )
+        term_freqs, doc_len = (
+            np.load(os.path.join(path, name), mmap_mode="r")
+            for name in BM25_FILES
+        )
+        # Mapped now rather than on first use: a rebuild deletes older index
+        # dirs, and a mapping outlives its file being removed
+        dense = DenseIndex(*(
+            np.load(os.path.join(path, name), mmap_mode="r") for name in DENSE_FILES
+        ))
+        ann = IVFPQIndex(*(
+            np.load(os.path.join(path, name), mmap_mode="r") for name in ANN_FILES
+        ))
+
+        return cls(
+            path,
+            meta,
+            pd.read_pickle(os.path.join(path, "catalog.pkl")),
+            terms,
+            np.load(os.path.join(path, "idf.npy")),
+            tfidf_matrix,
+            InvertedIndex(ptr, docs, weights, meta["num_docs"], max_weights),
+            dense=dense,
+            term_freqs=term_freqs,
+            doc_len=doc_len,
+            ann=ann
+        )
+
+    def analyze(self, text):
+        if self._analyzer is None:
+            self._analyzer = build_analyzer()
+        return self._analyzer(text)
+
+    def query_counts(self, text):
+        """
+        In-vocabulary terms of a query string
+        Returns: (term_ids ascending, counts as float64)
+        """
+        counts = Counter(
+            self.vocabulary[token]
+            for token in self.analyze(text)
+            if token in self.vocabulary
+        )
+        term_ids = np.fromiter(sorted(counts), dtype=np.int32, count=len(counts))
+        return term_ids, np.array([counts[t] for t in term_ids], dtype=np.float64)
+
+    def query_terms(self, text):
+        """
+        Sparse TF-IDF representation of a query string
+        Returns: (term_ids ascending, l2-normalized weights)
+        """
+        term_ids, weights = self.query_counts(text)
+        weights *= self.idf[term_ids]
+
+        norm = np.sqrt(np.dot(weights, weights))
+        if norm > 0:
+            weights /= norm
+        return term_ids, weights
+
+    def vectorize(self, text):
+        """TF-IDF vector (1 x num_terms) for a query string"""
+        term_ids, weights = self.query_terms(text)
+        return sparse.csr_matrix(
+            (weights, term_ids, np.array([0, len(term_ids)])),
+            shape=(1, len(self.terms))
+        )
@@ -0,0 +1,174 @@
+"""
+Term-at-a-time scoring over postings lists
+
+Postings are the TF-IDF matrix held column-major: for term t,
+docs[ptr[t]:ptr[t + 1]] are the courses containing t (ascending) and
+weights[...] are their l2-normalized TF-IDF weights. Since both query and
+course vectors are unit length, summing query_weight * weight over shared
+terms gives the cosine similarity.
+
+max_weights[t] is the largest weight in t's postings, which bounds how much
+term t can add to any course's score (used for MaxScore pruning).
+"""
+import numpy as np
+from scipy import sparse
+
+from utils.filter_index import bits_contain
+
+
+# Slack for float rounding when comparing upper bounds against thresholds
+PRUNE_EPSILON = 1e-9
+
+
+class InvertedIndex:
+    def __init__(self, ptr, docs, weights, num_docs, max_weights=None):
+        self.ptr = ptr
+        self.docs = docs
+        self.weights = weights
+        self.num_docs = num_docs
+        if max_weights is None:
+            max_weights = term_max_weights(ptr, weights)
+        self.max_weights = max_weights
+
+    @classmethod
+    def from_csr(cls, matrix):
+        csc = sparse.csc_matrix(matrix)
+        csc.sort_indices()
+        return cls(csc.indptr, csc.indices, csc.data, matrix.shape[0])
+
+    @property
+    def num_terms(self):
+        return len(self.ptr) - 1
+
+    def postings(self, term_id):
+        start, end = self.ptr[term_id], self.ptr[term_id + 1]
+        return self.docs[start:end], self.weights[start:end]
+
+    def posting_length(self, term_ids):
+        term_ids = np.asarray(term_ids)
+        return self.ptr[term_ids + 1] - self.ptr[term_ids]
+
+    def term_matrix(self):
+        """Postings as a CSR matrix (num_terms x num_docs), without copying"""
+        return sparse.csr_matrix(
+            (self.weights, self.docs, self.ptr),
+            shape=(self.num_terms, self.num_docs),
+            copy=False
+        )
+
+    def score(self, term_ids, query_weights, candidate_bits=None):
+        """
+        Cosine scores for every course sharing at least one query term
+        candidate_bits: optional packed bitset; other courses are skipped
+        Returns: (doc_ids ascending, scores)
+        """
+        if len(term_ids) == 0:
+            return np.empty(0, dtype=self.docs.dtype), np.empty(0)
+
+        doc_parts = []
+        score_parts = []
+        for term_id, query_weight in zip(term_ids, query_weights):
+            docs, weights = self.postings(term_id)
+            if candidate_bits is not None:
+                allowed = bits_contain(candidate_bits, docs)
+                docs = docs[allowed]
+                weights = weights[allowed]
+            doc_parts.append(docs)
+            score_parts.append(weights * query_weight)
+
+        if len(doc_parts) == 1:
+            return np.asarray(doc_parts[0]), score_parts[0]
+
+        all_docs = np.concatenate(doc_parts)
+        doc_ids, slots = np.unique(all_docs, return_inverse=True)
+        scores = np.bincount(slots, weights=np.concatenate(score_parts))
+        return doc_ids, scores
+
+    def score_top(self, term_ids, query_weights, threshold, k,
+                  candidate_bits=None, stats=None):
+        """
+        MaxScore retrieval: exact scores for every course that can still
+        reach `threshold` and the top k, skipping the rest
+        Terms are split by upper bound. Courses that only contain
+        "non-essential" terms (whose bounds sum below the threshold) are
+        never touched. Candidates from the essential terms are dropped as
+        soon as partial score + remaining bounds falls below the current
+        k-th best partial score.
+        stats: optional dict, filled with posting/course counts
+        Returns: (doc_ids ascending, scores) - a superset of the top k
+        """
+        term_ids = np.asarray(term_ids)
+        query_weights = np.asarray(query_weights)
+        bounds = query_weights * self.max_weights[term_ids]
+
+        # Non-essential terms: the longest low-bound prefix whose bounds sum
+        # stays below the threshold
+        order = np.argsort(bounds, kind="stable")
+        cumulative = np.cumsum(bounds[order])
+        num_optional = int(np.searchsorted(
+            cumulative, threshold - PRUNE_EPSILON, side="left"
+        ))
+        optional = order[:num_optional][::-1]   # highest bound first
+        essential = np.sort(order[num_optional:])
+
+        doc_ids, scores = self.score(
+            term_ids[essential], query_weights[essential], candidate_bits
+        )
+        remaining = float(bounds[optional].sum())
+        lookups = 0
+
+        for term in optional:
+            cutoff = max(threshold, _kth_largest(scores, k))
+            alive = scores + remaining >= cutoff - PRUNE_EPSILON
+            doc_ids, scores = doc_ids[alive], scores[alive]
+            if len(doc_ids) == 0:
+                break
+
+            docs, weights = self.postings(term_ids[term])
+            if len(docs) == 0:
+                # Possible in a delta segment, which only holds some courses
+                continue
+            slots = np.searchsorted(docs, doc_ids)
+            slots = np.minimum(slots, len(docs) - 1)
+            hit = docs[slots] == doc_ids
+            scores[hit] += weights[slots[hit]] * query_weights[term]
+            remaining -= bounds[term]
+            lookups += len(doc_ids)
+
+        if stats is not None:
+            matched, _ = self.score(term_ids, query_weights, candidate_bits)
+            essential_postings = int(self.posting_length(term_ids[essential]).sum())
+            stats.update({
+                "terms": len(term_ids),
+                "essential_terms": len(essential),
+                "postings": int(self.posting_length(term_ids).sum()),
+                "postings_scored": essential_postings + lookups,
+                "matched_docs": len(matched),
+                "scored_docs": len(doc_ids),
+                "skipped_docs": len(matched) - len(doc_ids)
+            })
+
+        return doc_ids, scores
+
+    def dense_scores(self, term_ids, query_weights):
+        """Scores for the whole catalog, zero where no query term matches"""
+        scores = np.zeros(self.num_docs)
+        doc_ids, matched = self.score(term_ids, query_weights)
+        scores[doc_ids] = matched
+        return scores
+
+
+def term_max_weights(ptr, weights):
+    """Largest posting weight per term (0 for empty postings)"""
+    num_terms = len(ptr) - 1
+    max_weights = np.zeros(num_terms)
+    non_empty = np.flatnonzero(np.diff(ptr) > 0)
+    if len(non_empty):
+        max_weights[non_empty] = np.maximum.reduceat(weights, ptr[non_empty])
+    return max_weights
+
+
+def _kth_largest(scores, k):
+    if k <= 0 or len(scores) < k:
+        return 0.0
+    return float(np.partition(scores, len(scores) - k)[len(scores) - k])
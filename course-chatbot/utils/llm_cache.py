@@ -0,0 +1,118 @@
+"""
+Response cache for Gemini calls
+
+In-memory LRU with a TTL, optionally backed by a SQLite file so cached
+responses survive restarts and can be shared by replicas on one volume.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def normalize_prompt(prompt):
+    """Collapse whitespace and case so trivially different prompts share a key"""
+    return " ".join(prompt.split()).lower()
+
+
+def cache_key(model_name, prompt, **options):
+    """Stable key for a prompt sent to model_name with the given options"""
+    parts = [model_name, normalize_prompt(prompt)]
+    parts.extend(f"{k}={options[k]}" for k in sorted(options))
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, max_entries=1024, ttl_seconds=86400, db_path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+
+        self._entries = OrderedDict()   # key -> (stored_at, text)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        if db_path:
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    "key TEXT PRIMARY KEY, response TEXT NOT NULL, stored_at REAL NOT NULL)"
+                )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _expired(self, stored_at, now):
+        return self.ttl_seconds is not None and now - stored_at > self.ttl_seconds
+
+    def get(self, key):
+        """Cached text for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+
+        if self.db_path:
+            row = self._disk_get(key)
+            if row is not None and not self._expired(row[1], now):
+                with self._lock:
+                    self.stats["disk_hits"] += 1
+                    self._remember(key, row[1], row[0])
+                return row[0]
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def set(self, key, text):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, text)
+
+        if self.db_path:
+            try:
+                with self._connect() as conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?)",
+                        (key, text, now)
+                    )
+            except sqlite3.Error:
+                pass  # the in-memory copy still serves this process
+
+    def _remember(self, key, stored_at, text):
+        self._entries[key] = (stored_at, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _disk_get(self, key):
+        try:
+            with self._connect() as conn:
+                return conn.execute(
+                    "SELECT response, stored_at FROM llm_cache WHERE key = ?",
+                    (key,)
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.db_path:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM llm_cache")
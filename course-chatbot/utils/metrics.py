@@ -0,0 +1,343 @@
+"""
+Process-wide counters, histograms and timing spans
+
+Off by default: while disabled, increment()/observe() return at once and
+span() hands back a shared no-op, so instrumented code pays one function
+call. configure_from_env() turns collection on:
+
+    METRICS_ENABLED=1     collect counters, histograms and spans
+    METRICS_PORT=9100     also serve /metrics (Prometheus text format),
+                          /metrics.json and /traces.json on that port
+    METRICS_JSON_LOGS=1   also log every finished trace as one JSON line
+
+Spans nest per thread/task: a span opened while another is active becomes
+its child, and the outermost span of a chat turn is the trace that gets
+logged and kept for /traces.json.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Upper bounds for size-like histograms (candidate counts, tokens)
+COUNT_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+
+trace_logger = logging.getLogger("chatbot.trace")
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_collectors = []
+_recent_traces = deque(maxlen=100)
+
+_enabled = False
+_json_logs = False
+_configured = False
+_server = None
+_current_span = contextvars.ContextVar("metrics_span", default=None)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+
+# ---------------- switches ----------------
+
+def enabled():
+    return _enabled
+
+
+def enable(json_logs=False):
+    global _enabled, _json_logs
+    _enabled = True
+    _json_logs = json_logs
+
+
+def disable():
+    global _enabled, _json_logs
+    _enabled = False
+    _json_logs = False
+
+
+def configure_from_env():
+    """Apply METRICS_* settings once per process"""
+    global _configured
+    with _lock:
+        if _configured:
+            return
+        _configured = True
+
+    port = os.getenv("METRICS_PORT")
+    json_logs = os.getenv("METRICS_JSON_LOGS", "").lower() in ("1", "true", "yes")
+    if not (port or json_logs or os.getenv("METRICS_ENABLED", "").lower() in ("1", "true", "yes")):
+        return
+
+    enable(json_logs=json_logs)
+    if json_logs and not trace_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        trace_logger.addHandler(handler)
+        trace_logger.setLevel(logging.INFO)
+        trace_logger.propagate = False
+    if port:
+        start_http_server(int(port))
+
+
+# ---------------- counters and histograms ----------------
+
+def increment(name, value=1, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+
+def register_collector(collect):
+    """
+    Add a callable run at export time, returning (name, labels, value)
+    counter samples - for stats objects that already count on their own
+    """
+    with _lock:
+        _collectors.append(collect)
+
+
+# ---------------- spans ----------------
+
+class Span:
+    __slots__ = ("name", "attrs", "children", "parent", "start", "duration", "_token")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.children = []
+        self.parent = None
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        observe("span_seconds", self.duration, span=self.name)
+
+        if self.parent is not None:
+            self.parent.children.append(self)
+        else:
+            _finish_trace(self)
+        return False
+
+    def to_dict(self):
+        record = {"name": self.name, "ms": round(self.duration * 1000, 3)}
+        if self.attrs:
+            record["attrs"] = self.attrs
+        if self.children:
+            record["children"] = [child.to_dict() for child in self.children]
+        return record
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name, **attrs):
+    """Context manager timing a block as a (possibly nested) span"""
+    if not _enabled:
+        return _NOOP_SPAN
+    return Span(name, attrs)
+
+
+def traced(name):
+    """Decorator: run the function inside span(name)"""
+    def decorate(fn):
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(name, {}):
+                return fn(*args, **kwargs)
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        wrapper.__wrapped__ = fn
+        return wrapper
+    return decorate
+
+
+def _finish_trace(root):
+    record = root.to_dict()
+    record["event"] = "trace"
+    record["ts"] = time.time()
+    with _lock:
+        _recent_traces.append(record)
+    if _json_logs:
+        trace_logger.info(json.dumps(record, default=str))
+
+
+def recent_traces():
+    with _lock:
+        return list(_recent_traces)
+
+
+# ---------------- export ----------------
+
+def snapshot():
+    """Plain-dict copy of every counter and histogram"""
+    with _lock:
+        counters = [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in _counters.items()
+        ]
+        histograms = [
+            {
+                "name": name,
+                "labels": dict(labels),
+                "buckets": list(h.buckets),
+                "counts": list(h.counts),
+                "sum": h.sum,
+                "count": h.count
+            }
+            for (name, labels), h in _histograms.items()
+        ]
+        collectors = list(_collectors)
+
+    for collect in collectors:
+        for name, labels, value in collect():
+            counters.append({"name": name, "labels": dict(labels), "value": value})
+    return {"counters": counters, "histograms": histograms}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(labels, extra=None):
+    items = list(labels.items()) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def prometheus_text():
+    """Every metric in the Prometheus text exposition format"""
+    data = snapshot()
+    lines = []
+    typed = set()
+
+    for counter in sorted(data["counters"], key=lambda c: c["name"]):
+        if counter["name"] not in typed:
+            typed.add(counter["name"])
+            lines.append(f"# TYPE {counter['name']} counter")
+        lines.append(f"{counter['name']}{_labels_text(counter['labels'])} {counter['value']}")
+
+    for h in sorted(data["histograms"], key=lambda h: h["name"]):
+        name = h["name"]
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, count in zip(list(h["buckets"]) + ["+Inf"], h["counts"]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels_text(h['labels'], {'le': bound})} {cumulative}")
+        lines.append(f"{name}_sum{_labels_text(h['labels'])} {h['sum']}")
+        lines.append(f"{name}_count{_labels_text(h['labels'])} {h['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """Serve /metrics, /metrics.json and /traces.json from a daemon thread"""
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path == "/metrics":
+                body, kind = prometheus_text(), "text/plain; version=0.0.4"
+            elif path == "/metrics.json":
+                body, kind = json.dumps(snapshot()), "application/json"
+            elif path == "/traces.json":
+                body, kind = json.dumps(recent_traces(), default=str), "application/json"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", kind)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), Handler)
+            _server.daemon_threads = True
+            threading.Thread(
+                target=_server.serve_forever, name="metrics-server", daemon=True
+            ).start()
+    return _server
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _recent_traces.clear()
@@ -17,3 +17,69 @@ Schema:
 
 User query:
 """
+
+
+TURN_ANALYSIS_PROMPT = """
+You are an NLP engine for a course recommendation system.
+Decide what the user wants and extract search filters in one step.
+
+Intent:
+- "recommendation": looking for course recommendations, course search, learning requests,
+  or adding constraints (level, budget, free/paid) to a previous search
+- "dataset_question": asking about statistics, facts or information about the courses
+
+STRICT RULES:
+- Output ONLY valid JSON
+- Fill the filters even for dataset questions
+- "aggregate" is true only for a dataset question answered by counting courses or by the
+  average / total / lowest / highest / top-N of a column, optionally per subject, level
+  or free/paid; false otherwise
+
+Schema:
+{
+  "intent": "recommendation | dataset_question",
+  "aggregate": true | false,
+  "keywords": [],
+  "level": "all levels | beginner level | intermediate level | expert level",
+  "is_paid": true | false | null,
+  "min_price": number | null,
+  "max_price": number | null
+}
+
+User query:
+"""
+
+
+DATASET_PLAN_PROMPT = """
+You are an analytics planner for a course catalog.
+Columns: course_title, subject, level, is_paid, price, num_subscribers,
+num_reviews, num_lectures, content_duration (hours).
+Subjects: web development, business finance, musical instruments, graphic design.
+
+Turn the user's question into ONE aggregate operation over the catalog.
+If the question cannot be answered with one of these operations, set "operation" to null.
+
+STRICT RULES:
+- Output ONLY valid JSON
+- "keywords" are words that must appear in the course title; leave empty for whole subjects
+- Numeric limits ("more than 100 lectures", "cost under 50", "at least 10 hours") go in
+  "conditions": "more than" is ">", "at least" is ">=", "under" / "less than" is "<", "at most" is "<="
+
+Schema:
+{
+  "operation": "count | mean | sum | min | max | top | null",
+  "metric": "price | num_subscribers | num_reviews | num_lectures | content_duration | null",
+  "group_by": "subject | level | is_paid | null",
+  "order": "desc | asc",
+  "n": number | null,
+  "subject": "web development | business finance | musical instruments | graphic design | null",
+  "keywords": [],
+  "conditions": [{"metric": "price | num_subscribers | num_reviews | num_lectures | content_duration", "op": "> | >= | < | <=", "value": number}],
+  "level": "all levels | beginner level | intermediate level | expert level",
+  "is_paid": true | false | null,
+  "min_price": number | null,
+  "max_price": number | null
+}
+
+User question:
+"""
@@ -0,0 +1,177 @@
+"""
+Rule-based query parser
+
+Produces the same schema as QUERY_PARSER_PROMPT (keywords, level, is_paid,
+min_price, max_price) without an LLM call, plus a confidence score so the
+caller can fall back to Gemini for queries the rules don't understand.
+"""
+import re
+
+# Words that carry no topic: request phrasing, budget talk, filler
+FILLER_WORDS = {
+    "course", "courses", "class", "classes", "tutorial", "tutorials",
+    "lesson", "lessons", "training", "program", "programme",
+    "learn", "learning", "study", "studying", "teach", "taught",
+    "want", "wanna", "need", "like", "looking", "search", "searching",
+    "find", "show", "recommend", "recommendation", "recommendations",
+    "suggest", "suggestion", "suggestions", "help", "please", "pls",
+    "good", "best", "great", "top", "nice", "cheap", "affordable",
+    "budget", "price", "priced", "cost", "costs", "costing", "pay",
+    "rupees", "rupee", "rs", "inr", "dollars", "dollar", "usd",
+    "level", "levels", "skill", "skills", "option", "options",
+    "interested", "know", "start", "started", "today", "online", "udemy"
+}
+
+LEVEL_PATTERNS = [
+    ("all levels", r"\b(all|any) levels?\b"),
+    ("beginner level", r"\b(beginners?|basics?|novices?|newbies?|from scratch|starting out)\b"),
+    ("intermediate level", r"\bintermediate\b"),
+    ("expert level", r"\b(advanced|experts?|professionals?)\b"),
+]
+
+# Filler words that also end topic names ("machine learning", "dog training")
+TOPIC_FILLERS = {"learning", "training"}
+
+# A filler bigram is a phrase when its content word mostly occurs in it:
+# their idf differ by at most this much
+PHRASE_IDF_GAP = 1.0
+
+# Amounts of time or content, which the schema has no field for
+UNIT_PATTERN = (
+    r"\b\d+(?:\s*(?:to|-|and)\s*\d+)?\s*"
+    r"(?:hours?|hrs?|minutes?|mins?|days?|weeks?|months?|lectures?|videos?)\b"
+)
+
+FREE_PATTERN = r"\b(free|no cost|zero cost|without paying|for nothing)\b"
+PAID_PATTERN = r"\b(paid|premium)\b"
+NEGATION_PATTERN = r"\b(not|no|without|except|don't|dont|isn't|never)\b"
+
+CURRENCY = r"(?:₹|rs\.?|inr|\$)?\s*"
+RANGE_PATTERN = (
+    rf"(?:between|from)?\s*{CURRENCY}(\d+)\s*(?:and|to|-)\s*{CURRENCY}(\d+)"
+)
+MAX_PATTERN = (
+    rf"\b(?:under|below|less than|cheaper than|max(?:imum)?|within|up ?to|upto"
+    rf"|at most|budget(?: is| of)?)\s*{CURRENCY}(\d+)"
+)
+MIN_PATTERN = rf"\b(?:over|above|more than|min(?:imum)?|at least)\s*{CURRENCY}(\d+)"
+
+
+def _take(pattern, text):
+    """First match of pattern, and text with that match blanked out"""
+    match = re.search(pattern, text)
+    if not match:
+        return None, text
+    return match, text[:match.start()] + " " + text[match.end():]
+
+
+def parse_query_locally(user_query, vocabulary, analyze, idf=None):
+    """
+    Parse a query with rules
+    vocabulary: TF-IDF vocabulary (term -> id); keywords are taken from it
+    analyze: the index's analyzer, so tokens match the TF-IDF model
+    idf: the vocabulary's idf; without it filler words never form phrases
+    Returns: (parsed, confidence in [0, 1])
+    """
+    text = user_query.lower().strip()
+    parsed = {
+        "keywords": [],
+        "level": "all levels",
+        "is_paid": None,
+        "min_price": None,
+        "max_price": None
+    }
+    found_filter = False
+    ambiguous = False
+
+    # "3 to 5 hours" is neither a price nor a topic
+    match, text = _take(UNIT_PATTERN, text)
+    if match:
+        ambiguous = True
+
+    # Prices first, so their numbers don't end up as keywords
+    match, text = _take(RANGE_PATTERN, text)
+    if match and ("between" in match.group(0) or "from" in match.group(0)
+                  or re.search(r"₹|rs|inr|\$", match.group(0))
+                  or "budget" in text or "price" in text):
+        low, high = sorted((int(match.group(1)), int(match.group(2))))
+        parsed["min_price"], parsed["max_price"] = low, high
+    else:
+        # A bare "3 to 5" is more likely hours or versions than money, so
+        # it sets no bounds; a price cap elsewhere in the query still does
+        ambiguous = ambiguous or match is not None
+        match, text = _take(MAX_PATTERN, text)
+        if match:
+            parsed["max_price"] = int(match.group(1))
+        match, text = _take(MIN_PATTERN, text)
+        if match:
+            parsed["min_price"] = int(match.group(1))
+
+    levels = set()
+    for level, pattern in LEVEL_PATTERNS:
+        match, text = _take(pattern, text)
+        if match:
+            levels.add(level)
+    if len(levels) == 1:
+        parsed["level"] = levels.pop()
+        found_filter = True
+    elif len(levels) > 1:
+        ambiguous = True
+
+    free, text = _take(FREE_PATTERN, text)
+    paid, text = _take(PAID_PATTERN, text)
+    if free and paid:
+        ambiguous = True
+    elif free:
+        parsed["is_paid"] = False
+        found_filter = True
+    elif paid:
+        parsed["is_paid"] = True
+        found_filter = True
+
+    if parsed["min_price"] is not None or parsed["max_price"] is not None:
+        found_filter = True
+        # Price bounds only filter paid courses
+        if parsed["is_paid"] is None and (parsed["max_price"] or parsed["min_price"]):
+            parsed["is_paid"] = True
+
+    # A number left over ("javascript 200") could be a price, a year or a version
+    if re.search(NEGATION_PATTERN, text) or re.search(r"\b\d+\b", text):
+        ambiguous = True
+
+    tokens = analyze(text)
+    phrases = []
+    for token in tokens:
+        words = token.split()
+        fillers = [word in FILLER_WORDS for word in words]
+        if len(words) != 2 or fillers.count(True) != 1:
+            continue
+        content_word = words[fillers.index(False)]
+        if idf is not None and token in vocabulary and content_word in vocabulary and \
+                idf[vocabulary[token]] - idf[vocabulary[content_word]] <= PHRASE_IDF_GAP:
+            phrases.append(token)
+        elif words[1] in TOPIC_FILLERS:
+            # "deep learning" may be a topic the vocabulary has no bigram for
+            ambiguous = True
+
+    content = [
+        token for token in tokens
+        if token in phrases
+        or (" " not in token and token not in FILLER_WORDS and not token.isdigit())
+    ]
+    keywords = []
+    for token in content:
+        if token in vocabulary and token not in keywords:
+            keywords.append(token)
+    parsed["keywords"] = keywords
+
+    if content:
+        confidence = sum(token in vocabulary for token in content) / len(content)
+    else:
+        # Pure constraint turns ("under 500", "free please") are easy
+        confidence = 1.0 if found_filter else 0.0
+
+    if ambiguous:
+        confidence *= 0.5
+
+    return parsed, confidence
@@ -0,0 +1,315 @@
+"""
+Query execution over a SearchIndex
+
+Works on score arrays and row positions end to end; a DataFrame is only
+built for the top_n winners.
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from utils import metrics
+from utils.bm25 import query_weights as bm25_query_weights
+from utils.filter_index import bits_contain
+
+RETRIEVAL_MODES = ("maxscore", "exhaustive", "dense", "ann")
+
+# Term weightings for the sparse retrieval modes
+SCORERS = ("tfidf", "bm25")
+
+
+def top_k(scores, k):
+    """
+    Positions of the k highest scores, best first
+    Ties keep position order, like a stable sort would.
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+
+    if k < n:
+        kth = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[:k - len(above)]
+        selected = np.concatenate([above, ties])
+    else:
+        selected = np.arange(n)
+
+    order = np.lexsort((selected, -scores[selected]))
+    return selected[order]
+
+
+def empty_result():
+    return pd.DataFrame({
+        "course_id": np.empty(0, dtype=np.int64),
+        "match_percent": np.empty(0)
+    })
+
+
+def scorer_arrays(index, scorer):
+    """(docs x terms matrix, postings) holding the scorer's term weights"""
+    if scorer == "bm25":
+        return index.bm25.matrix, index.bm25.postings
+    return index.tfidf_matrix, index.postings
+
+
+def scorer_query(index, semantic_query, scorer):
+    """(term_ids, query weights) of a keyword query for the scorer"""
+    if scorer == "bm25":
+        term_ids, counts = index.query_counts(semantic_query)
+        # Best impact of each term over all segments, so segments score alike
+        max_impacts = np.max([
+            segment.bm25.postings.max_weights[term_ids] for segment, _ in index.segments
+        ], axis=0)
+        return term_ids, bm25_query_weights(counts, max_impacts)
+    return index.query_terms(semantic_query)
+
+
+def score_candidates(index, term_ids, query_weights, candidate_bits,
+                     threshold=None, k=None, stats=None, scorer="tfidf"):
+    """
+    Cosine (or BM25) scores restricted to the filter candidates
+    Walks either the query's postings lists (skipping non-candidates) or the
+    candidates' own rows, whichever touches fewer entries. With a threshold,
+    the postings walk uses MaxScore pruning and may leave out courses that
+    cannot reach it or the top k.
+    Returns: (rows ascending, scores)
+    """
+    matrix, postings = scorer_arrays(index, scorer)
+    if candidate_bits is not None:
+        rows = index.filters.candidate_rows(candidate_bits)
+        postings_cost = int(postings.posting_length(term_ids).sum())
+        rows_cost = len(rows) * matrix.nnz / max(index.num_docs, 1)
+
+        if rows_cost < postings_cost:
+            query_vector = sparse.csr_matrix(
+                (query_weights, term_ids, np.array([0, len(term_ids)])),
+                shape=(1, matrix.shape[1])
+            )
+            scores = (matrix[rows] @ query_vector.T).toarray().ravel()
+            matched = scores > 0
+            return rows[matched], scores[matched]
+
+    if threshold is not None:
+        return postings.score_top(
+            term_ids, query_weights, threshold, k, candidate_bits, stats
+        )
+    return postings.score(term_ids, query_weights, candidate_bits)
+
+
+def dense_scores(index, term_ids, query_weights, candidate_bits):
+    """
+    LSA cosine scores of the filter candidates
+    Every course is scored with one mat-vec; filtering afterwards is cheaper
+    than gathering candidate rows first.
+    Returns: (rows ascending, scores) for courses scoring above zero
+    """
+    dense = index.dense
+    scores = dense.scores(dense.project(term_ids, query_weights))
+    if candidate_bits is None:
+        rows = np.flatnonzero(scores > 0)
+    else:
+        rows = index.filters.candidate_rows(candidate_bits)
+        rows = rows[scores[rows] > 0]
+    return rows, scores[rows].astype(np.float64)
+
+
+def ann_scores(index, term_ids, query_weights, candidate_bits, top_n):
+    """
+    Approximate dense top_n from the IVF-PQ index, re-scored exactly
+    Returns: (rows ascending, scores) for courses scoring above zero
+    """
+    dense = index.dense
+    rows, scores = index.ann.search(
+        dense.project(term_ids, query_weights), top_n,
+        candidate_bits=candidate_bits, vectors=dense.vectors
+    )
+    keep = scores > 0
+    rows, scores = rows[keep], scores[keep]
+    order = np.argsort(rows)
+    return rows[order], scores[order].astype(np.float64)
+
+
+def search(index, semantic_query, filters, min_match_percent=50, top_n=10,
+           retrieval="maxscore", stats=None, scorer="tfidf"):
+    """
+    Rank courses for a keyword query under the parsed filters
+    Filters are resolved to a candidate set first; only candidates are scored.
+    retrieval: "maxscore" skips courses that provably cannot reach
+    min_match_percent or the top_n; "exhaustive" scores every candidate.
+    Both return the same results. "dense" ranks by LSA similarity instead,
+    which also finds courses sharing no term with the query; "ann" finds
+    (almost always) the same courses through the IVF-PQ index without
+    scoring the whole catalog.
+    scorer: term weighting of "maxscore"/"exhaustive" - "tfidf" (cosine) or
+    "bm25"; the dense modes always use the TF-IDF query
+    A SegmentedIndex (utils.segments) is searched segment by segment, each
+    without its deleted rows, and the segments' top_n lists merged; "ann"
+    only uses the IVF-PQ index for the base and scores deltas exactly.
+    Returns: DataFrame[course_id, match_percent] with at most top_n rows
+    """
+    if retrieval not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode: {retrieval}")
+    if scorer not in SCORERS:
+        raise ValueError(f"Unknown scorer: {scorer}")
+    if retrieval in ("dense", "ann"):
+        scorer = "tfidf"
+
+    with metrics.span("vectorize"):
+        term_ids, query_weights = scorer_query(index, semantic_query, scorer)
+
+    results = []
+    num_candidates = num_scored = 0
+    for position, (segment, live_bits) in enumerate(index.segments):
+        with metrics.span("filter"):
+            candidate_bits = segment_candidates(segment, live_bits, filters)
+
+        segment_stats = {} if stats is not None else None
+        with metrics.span("score", retrieval=retrieval, scorer=scorer):
+            if retrieval == "dense":
+                rows, scores = dense_scores(segment, term_ids, query_weights, candidate_bits)
+            elif retrieval == "ann" and position == 0:
+                rows, scores = ann_scores(segment, term_ids, query_weights, candidate_bits, top_n)
+            elif retrieval == "ann":
+                # Delta segments are small: scoring them exactly beats training an ANN
+                rows, scores = dense_scores(segment, term_ids, query_weights, candidate_bits)
+            elif retrieval == "maxscore" and min_match_percent > 0:
+                rows, scores = score_candidates(
+                    segment, term_ids, query_weights, candidate_bits,
+                    min_match_percent / 100, top_n, segment_stats, scorer
+                )
+            else:
+                rows, scores = score_candidates(
+                    segment, term_ids, query_weights, candidate_bits, scorer=scorer
+                )
+
+        with metrics.span("rank"):
+            results.append(rank(segment, rows, scores, candidate_bits, min_match_percent, top_n))
+
+        if segment_stats:
+            for key, value in segment_stats.items():
+                stats[key] = stats.get(key, 0) + value
+        num_scored += len(rows)
+        if metrics.enabled():
+            num_candidates += segment.num_docs if candidate_bits is None else int(
+                np.unpackbits(candidate_bits, count=segment.num_docs).sum()
+            )
+
+    result = results[0] if len(results) == 1 else merge_results(results, top_n)
+
+    if metrics.enabled():
+        metrics.observe("search_candidates", num_candidates, metrics.COUNT_BUCKETS)
+        metrics.observe("search_scored", num_scored, metrics.COUNT_BUCKETS)
+        metrics.observe("search_results", len(result), metrics.COUNT_BUCKETS)
+    return result
+
+
+def segment_candidates(segment, live_bits, filters):
+    """Filter bitset of a segment, without its deleted rows"""
+    candidate_bits = segment.filters.candidates(filters)
+    if live_bits is None:
+        return candidate_bits
+    if candidate_bits is None:
+        return live_bits
+    return np.bitwise_and(candidate_bits, live_bits)
+
+
+def merge_results(results, top_n):
+    """top_n of several segments' results, best first (earlier segments win ties)"""
+    results = [result for result in results if len(result)]
+    if not results:
+        return empty_result()
+    merged = pd.concat(results, ignore_index=True)
+    order = np.lexsort((np.arange(len(merged)), -merged["match_percent"].to_numpy()))
+    return merged.iloc[order[:top_n]].reset_index(drop=True)
+
+
+def rank(index, rows, scores, candidate_bits, min_match_percent, top_n):
+    """Threshold scored rows and build the result frame for the top_n"""
+    if min_match_percent <= 0:
+        # Zero-score candidates also pass a non-positive threshold
+        if candidate_bits is None:
+            all_rows = np.arange(index.num_docs)
+        else:
+            all_rows = index.filters.candidate_rows(candidate_bits)
+        all_scores = np.zeros(len(all_rows))
+        all_scores[np.searchsorted(all_rows, rows)] = scores
+        rows, scores = all_rows, all_scores
+
+    match_percent = scores * 100
+    keep = match_percent >= min_match_percent
+    rows = rows[keep]
+    match_percent = match_percent[keep]
+
+    winners = top_k(match_percent, top_n)
+    if len(winners) == 0:
+        return empty_result()
+
+    return pd.DataFrame({
+        "course_id": index.course_ids[rows[winners]],
+        "match_percent": match_percent[winners]
+    })
+
+
+def query_matrix(index, semantic_queries):
+    """Stack query TF-IDF vectors into one CSR matrix (num_queries x num_terms)"""
+    indptr = [0]
+    term_parts = []
+    weight_parts = []
+    for text in semantic_queries:
+        term_ids, weights = index.query_terms(text)
+        term_parts.append(term_ids)
+        weight_parts.append(weights)
+        indptr.append(indptr[-1] + len(term_ids))
+
+    return sparse.csr_matrix(
+        (
+            np.concatenate(weight_parts) if weight_parts else np.empty(0),
+            np.concatenate(term_parts) if term_parts else np.empty(0, dtype=np.int32),
+            np.array(indptr)
+        ),
+        shape=(len(semantic_queries), index.tfidf_matrix.shape[1])
+    )
+
+
+def search_many(index, semantic_queries, filters=None, min_match_percent=50,
+                top_n=10, chunk_size=256):
+    """
+    Rank many keyword queries with one sparse product per chunk
+    filters: one parsed-filter dict for every query, or a list with one per query
+    chunk_size: queries scored per product; bounds the score matrix in memory
+    Returns: list of DataFrame[course_id, match_percent], in query order
+    """
+    if filters is None or isinstance(filters, dict):
+        filters = [filters or {}] * len(semantic_queries)
+    if len(filters) != len(semantic_queries):
+        raise ValueError("filters must match the number of queries")
+
+    queries = query_matrix(index, semantic_queries)
+    term_matrix = index.postings.term_matrix()
+
+    bits_by_filters = {}
+    results = []
+    for start in range(0, len(semantic_queries), chunk_size):
+        chunk_scores = (queries[start:start + chunk_size] @ term_matrix).tocsr()
+        chunk_scores.sort_indices()
+
+        for i in range(chunk_scores.shape[0]):
+            query_filters = filters[start + i]
+            key = repr(sorted(query_filters.items()))
+            if key not in bits_by_filters:
+                bits_by_filters[key] = index.filters.candidates(query_filters)
+            candidate_bits = bits_by_filters[key]
+
+            lo, hi = chunk_scores.indptr[i], chunk_scores.indptr[i + 1]
+            rows = chunk_scores.indices[lo:hi]
+            scores = chunk_scores.data[lo:hi]
+            if candidate_bits is not None:
+                allowed = bits_contain(candidate_bits, rows)
+                rows, scores = rows[allowed], scores[allowed]
+
+            results.append(rank(
+                index, rows, scores, candidate_bits, min_match_percent, top_n
+            ))
+
+    return results
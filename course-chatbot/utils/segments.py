@@ -0,0 +1,353 @@
+"""
+Incremental catalog updates: delta segments, tombstones and merges
+
+The persisted index is fitted once; later changes never refit it. Added or
+updated courses are vectorized with the base index's vocabulary and idf
+(what TfidfVectorizer.transform would give) into a small in-memory delta
+segment, and the rows they replace - or that were deleted - are
+tombstoned: each segment carries a packed bitset of its live rows.
+
+A SegmentedIndex is one immutable generation of base + deltas. search()
+scores every segment on its own and merges the top_n lists, which is exact
+because all segments share one term space. Everything addressing catalog
+rows (catalog, filters, course_ids, postings, ...) sees the segments
+concatenated, with deleted rows kept out by the filters' live bits; those
+views are built on first use.
+
+merge() compacts segments into a plain in-memory SearchIndex without the
+dead rows. Terms that are new since the fit stay unsearchable until the
+catalog is indexed again (python -m scripts.build_index or a restart).
+"""
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from utils.bm25 import BM25Index
+from utils.catalog import CourseCatalog
+from utils.dense_index import DenseIndex, normalize_rows
+from utils.filter_index import FilterIndex
+from utils.index_store import SearchIndex
+from utils.inverted_index import InvertedIndex
+
+# Delta segments a generation may have before it is merged
+MAX_DELTA_SEGMENTS = 8
+
+# Dead + delta rows, as a share of the live rows, that trigger a full merge
+MERGE_RATIO = 0.1
+
+
+def vectorize_rows(index, semantic_texts):
+    """
+    TF-IDF rows for texts under index's fitted vocabulary and idf
+    Returns: (l2-normalized CSR matrix, uint16 term frequencies, doc lengths)
+    """
+    indptr = [0]
+    term_parts = []
+    count_parts = []
+    for text in semantic_texts:
+        counts = Counter(
+            index.vocabulary[token]
+            for token in index.analyze(text)
+            if token in index.vocabulary
+        )
+        term_ids = np.fromiter(sorted(counts), dtype=np.int32, count=len(counts))
+        term_parts.append(term_ids)
+        count_parts.append(np.array([counts[t] for t in term_ids], dtype=np.float64))
+        indptr.append(indptr[-1] + len(term_ids))
+
+    indices = np.concatenate(term_parts) if term_parts else np.empty(0, dtype=np.int32)
+    counts = np.concatenate(count_parts) if count_parts else np.empty(0)
+    indptr = np.array(indptr, dtype=np.int64)
+
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    weights = counts * index.idf[indices]
+    norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=len(indptr) - 1))
+    norms[norms == 0] = 1
+    weights /= norms[rows]
+
+    matrix = sparse.csr_matrix(
+        (weights.astype(index.tfidf_matrix.dtype), indices, indptr),
+        shape=(len(indptr) - 1, len(index.terms))
+    )
+    doc_len = np.bincount(rows, weights=counts, minlength=len(indptr) - 1).astype(np.float32)
+    term_freqs = np.minimum(counts, np.iinfo(np.uint16).max).astype(np.uint16)
+    return matrix, term_freqs, doc_len
+
+
+def build_segment(base, catalog):
+    """
+    In-memory delta segment for cleaned catalog rows, in base's term space
+    Dense vectors use base's LSA projection and BM25 impacts base's
+    collection statistics, so scores compare across segments.
+    """
+    catalog = catalog.reset_index(drop=True)
+    matrix, term_freqs, doc_len = vectorize_rows(base, catalog["semantic_text"])
+
+    components = base.dense.components
+    vectors = np.asarray(matrix @ components.T, dtype=np.float32)
+    dense = DenseIndex(components, np.ascontiguousarray(normalize_rows(vectors)))
+
+    bm25 = None
+    if base.term_freqs is not None:
+        bm25 = BM25Index.from_stats(
+            matrix, term_freqs, doc_len, idf=base.bm25.idf, avg_len=base.bm25.avg_len
+        )
+
+    return SearchIndex(
+        None,
+        dict(base.meta, num_docs=len(catalog)),
+        catalog,
+        base.terms,
+        base.idf,
+        matrix,
+        InvertedIndex.from_csr(matrix),
+        dense=dense,
+        term_freqs=term_freqs,
+        doc_len=doc_len,
+        bm25=bm25
+    )
+
+
+def live_mask(segment, live_bits):
+    if live_bits is None:
+        return np.ones(segment.num_docs, dtype=bool)
+    return np.unpackbits(live_bits, count=segment.num_docs).astype(bool)
+
+
+def merge(segments):
+    """
+    Compact (segment, live bits) pairs into one in-memory SearchIndex with
+    only the live rows, in segment order
+    """
+    base = segments[0][0]
+    keep = [np.flatnonzero(live_mask(segment, bits)) for segment, bits in segments]
+
+    matrix = sparse.vstack(
+        [segment.tfidf_matrix[rows] for (segment, _), rows in zip(segments, keep)],
+        format="csr"
+    )
+    catalog = pd.concat(
+        [segment.catalog.iloc[rows] for (segment, _), rows in zip(segments, keep)],
+        ignore_index=True
+    )
+    vectors = np.concatenate([
+        np.asarray(segment.dense.vectors[rows]) for (segment, _), rows in zip(segments, keep)
+    ])
+
+    term_freqs = doc_len = None
+    if base.term_freqs is not None:
+        # Frequencies are entry-aligned with the matrix, so slice them the same way
+        term_freqs = np.concatenate([
+            sparse.csr_matrix(
+                (segment.term_freqs, segment.tfidf_matrix.indices, segment.tfidf_matrix.indptr),
+                shape=segment.tfidf_matrix.shape
+            )[rows].data
+            for (segment, _), rows in zip(segments, keep)
+        ]).astype(np.uint16)
+        doc_len = np.concatenate([
+            np.asarray(segment.doc_len[rows]) for (segment, _), rows in zip(segments, keep)
+        ])
+
+    return SearchIndex(
+        None,
+        dict(base.meta, num_docs=matrix.shape[0]),
+        catalog,
+        base.terms,
+        base.idf,
+        matrix,
+        InvertedIndex.from_csr(matrix),
+        dense=DenseIndex(base.dense.components, np.ascontiguousarray(vectors)),
+        term_freqs=term_freqs,
+        doc_len=doc_len
+    )
+
+
+class SegmentedIndex:
+    """One generation of a base index plus delta segments; never modified"""
+
+    def __init__(self, segments):
+        """segments: (SearchIndex, live bits or None) pairs, base first"""
+        self.segments = segments
+        self.base = segments[0][0]
+        self.path = None
+        self._live = None
+        self._rows = None
+        self._course_ids = None
+        self._catalog = None
+        self._filters = None
+        self._tfidf_matrix = None
+        self._postings = None
+        self._bm25 = None
+        self._courses = None
+
+    @classmethod
+    def wrap(cls, index):
+        """Generation for index, which may be a SearchIndex or already segmented"""
+        return index if isinstance(index, cls) else cls(list(index.segments))
+
+    # Query side: the base's fitted model
+
+    @property
+    def meta(self):
+        return self.base.meta
+
+    @property
+    def terms(self):
+        return self.base.terms
+
+    @property
+    def vocabulary(self):
+        return self.base.vocabulary
+
+    @property
+    def idf(self):
+        return self.base.idf
+
+    def analyze(self, text):
+        return self.base.analyze(text)
+
+    def query_counts(self, text):
+        return self.base.query_counts(text)
+
+    def query_terms(self, text):
+        return self.base.query_terms(text)
+
+    def vectorize(self, text):
+        return self.base.vectorize(text)
+
+    # Row side: segments concatenated
+
+    @property
+    def num_docs(self):
+        return sum(segment.num_docs for segment, _ in self.segments)
+
+    @property
+    def live(self):
+        """Boolean mask of rows that are not deleted"""
+        if self._live is None:
+            self._live = np.concatenate([
+                live_mask(segment, bits) for segment, bits in self.segments
+            ])
+        return self._live
+
+    @property
+    def num_live(self):
+        return int(self.live.sum())
+
+    @property
+    def course_ids(self):
+        if self._course_ids is None:
+            self._course_ids = np.concatenate([segment.course_ids for segment, _ in self.segments])
+        return self._course_ids
+
+    @property
+    def catalog(self):
+        if self._catalog is None:
+            self._catalog = pd.concat(
+                [segment.catalog for segment, _ in self.segments], ignore_index=True
+            )
+        return self._catalog
+
+    @property
+    def filters(self):
+        if self._filters is None:
+            levels = pd.Categorical(self.catalog["level"])
+            self._filters = FilterIndex(
+                np.asarray(levels.codes),
+                list(levels.categories),
+                self.catalog["is_paid"].to_numpy(dtype=bool),
+                self.catalog["price"].to_numpy(dtype=np.float64),
+                live_bits=np.packbits(self.live)
+            )
+        return self._filters
+
+    @property
+    def tfidf_matrix(self):
+        if self._tfidf_matrix is None:
+            self._tfidf_matrix = sparse.vstack(
+                [segment.tfidf_matrix for segment, _ in self.segments], format="csr"
+            )
+        return self._tfidf_matrix
+
+    @property
+    def postings(self):
+        if self._postings is None:
+            self._postings = InvertedIndex.from_csr(self.tfidf_matrix)
+        return self._postings
+
+    @property
+    def bm25(self):
+        if self._bm25 is None:
+            matrix = sparse.vstack(
+                [segment.bm25.matrix for segment, _ in self.segments], format="csr"
+            )
+            base = self.base.bm25
+            self._bm25 = BM25Index(matrix, InvertedIndex.from_csr(matrix), base.idf, base.avg_len)
+        return self._bm25
+
+    @property
+    def courses(self):
+        """Display catalog of the live courses"""
+        if self._courses is None:
+            self._courses = CourseCatalog(self.catalog[self.live])
+        return self._courses
+
+    def live_rows(self):
+        """course_id -> (segment position, row) of every live course"""
+        if self._rows is None:
+            self._rows = {}
+            for position, (segment, bits) in enumerate(self.segments):
+                rows = np.flatnonzero(live_mask(segment, bits))
+                self._rows.update(
+                    (course_id, (position, row))
+                    for course_id, row in zip(segment.course_ids[rows].tolist(), rows.tolist())
+                )
+        return self._rows
+
+    # Updates: each returns a new generation
+
+    def apply(self, upserts=None, deletes=()):
+        """
+        Generation with upserts (cleaned catalog rows; added, or replacing the
+        course with the same course_id) and deletes (course_ids) applied
+        Unknown course_ids in deletes are ignored.
+        """
+        if upserts is not None and len(upserts):
+            upserts = upserts.drop_duplicates("course_id", keep="last")
+            removed = set(deletes) | set(upserts["course_id"].tolist())
+        else:
+            upserts = None
+            removed = set(deletes)
+
+        rows = self.live_rows()
+        dead = {}
+        for course_id in removed:
+            if course_id in rows:
+                position, row = rows[course_id]
+                dead.setdefault(position, []).append(row)
+
+        segments = []
+        for position, (segment, bits) in enumerate(self.segments):
+            if position in dead:
+                mask = live_mask(segment, bits)
+                mask[dead[position]] = False
+                bits = np.packbits(mask)
+            segments.append((segment, bits))
+
+        if upserts is not None:
+            segments.append((build_segment(self.base, upserts), None))
+        return SegmentedIndex(segments)
+
+    def needs_merge(self):
+        """Whether search would gain from compacting the segments"""
+        deltas = len(self.segments) - 1
+        if deltas > MAX_DELTA_SEGMENTS:
+            return True
+        overhead = self.num_docs - self.base.num_docs + int((~self.live).sum())
+        return overhead > MERGE_RATIO * max(self.num_live, 1)
+
+    def merge(self):
+        """Compacted generation: one plain SearchIndex with the live rows"""
+        return merge(self.segments)
@@ -0,0 +1,156 @@
+"""
+Gemini token and cost accounting
+
+Every Gemini call records its prompt/output tokens (from the response's
+usage_metadata, estimated from text length when the backend sends none)
+and latency under its call-site tag. Totals are kept for the process and
+for the session the call is made for: chat_flow.handle_turn activates the
+session's usage dict (state.token_usage) with session_scope().
+
+SESSION_TOKEN_BUDGET caps the tokens one session may spend; once it is used
+up, check_budget() raises TokenBudgetExceeded and callers fall back to
+their local answers.
+"""
+import contextlib
+import contextvars
+import os
+import threading
+
+from utils import metrics
+
+# Rough size of a token in English text; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+# USD per million tokens (gemini-2.5-flash list prices), overridable per deployment
+INPUT_PRICE_PER_M = float(os.getenv("GEMINI_INPUT_PRICE_PER_M", "0.30"))
+OUTPUT_PRICE_PER_M = float(os.getenv("GEMINI_OUTPUT_PRICE_PER_M", "2.50"))
+
+_lock = threading.Lock()
+_process_usage = {}
+_session_usage = contextvars.ContextVar("session_token_usage", default=None)
+
+
+class TokenBudgetExceeded(Exception):
+    """The session has used up SESSION_TOKEN_BUDGET"""
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def session_budget():
+    """Tokens one session may spend; 0 means unlimited"""
+    return int(os.getenv("SESSION_TOKEN_BUDGET", "0"))
+
+
+def usage_tokens(usage, prompt, text):
+    """
+    (prompt tokens, output tokens) from a response's usage_metadata,
+    estimated from the texts when it is missing
+    """
+    prompt_tokens = getattr(usage, "prompt_token_count", None)
+    output_tokens = getattr(usage, "candidates_token_count", None)
+    if prompt_tokens is None:
+        prompt_tokens = estimate_tokens(prompt)
+    if output_tokens is None:
+        output_tokens = estimate_tokens(text)
+    return prompt_tokens, output_tokens
+
+
+def _add(usage, call_site, prompt_tokens, output_tokens, seconds):
+    site = usage.get(call_site)
+    if site is None:
+        site = usage[call_site] = {"calls": 0, "prompt_tokens": 0, "output_tokens": 0, "seconds": 0.0}
+    site["calls"] += 1
+    site["prompt_tokens"] += prompt_tokens
+    site["output_tokens"] += output_tokens
+    site["seconds"] += seconds
+
+
+def current_session():
+    """Usage dict of the session the current call is made for, or None"""
+    return _session_usage.get()
+
+
+@contextlib.contextmanager
+def session_scope(usage):
+    """Attribute calls made inside the block to usage (a session's dict)"""
+    token = _session_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _session_usage.reset(token)
+
+
+def record(call_site, prompt_tokens, output_tokens, seconds, session=None):
+    """
+    Add one call to the process totals and to a session's
+    session: usage dict to charge; defaults to the active session
+    """
+    with _lock:
+        _add(_process_usage, call_site, prompt_tokens, output_tokens, seconds)
+    session = current_session() if session is None else session
+    if session is not None:
+        _add(session, call_site, prompt_tokens, output_tokens, seconds)
+    metrics.observe(
+        "llm_tokens", prompt_tokens + output_tokens, metrics.COUNT_BUCKETS, call_site=call_site
+    )
+
+
+def total_tokens(usage):
+    return sum(site["prompt_tokens"] + site["output_tokens"] for site in usage.values())
+
+
+def cost_usd(usage):
+    return sum(
+        site["prompt_tokens"] * INPUT_PRICE_PER_M + site["output_tokens"] * OUTPUT_PRICE_PER_M
+        for site in usage.values()
+    ) / 1_000_000
+
+
+def check_budget(session=None):
+    """Raise TokenBudgetExceeded if the session has no tokens left"""
+    session = current_session() if session is None else session
+    budget = session_budget()
+    if session is None or budget <= 0:
+        return
+    if total_tokens(session) >= budget:
+        metrics.increment("llm_budget_fallbacks_total")
+        raise TokenBudgetExceeded(f"session used its {budget} token budget")
+
+
+def process_usage():
+    """Copy of the per-call-site totals of this process"""
+    with _lock:
+        return {site: dict(totals) for site, totals in _process_usage.items()}
+
+
+def summary(usage):
+    """Totals of a usage dict: calls, tokens, seconds and cost"""
+    return {
+        "calls": sum(site["calls"] for site in usage.values()),
+        "prompt_tokens": sum(site["prompt_tokens"] for site in usage.values()),
+        "output_tokens": sum(site["output_tokens"] for site in usage.values()),
+        "seconds": sum(site["seconds"] for site in usage.values()),
+        "cost_usd": cost_usd(usage)
+    }
+
+
+def _collect():
+    samples = []
+    for call_site, site in process_usage().items():
+        labels = {"call_site": call_site}
+        samples += [
+            ("llm_prompt_tokens_total", labels, site["prompt_tokens"]),
+            ("llm_output_tokens_total", labels, site["output_tokens"]),
+            ("llm_cost_usd_total", labels, cost_usd({call_site: site}))
+        ]
+    return samples
+
+
+metrics.register_collector(_collect)
+
+
+def reset():
+    with _lock:
+        _process_usage.clear()